@@ -0,0 +1 @@
+"""性能基准脚本集合（不依赖真实模型，可直接 python -m 运行）。"""
@@ -0,0 +1,87 @@
+"""语法匹配基准：线性规则扫描 vs. Aho-Corasick 自动机。
+
+运行：python -m benchmarks.bench_grammar_matcher [--rules 10000] [--texts 200]
+"""
+
+import argparse
+import random
+import time
+from typing import List
+
+from core.engines.grammar_matcher import GrammarMatcher
+from core.models import GrammarPoint
+
+_KANA = "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん"
+
+
+def _random_word(rng: random.Random, low: int, high: int) -> str:
+    return "".join(rng.choice(_KANA) for _ in range(rng.randint(low, high)))
+
+
+def build_rules(count: int, rng: random.Random) -> List[dict]:
+    """生成 count 条随机规则，每条 1~3 个关键词。"""
+
+    return [
+        {
+            "name": f"rule_{i}",
+            "pattern": [_random_word(rng, 2, 6) for _ in range(rng.randint(1, 3))],
+            "description": "",
+            "example": "",
+        }
+        for i in range(count)
+    ]
+
+
+def linear_scan(rules: List[dict], jp_text: str) -> List[GrammarPoint]:
+    """重构前 detect_grammar 的逐规则扫描实现，作为基线。"""
+
+    results: List[GrammarPoint] = []
+    lowered = jp_text.lower()
+    for rule in rules:
+        if any(keyword in lowered for keyword in rule.get("pattern", [])):
+            results.append(
+                GrammarPoint(
+                    name=rule.get("name", ""),
+                    description=rule.get("description", ""),
+                    example=rule.get("example", ""),
+                )
+            )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rules", type=int, default=10_000)
+    parser.add_argument("--texts", type=int, default=200)
+    parser.add_argument("--length", type=int, default=120, help="每条文本的字符数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rules = build_rules(args.rules, rng)
+    texts = [_random_word(rng, args.length, args.length) for _ in range(args.texts)]
+
+    started = time.perf_counter()
+    matcher = GrammarMatcher(rules)
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    baseline = [linear_scan(rules, text) for text in texts]
+    linear_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    compiled = [matcher.detect(text) for text in texts]
+    matcher_s = time.perf_counter() - started
+
+    if baseline != compiled:
+        raise SystemExit("结果不一致：自动机与线性扫描输出不同")
+
+    print(f"rules={args.rules} texts={args.texts} length={args.length}")
+    print(f"compile        : {compile_ms:10.2f} ms")
+    print(f"linear scan    : {linear_s / args.texts * 1000:10.3f} ms/text")
+    print(f"aho-corasick   : {matcher_s / args.texts * 1000:10.3f} ms/text")
+    print(f"speedup        : {linear_s / matcher_s:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
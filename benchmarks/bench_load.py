@@ -0,0 +1,266 @@
+"""离线负载基准：在模拟 Ollama 服务上驱动真实引擎。
+
+场景：
+- utterance：conversation_engine.process_user_utterance（含纠错、回复、翻译、语法、状态）
+- scenario ：scenario_engine.run_step
+- agent    ：AgentRunner.run（进程内 MCP 客户端，模拟服务先返回工具调用）
+
+每个场景在各并发级别下完成固定轮数，统计吞吐（turns/s）、延迟 p50/p99
+与事件循环延迟（loop lag），结果以 JSON 输出，便于在提交之间比较。
+
+运行：
+    python -m benchmarks.bench_load --scenarios utterance,agent --concurrency 1,8,32 \\
+        --turns 64 --ttft 0.05 --token-latency 0.005 --output bench_load.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+
+from benchmarks.fake_ollama import (
+    PROJECT_ROOT,
+    FakeOllamaProcess,
+    add_config_arguments,
+    config_from_args,
+)
+
+# 每个并发 worker 的一次轮次：参数为全局轮次序号
+TurnFn = Callable[[int], Awaitable[Any]]
+WorkerFactory = Callable[[], Awaitable[TurnFn]]
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return round(ordered[index], 3)
+
+
+class LoopLagMonitor:
+    """周期性 sleep，记录实际唤醒时间比预期晚了多少（毫秒）。"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: "asyncio.Task[None] | None" = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = time.perf_counter() - started - self.interval
+            self.samples.append(max(0.0, lag) * 1000)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> Dict[str, float]:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        return {
+            "p50": _percentile(self.samples, 0.50),
+            "p99": _percentile(self.samples, 0.99),
+            "max": round(max(self.samples, default=0.0), 3),
+        }
+
+
+def _ai_error_count() -> float:
+    from core.utils.metrics import get_metrics
+
+    counters = get_metrics().snapshot()["counters"]
+    return sum(value for key, value in counters.items() if key.startswith("ai_errors"))
+
+
+async def run_level(
+    name: str, make_worker: WorkerFactory, concurrency: int, turns: int
+) -> Dict[str, Any]:
+    """以 concurrency 个 worker 共同完成 turns 轮，返回该级别的统计。"""
+
+    workers = [await make_worker() for _ in range(concurrency)]
+    latencies: List[float] = []
+    failures = 0
+    next_turn = 0
+    ai_errors_before = _ai_error_count()
+
+    async def worker(turn: TurnFn) -> None:
+        nonlocal next_turn, failures
+        while next_turn < turns:
+            index = next_turn
+            next_turn += 1
+            started = time.perf_counter()
+            try:
+                await turn(index)
+            except Exception:  # noqa: BLE001
+                failures += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(turn) for turn in workers))
+    elapsed = time.perf_counter() - started
+    loop_lag = await monitor.stop()
+
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "turns": turns,
+        "failures": failures,
+        "ai_errors": _ai_error_count() - ai_errors_before,
+        "elapsed_s": round(elapsed, 3),
+        "turns_per_s": round(turns / elapsed, 3),
+        "latency_ms": {
+            "p50": _percentile(latencies, 0.50),
+            "p99": _percentile(latencies, 0.99),
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        },
+        "loop_lag_ms": loop_lag,
+    }
+
+
+def build_scenarios() -> Dict[str, WorkerFactory]:
+    """构造各场景的 worker 工厂；在配置好环境之后才导入引擎。"""
+
+    from core.engines.conversation_engine import process_user_utterance
+    from core.engines.scenario_engine import iter_scenarios, run_step
+
+    async def utterance_worker() -> TurnFn:
+        async def turn(index: int) -> Any:
+            # 每轮文本不同，避免命中 LLM 响应缓存
+            return await process_user_utterance(
+                f"今日は雨ですから、家で勉強します。{index}", user_id=f"bench_{index % 32}"
+            )
+
+        return turn
+
+    scenario_id = next(iter(iter_scenarios()), {}).get("id")
+
+    async def scenario_worker() -> TurnFn:
+        async def turn(index: int) -> Any:
+            return await run_step(scenario_id, 0, f"すみません、お願いします。{index}")
+
+        return turn
+
+    async def agent_worker() -> TurnFn:
+        from fastmcp import Client
+
+        from core.services.agent_runner import AgentRunner, ToolListChangeHandler
+        from core.services.ai_client import get_ai_client
+        from mcp_app import mcp
+        from tools import register_all_tools
+
+        register_all_tools()
+        events = ToolListChangeHandler()
+        runner = AgentRunner(get_ai_client(), Client(mcp, message_handler=events), tool_events=events)
+        await runner.start()
+
+        async def turn(index: int) -> Any:
+            return await runner.run(f"この文の文法を調べて：雨だから行きません。{index}")
+
+        return turn
+
+    return {
+        "utterance": utterance_worker,
+        "scenario": scenario_worker,
+        "agent": agent_worker,
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    from core.engines.user_state_engine import configure_state_backend
+    from core.services.ai_client import configure_backend
+    from core.services.llm_cache import configure_llm_cache
+    from core.utils.tracing import configure_tracing
+
+    # 隔离副作用：响应缓存只用内存层，用户状态写入临时库，默认不写 trace
+    configure_llm_cache(db_path=None)
+    configure_state_backend("sqlite", Path(args.state_dir) / "user_state.db")
+    configure_tracing(sample_rate=args.trace_sample)
+    configure_backend("ollama", args.backend_concurrency)
+    # 进程内 MCP 客户端会把 httpx / mcp 日志调到 INFO，逐条请求输出会干扰计时
+    for name in ("httpx", "mcp"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    factories = build_scenarios()
+    results = []
+    for name in args.scenarios.split(","):
+        make_worker = factories[name]
+        # 预热：首次调用会加载模型清单、语法自动机、翻译记忆等
+        try:
+            await (await make_worker())(-1)
+        except Exception as exc:  # noqa: BLE001 - 注入错误时预热也可能失败
+            print(f"{name} warm-up failed: {exc}", file=sys.stderr)
+        for concurrency in (int(value) for value in args.concurrency.split(",")):
+            result = await run_level(name, make_worker, concurrency, args.turns)
+            results.append(result)
+            print(
+                f"{name:<10} c={concurrency:<4} {result['turns_per_s']:>8.2f} turns/s"
+                f"  p50 {result['latency_ms']['p50']:>9.1f} ms"
+                f"  p99 {result['latency_ms']['p99']:>9.1f} ms"
+                f"  lag p99 {result['loop_lag_ms']['p99']:>7.2f} ms"
+                f"  failures {result['failures']}  ai_errors {result['ai_errors']:.0f}",
+                file=sys.stderr,
+            )
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "turns": args.turns,
+            "backend_concurrency": args.backend_concurrency,
+            "fake_ollama": vars(config_from_args(args)),
+        },
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="utterance,scenario,agent")
+    parser.add_argument("--concurrency", default="1,8,32", help="逗号分隔的并发级别")
+    parser.add_argument("--turns", type=int, default=64, help="每个并发级别完成的轮数")
+    parser.add_argument("--backend-concurrency", type=int, default=4, help="AIClient 后端并发上限")
+    parser.add_argument("--trace-sample", type=float, default=0.0, help="链路追踪采样率")
+    parser.add_argument("--output", help="结果 JSON 文件，缺省时打印到标准输出")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as state_dir, FakeOllamaProcess(config_from_args(args)) as server:
+        args.state_dir = state_dir
+        os.environ["OLLAMA_HOST"] = server.url
+        report = asyncio.run(run_benchmark(args))
+
+    payload = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(payload, encoding="utf-8")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
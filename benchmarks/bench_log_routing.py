@@ -0,0 +1,105 @@
+"""日志路由基准：每模块一个过滤处理器 vs. 单个字典路由 sink。
+
+对每个模块数量分别注册 N 个模块，再轮流以各模块身份写日志，统计每秒记录数。
+默认 enqueue=False，只衡量分发与格式化本身的开销。
+
+运行：python -m benchmarks.bench_log_routing [--modules 10,25,50,100] [--records 20000]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from loguru import logger
+
+from core.utils.dp_log import _DEFAULT_FILE_FORMAT, _ModuleRoute, _RoutingSink
+
+
+def setup_filtered(log_dir: Path, modules: List[str], enqueue: bool) -> Callable[[], None]:
+    """重构前 LogFactory 的做法：每个模块一个文件处理器，各自按模块名过滤。"""
+
+    handler_ids = []
+    for module in modules:
+        path = log_dir / module
+        path.mkdir(parents=True, exist_ok=True)
+        handler_ids.append(
+            logger.add(
+                sink=str(path / "{time:YYYY-MM-DD}.log"),
+                rotation="00:00",
+                level="INFO",
+                format=_DEFAULT_FILE_FORMAT,
+                enqueue=enqueue,
+                encoding="utf-8",
+                filter=lambda record, module=module: record["extra"].get("module") == module,
+            )
+        )
+
+    def teardown() -> None:
+        for handler_id in handler_ids:
+            logger.remove(handler_id)
+
+    return teardown
+
+
+def setup_routed(log_dir: Path, modules: List[str], enqueue: bool) -> Callable[[], None]:
+    """新的做法：单个路由 sink，按模块名字典查找目标文件。"""
+
+    router = _RoutingSink()
+    for module in modules:
+        router.add_route(
+            module,
+            _ModuleRoute(
+                log_path=log_dir / module,
+                levelno=logger.level("INFO").no,
+                file_format=_DEFAULT_FILE_FORMAT,
+                use_date_dir=True,
+                retention=None,
+            ),
+        )
+    handler_id = logger.add(
+        sink=router,
+        level=0,
+        format=router.format,
+        filter=router.filter,
+        enqueue=enqueue,
+        colorize=False,
+    )
+    return lambda: logger.remove(handler_id)
+
+
+def measure(setup, modules: List[str], records: int, enqueue: bool) -> float:
+    """返回每秒写入的记录数（包含处理器移除时的落盘）。"""
+
+    loggers = [logger.bind(module=module) for module in modules]
+    with tempfile.TemporaryDirectory() as tmp:
+        teardown = setup(Path(tmp), modules, enqueue)
+        started = time.perf_counter()
+        for i in range(records):
+            loggers[i % len(loggers)].info("turn processed in {} ms", i)
+        teardown()
+        elapsed = time.perf_counter() - started
+    return records / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--modules", default="10,25,50,100", help="逗号分隔的模块数量")
+    parser.add_argument("--records", type=int, default=20_000)
+    parser.add_argument("--enqueue", action="store_true", help="与线上一致启用 enqueue")
+    args = parser.parse_args()
+
+    # 去掉 loguru 默认的 stderr 处理器，避免终端输出干扰计时
+    logger.remove()
+    print(f"records={args.records} enqueue={args.enqueue}")
+    print(f"{'modules':>8} {'filtered rec/s':>16} {'routed rec/s':>14} {'speedup':>8}")
+    for count in (int(value) for value in args.modules.split(",")):
+        modules = [f"bench_module_{i}" for i in range(count)]
+        filtered = measure(setup_filtered, modules, args.records, args.enqueue)
+        routed = measure(setup_routed, modules, args.records, args.enqueue)
+        print(f"{count:>8} {filtered:>16,.0f} {routed:>14,.0f} {routed / filtered:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
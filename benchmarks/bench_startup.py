@@ -0,0 +1,65 @@
+"""启动耗时基准：冷启动导入 server 与首次工具调用耗时。
+
+每轮都在新的子进程中执行，避免模块缓存影响结果。
+运行：python -m benchmarks.bench_startup [--runs 5]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+# 子进程内执行：测量导入 server 的耗时，以及通过进程内客户端完成首次工具调用的耗时。
+_PROBE = r"""
+import asyncio, json, time
+started = time.perf_counter()
+import server
+imported = time.perf_counter()
+
+from fastmcp import Client
+
+async def first_call():
+    async with Client(server.mcp) as client:
+        await client.call_tool("jp_detect_grammar", {"text": "雨だから行きません。"})
+
+asyncio.run(first_call())
+called = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "first_tool_call_ms": (called - imported) * 1000,
+    "total_ms": (called - started) * 1000,
+}))
+"""
+
+
+def run_probe() -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    samples = [run_probe() for _ in range(args.runs)]
+    for key in ("import_ms", "first_tool_call_ms", "total_ms"):
+        values = [sample[key] for sample in samples]
+        print(
+            f"{key:<20}: median {statistics.median(values):8.1f} ms"
+            f"  min {min(values):8.1f} ms  max {max(values):8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""模拟 Ollama HTTP 服务，供离线基准使用。
+
+实现 /api/tags 与 /api/chat（流式 NDJSON 与非流式），可配置：
+- 首 token 延迟（--ttft）与每 token 延迟（--token-latency）
+- 每次回复的 token 数（--tokens）
+- 请求带工具时返回工具调用（--tool-rounds 轮后再给出文本回复）
+- 按比例注入 HTTP 500 错误（--error-rate）
+
+单独运行：python -m benchmarks.fake_ollama --port 11500 --ttft 0.2 --token-latency 0.01
+然后以 OLLAMA_HOST=http://127.0.0.1:11500 启动服务或 REPL。
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+# 回复文本按字切成 token，包含若干语法点便于语法识别阶段命中。
+_REPLY_TEXT = "雨だから、今日は家で日本語を勉強しています。明日は友達と映画を見に行きたいです。"
+
+
+@dataclass
+class FakeOllamaConfig:
+    model: str = "fake-model:latest"
+    ttft: float = 0.05
+    token_latency: float = 0.005
+    tokens: int = 32
+    tool_name: str = "jp_detect_grammar"
+    tool_rounds: int = 1
+    error_rate: float = 0.0
+    seed: Optional[int] = None
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _reply_tokens(count: int) -> List[str]:
+    return [_REPLY_TEXT[i % len(_REPLY_TEXT)] for i in range(count)]
+
+
+def _prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+    return sum(len(str(message.get("content") or "")) for message in messages)
+
+
+def create_app(config: FakeOllamaConfig):
+    """构建 Starlette 应用（仅在需要时导入 starlette）。"""
+
+    from starlette.applications import Starlette
+    from starlette.requests import Request
+    from starlette.responses import JSONResponse, StreamingResponse
+    from starlette.routing import Route
+
+    rng = random.Random(config.seed)
+
+    async def tags(request: Request) -> JSONResponse:
+        return JSONResponse({
+            "models": [{
+                "name": config.model,
+                "model": config.model,
+                "modified_at": _now(),
+                "size": 1024 ** 3,
+                "digest": "0" * 64,
+                "details": {
+                    "format": "gguf",
+                    "family": "fake",
+                    "parameter_size": "1B",
+                    "quantization_level": "Q4_0",
+                },
+            }]
+        })
+
+    def _tool_call(body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """请求带工具且工具结果轮数不足时，返回一次工具调用。"""
+
+        tools = body.get("tools") or []
+        names = {tool.get("function", {}).get("name") for tool in tools}
+        if config.tool_name not in names:
+            return None
+        messages = body.get("messages") or []
+        rounds = sum(1 for message in messages if message.get("role") == "tool")
+        if rounds >= config.tool_rounds:
+            return None
+        user_text = next(
+            (m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), ""
+        )
+        return {"function": {"name": config.tool_name, "arguments": {"text": user_text}}}
+
+    def _final(body: Dict[str, Any], eval_count: int, started: float) -> Dict[str, Any]:
+        elapsed_ns = int((time.perf_counter() - started) * 1e9)
+        return {
+            "model": config.model,
+            "created_at": _now(),
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": elapsed_ns,
+            "prompt_eval_count": _prompt_tokens(body.get("messages") or []),
+            "eval_count": eval_count,
+            "eval_duration": max(1, int(eval_count * config.token_latency * 1e9)),
+        }
+
+    async def chat(request: Request):
+        body = await request.json()
+        started = time.perf_counter()
+        if config.error_rate and rng.random() < config.error_rate:
+            return JSONResponse({"error": "injected failure"}, status_code=500)
+
+        tool_call = _tool_call(body)
+        tokens = [] if tool_call else _reply_tokens(config.tokens)
+
+        if not body.get("stream", True):
+            await asyncio.sleep(config.ttft + config.token_latency * len(tokens))
+            message: Dict[str, Any] = {"role": "assistant", "content": "".join(tokens)}
+            if tool_call:
+                message["tool_calls"] = [tool_call]
+            return JSONResponse({**_final(body, len(tokens), started), "message": message})
+
+        async def stream() -> AsyncIterator[bytes]:
+            await asyncio.sleep(config.ttft)
+            if tool_call:
+                chunk = {
+                    "model": config.model,
+                    "created_at": _now(),
+                    "message": {"role": "assistant", "content": "", "tool_calls": [tool_call]},
+                    "done": False,
+                }
+                yield (json.dumps(chunk, ensure_ascii=False) + "\n").encode("utf-8")
+            for index, token in enumerate(tokens):
+                if index:
+                    await asyncio.sleep(config.token_latency)
+                chunk = {
+                    "model": config.model,
+                    "created_at": _now(),
+                    "message": {"role": "assistant", "content": token},
+                    "done": False,
+                }
+                yield (json.dumps(chunk, ensure_ascii=False) + "\n").encode("utf-8")
+            final = {**_final(body, len(tokens), started), "message": {"role": "assistant", "content": ""}}
+            yield (json.dumps(final, ensure_ascii=False) + "\n").encode("utf-8")
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    return Starlette(routes=[
+        Route("/api/tags", tags, methods=["GET"]),
+        Route("/api/chat", chat, methods=["POST"]),
+    ])
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class FakeOllamaProcess:
+    """在子进程中运行模拟服务，避免与被测事件循环争抢 CPU。
+
+    用法：
+        with FakeOllamaProcess(FakeOllamaConfig(ttft=0.1)) as server:
+            os.environ["OLLAMA_HOST"] = server.url
+    """
+
+    def __init__(self, config: FakeOllamaConfig, port: Optional[int] = None):
+        self.config = config
+        self.port = port or free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._proc: Optional[subprocess.Popen] = None
+
+    def start(self, timeout: float = 15.0) -> None:
+        import httpx
+
+        args = [sys.executable, "-m", "benchmarks.fake_ollama", "--port", str(self.port)]
+        for key, value in asdict(self.config).items():
+            if value is not None:
+                args += [f"--{key.replace('_', '-')}", str(value)]
+        self._proc = subprocess.Popen(args, cwd=PROJECT_ROOT)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._proc.poll() is not None:
+                raise RuntimeError("fake ollama server exited during startup")
+            try:
+                httpx.get(f"{self.url}/api/tags", timeout=0.5).raise_for_status()
+                return
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        self.stop()
+        raise RuntimeError("fake ollama server did not become ready")
+
+    def stop(self) -> None:
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.terminate()
+            self._proc.wait(timeout=10)
+        self._proc = None
+
+    def __enter__(self) -> "FakeOllamaProcess":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    """注册模拟服务的行为参数（与 FakeOllamaConfig 字段一一对应）。"""
+
+    defaults = FakeOllamaConfig()
+    parser.add_argument("--model", default=defaults.model)
+    parser.add_argument("--ttft", type=float, default=defaults.ttft, help="首 token 延迟（秒）")
+    parser.add_argument("--token-latency", type=float, default=defaults.token_latency, help="每 token 延迟（秒）")
+    parser.add_argument("--tokens", type=int, default=defaults.tokens, help="每次回复的 token 数")
+    parser.add_argument("--tool-name", default=defaults.tool_name, help="返回工具调用时使用的工具")
+    parser.add_argument("--tool-rounds", type=int, default=defaults.tool_rounds, help="每次对话先返回几轮工具调用")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="注入 HTTP 500 的比例")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def config_from_args(args: argparse.Namespace) -> FakeOllamaConfig:
+    return FakeOllamaConfig(
+        model=args.model,
+        ttft=args.ttft,
+        token_latency=args.token_latency,
+        tokens=args.tokens,
+        tool_name=args.tool_name,
+        tool_rounds=args.tool_rounds,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=11500)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(config_from_args(args)), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""流量回放：按 JSONL 记录重放 MCP 工具调用，统计各工具的延迟分布与错误率。
+
+记录格式（每行一个 JSON 对象）：
+    {"tool": "jp_detect_grammar", "arguments": {"text": "..."}, "offset": 0.25}
+- offset：相对第一条记录的秒数；也可以用绝对时间戳 timestamp（秒），会换算为 offset。
+- 缺少时间信息的记录按 0.1 秒间隔排列。
+
+目标（--target）：
+- inprocess（默认）：进程内 FastMCP 客户端直接连接 server.py 中的 mcp 实例；
+  与 bench_load 一样，用户状态写入临时库、响应缓存只用内存层，
+  --persist 时才写入真实的 data/ 目录
+- 脚本路径，如 server.py：以 stdio 方式启动一个独立的服务进程
+- URL，如 http://127.0.0.1:8000/mcp：连接已运行的 HTTP 服务
+
+模式（--mode）：
+- open  ：开环，按记录的原始时间（--speed 加速）或固定速率（--rate 次/秒）发送，
+          不等待前一个请求完成；延迟从计划发送时刻算起，排队时间也计入
+- closed：闭环，--concurrency 个 worker 各自完成一个请求后再发下一个
+
+运行：
+    python -m benchmarks.replay_traffic benchmarks/traffic_sample.jsonl --mode open --rate 20
+    python -m benchmarks.replay_traffic traffic.jsonl --target server.py --mode closed --concurrency 8
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+_DEFAULT_GAP = 0.1
+
+
+@dataclass
+class CallRecord:
+    tool: str
+    arguments: Dict[str, Any]
+    offset: float
+
+
+@dataclass
+class ToolStats:
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    error_samples: List[str] = field(default_factory=list)
+
+
+def load_records(path: Path) -> List[CallRecord]:
+    """读取 JSONL 记录并统一换算为相对 offset（秒），按 offset 排序。"""
+
+    raw: List[Dict[str, Any]] = []
+    with Path(path).open(encoding="utf-8") as fh:
+        for lineno, line in enumerate(fh, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as exc:
+                print(f"skip line {lineno}: {exc}", file=sys.stderr)
+                continue
+            if not isinstance(item, dict) or not item.get("tool"):
+                print(f"skip line {lineno}: missing tool", file=sys.stderr)
+                continue
+            raw.append(item)
+
+    timestamps = [item["timestamp"] for item in raw if "timestamp" in item]
+    base = min(timestamps) if timestamps else 0.0
+    records = []
+    for index, item in enumerate(raw):
+        if "offset" in item:
+            offset = float(item["offset"])
+        elif "timestamp" in item:
+            offset = float(item["timestamp"]) - base
+        else:
+            offset = index * _DEFAULT_GAP
+        records.append(CallRecord(item["tool"], item.get("arguments") or {}, offset))
+    records.sort(key=lambda record: record.offset)
+    return records
+
+
+def make_client(target: str, state_dir: Optional[str] = None):
+    """按 --target 构造 FastMCP 客户端。
+
+    :param state_dir: 进程内目标的隔离目录；给出时用户状态写入其中的临时库，
+        LLM 响应缓存只用内存层
+    """
+
+    from fastmcp import Client
+
+    if target == "inprocess":
+        sys.path.insert(0, str(PROJECT_ROOT))
+        import server
+        from core.engines.user_state_engine import configure_state_backend
+        from core.services.llm_cache import configure_llm_cache
+
+        if state_dir is not None:
+            configure_llm_cache(db_path=None)
+            configure_state_backend("sqlite", Path(state_dir) / "user_state.db")
+        return Client(server.mcp)
+    if target.endswith(".py") and not target.startswith(("http://", "https://")):
+        return Client(str(Path(target).resolve()))
+    return Client(target)
+
+
+class Replayer:
+    def __init__(self, client, timeout: Optional[float]):
+        self.client = client
+        self.timeout = timeout
+        self.stats: Dict[str, ToolStats] = defaultdict(ToolStats)
+        self.late_starts = 0
+
+    async def call(self, record: CallRecord, scheduled: Optional[float] = None) -> None:
+        """发送一次调用；scheduled 为计划发送时刻（开环），延迟从该时刻算起。"""
+
+        started = time.perf_counter()
+        if scheduled is not None and started - scheduled > 0.01:
+            self.late_starts += 1
+        stats = self.stats[record.tool]
+        try:
+            result = await asyncio.wait_for(
+                self.client.call_tool(record.tool, record.arguments, raise_on_error=False),
+                self.timeout,
+            )
+            if result.is_error:
+                stats.errors += 1
+                text = getattr(result.content[0], "text", "") if result.content else ""
+                self._sample(stats, text)
+        except Exception as exc:  # noqa: BLE001
+            stats.errors += 1
+            self._sample(stats, f"{type(exc).__name__}: {exc}")
+        origin = scheduled if scheduled is not None else started
+        stats.latencies.append((time.perf_counter() - origin) * 1000)
+
+    @staticmethod
+    def _sample(stats: ToolStats, message: str) -> None:
+        if len(stats.error_samples) < 3:
+            stats.error_samples.append(message[:200])
+
+    async def run_open(self, records: List[CallRecord], rate: Optional[float], speed: float) -> None:
+        loop_start = time.perf_counter()
+        tasks = []
+        for index, record in enumerate(records):
+            offset = index / rate if rate else record.offset / speed
+            scheduled = loop_start + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(self.call(record, scheduled)))
+        await asyncio.gather(*tasks)
+
+    async def run_closed(self, records: List[CallRecord], concurrency: int) -> None:
+        queue = iter(records)
+
+        async def worker() -> None:
+            for record in queue:
+                await self.call(record)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return round(ordered[index], 3)
+
+
+def summarize(stats: Dict[str, ToolStats], elapsed: float) -> Dict[str, Any]:
+    tools = {}
+    total_calls = total_errors = 0
+    for tool, item in sorted(stats.items()):
+        calls = len(item.latencies)
+        total_calls += calls
+        total_errors += item.errors
+        tools[tool] = {
+            "calls": calls,
+            "errors": item.errors,
+            "error_rate": round(item.errors / calls, 4) if calls else 0.0,
+            "latency_ms": {
+                "p50": percentile(item.latencies, 0.50),
+                "p90": percentile(item.latencies, 0.90),
+                "p99": percentile(item.latencies, 0.99),
+                "max": round(max(item.latencies, default=0.0), 3),
+            },
+            "error_samples": item.error_samples,
+        }
+    return {
+        "calls": total_calls,
+        "errors": total_errors,
+        "error_rate": round(total_errors / total_calls, 4) if total_calls else 0.0,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(total_calls / elapsed, 3) if elapsed else 0.0,
+        "tools": tools,
+    }
+
+
+async def replay(args: argparse.Namespace) -> Dict[str, Any]:
+    base = load_records(args.traffic)
+    # 多轮回放时后一轮接在前一轮之后
+    span = base[-1].offset + _DEFAULT_GAP if base else 0.0
+    records = [
+        CallRecord(record.tool, record.arguments, record.offset + loop * span)
+        for loop in range(args.loops)
+        for record in base
+    ]
+
+    client = make_client(args.target, None if args.persist else args.state_dir)
+    async with client:
+        replayer = Replayer(client, args.timeout)
+        started = time.perf_counter()
+        if args.mode == "open":
+            await replayer.run_open(records, args.rate, args.speed)
+        else:
+            await replayer.run_closed(records, args.concurrency)
+        elapsed = time.perf_counter() - started
+
+    report = summarize(replayer.stats, elapsed)
+    report["config"] = {
+        "traffic": str(args.traffic),
+        "target": args.target,
+        "mode": args.mode,
+        "rate": args.rate,
+        "speed": args.speed,
+        "concurrency": args.concurrency,
+        "loops": args.loops,
+        "persist": args.persist,
+    }
+    report["late_starts"] = replayer.late_starts
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(
+        f"calls={report['calls']} errors={report['errors']} "
+        f"({report['error_rate']:.2%}) elapsed={report['elapsed_s']}s "
+        f"throughput={report['throughput_per_s']}/s late_starts={report['late_starts']}",
+        file=sys.stderr,
+    )
+    print(f"{'tool':<28} {'calls':>6} {'err%':>7} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}", file=sys.stderr)
+    for tool, item in report["tools"].items():
+        latency = item["latency_ms"]
+        print(
+            f"{tool:<28} {item['calls']:>6} {item['error_rate']:>7.2%} "
+            f"{latency['p50']:>9.1f} {latency['p90']:>9.1f} {latency['p99']:>9.1f} {latency['max']:>9.1f}",
+            file=sys.stderr,
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("traffic", type=Path, help="JSONL 流量记录")
+    parser.add_argument("--target", default="inprocess", help="inprocess / 服务脚本路径 / MCP URL")
+    parser.add_argument("--mode", choices=["open", "closed"], default="open")
+    parser.add_argument("--rate", type=float, help="开环固定速率（次/秒）；缺省时按记录时间回放")
+    parser.add_argument("--speed", type=float, default=1.0, help="按记录时间回放时的加速倍数")
+    parser.add_argument("--concurrency", type=int, default=4, help="闭环 worker 数")
+    parser.add_argument("--loops", type=int, default=1, help="重复回放的轮数")
+    parser.add_argument("--timeout", type=float, default=120.0, help="单次调用超时（秒）")
+    parser.add_argument("--output", help="结果 JSON 文件")
+    parser.add_argument("--persist", action="store_true", help="进程内目标写入真实的用户状态库与响应缓存")
+    args = parser.parse_args()
+
+    for name in ("httpx", "mcp"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as state_dir:
+        args.state_dir = state_dir
+        report = asyncio.run(replay(args))
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
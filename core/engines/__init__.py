@@ -3,9 +3,13 @@
 __all__ = [
     "conversation_engine",
     "grammar_engine",
+    "grammar_matcher",
     "grammar_rules",
     "lesson_engine",
     "scenario_engine",
+    "scenario_store",
+    "translation_memory",
     "user_state_engine",
+    "user_state_store",
     "ruby_utils",
 ]
@@ -2,59 +2,160 @@
 
 from __future__ import annotations
 
-from typing import List, Optional
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 
 from core.models import GrammarPoint, TurnResult, UserCorrection
-from core.services.ai_client import AIClient
+from core.services.ai_client import get_ai_client
 from core.utils.dp_log import LogFactory
+from core.utils.tracing import current_span, span, traced
 from core.engines.grammar_engine import detect_grammar
+from core.engines.translation_memory import get_translation_memory, split_sentences
 from core.engines.user_state_engine import (
     apply_level_update,
-    load_user_state,
-    save_user_state,
     update_state_with_turn,
+    update_user_state_async,
 )
 
 logger = LogFactory.get_logger(__name__)
-ai_client = AIClient()
 
+# 各阶段超时时间（秒），超时后使用降级结果，不影响其余阶段。
+STAGE_TIMEOUTS: Dict[str, Optional[float]] = {
+    "correction": 30.0,
+    "reply": 60.0,
+    "grammar": 5.0,
+    "translation": 30.0,
+}
 
-async def _call_ai(messages: list[dict]) -> str:
-    """调用统一 AI 客户端并提取文本内容。"""
+_FALLBACK_REPLY = "すみません、もう一度お願いします。"
 
-    result = await ai_client.chat(messages)
+# 允许命中 LLM 响应缓存的阶段；回复依赖上下文，默认不缓存。
+CACHED_STAGES = {"correction", "translation"}
+
+# 流式回复的回调：每收到一段回复文本就被调用一次。
+TokenSink = Callable[[str], Awaitable[None]]
+
+
+async def _call_ai(messages: list[dict], stage: str | None = None) -> str:
+    """调用统一 AI 客户端并提取文本内容；`stage` 属于 CACHED_STAGES 时走缓存。"""
+
+    with span("ai.chat", root=False, stage=stage) as ai_span:
+        client = get_ai_client()
+        result = await client.chat(messages, cache=stage in CACHED_STAGES)
+        ai_span.set(
+            model=client.model,
+            prompt_tokens=result.get("prompt_eval_count"),
+            completion_tokens=result.get("eval_count"),
+        )
     message = result.get("message", {})
     content = message.get("content", "")
     return content.strip()
 
 
+async def _run_stage(
+    name: str,
+    coro: Awaitable[Any],
+    fallback: Any,
+    timings: Dict[str, float],
+    degraded: List[str],
+) -> Any:
+    """执行单个阶段并记录耗时（毫秒）；超时或异常时返回降级结果，并把阶段名记入 degraded。"""
+
+    started = time.perf_counter()
+    with span(f"stage.{name}", root=False) as stage_span:
+        try:
+            return await asyncio.wait_for(coro, timeout=STAGE_TIMEOUTS.get(name))
+        except asyncio.TimeoutError:
+            logger.warning(f"stage {name} timed out, using fallback")
+            stage_span.set(fallback="timeout")
+            degraded.append(name)
+            return fallback
+        except Exception as exc:  # noqa: BLE001
+            logger.warning(f"stage {name} failed: {exc}, using fallback")
+            stage_span.set(fallback=type(exc).__name__)
+            degraded.append(name)
+            return fallback
+        finally:
+            timings[name] = round((time.perf_counter() - started) * 1000, 2)
+
+
+async def _stream_ai(messages: list[dict], on_token: TokenSink) -> str:
+    """流式调用 AI 客户端，逐段回调并返回完整文本。"""
+
+    chunks: list[str] = []
+    with span("ai.chat_stream", root=False) as ai_span:
+        async for chunk in get_ai_client().chat_stream(messages):
+            chunks.append(chunk)
+            await on_token(chunk)
+        ai_span.set(chunks=len(chunks))
+    return "".join(chunks).strip()
+
+
+@traced("process_user_utterance")
 async def process_user_utterance(
     user_text: str,
     history: Optional[list[dict]] = None,
     user_id: str | None = None,
+    on_reply_token: Optional[TokenSink] = None,
 ) -> TurnResult:
-    """完成一次用户输入到 AI 输出的对话轮次（异步版本）。"""
+    """完成一次用户输入到 AI 输出的对话轮次（异步版本）。
+
+    纠错与回复生成并行执行；回复就绪后立即并行启动翻译与语法识别。
+    各阶段耗时写入 `timings`，降级的阶段写入 `degraded`。传入 `on_reply_token` 时回复以流式生成，
+    每段文本生成后立即回调。
+    """
 
     logger.info("processing user utterance")
-    correction = await _analyze_user_sentence(user_text)
-    ai_reply = await _generate_ai_reply(user_text, history)
-    grammar_points = await _extract_grammar_points(ai_reply)
-    zh_translation = await _translate_to_zh(ai_reply)
+    current_span().set(user_id=user_id, stream=on_reply_token is not None)
+    timings: Dict[str, float] = {}
+    degraded: List[str] = []
+    started = time.perf_counter()
+
+    async def _reply_branch() -> tuple[str, List[GrammarPoint], str]:
+        reply = await _run_stage(
+            "reply",
+            _generate_ai_reply(user_text, history, on_reply_token),
+            _FALLBACK_REPLY,
+            timings,
+            degraded,
+        )
+        grammar, translation = await asyncio.gather(
+            _run_stage("grammar", _extract_grammar_points(reply), [], timings, degraded),
+            _run_stage("translation", _translate_to_zh(reply), "", timings, degraded),
+        )
+        return reply, grammar, translation
+
+    correction, (ai_reply, grammar_points, zh_translation) = await asyncio.gather(
+        _run_stage("correction", _analyze_user_sentence(user_text), None, timings, degraded),
+        _reply_branch(),
+    )
     turn_result: TurnResult = TurnResult(
         jp=ai_reply,
         zh=zh_translation,
         user_correction=correction,
         grammar_ai=grammar_points,
         level=None,
+        timings=timings,
+        degraded=degraded,
     )
 
-    if user_id:
-        state = load_user_state(user_id)
-        state = update_state_with_turn(state, turn_result)
-        state = apply_level_update(state)
-        save_user_state(state)
+    # 纠错降级时 None 会被当作“没有错误”，回复降级时语法点来自固定兜底文本，
+    # 两种情况都不能计入学习统计，否则后端故障会让等级虚高
+    stats_degraded = [name for name in ("correction", "reply") if name in degraded]
+    if user_id and stats_degraded:
+        logger.warning(f"skip state update for {user_id}: degraded stages {stats_degraded}")
+    elif user_id:
+        state_started = time.perf_counter()
+        with span("stage.state", root=False):
+            state = await update_user_state_async(
+                user_id,
+                lambda state: apply_level_update(update_state_with_turn(state, turn_result)),
+            )
         turn_result["level"] = state.get("level")
+        timings["state"] = round((time.perf_counter() - state_started) * 1000, 2)
 
+    timings["total"] = round((time.perf_counter() - started) * 1000, 2)
     return turn_result
 
 
@@ -71,7 +172,7 @@ async def _analyze_user_sentence(user_text: str) -> Optional[UserCorrection]:
             "content": f"请纠正这个日语句子并解释错误：{user_text}",
         },
     ]
-    suggestion = await _call_ai(messages)
+    suggestion = await _call_ai(messages, stage="correction")
     stripped = suggestion.strip()
     if not stripped:
         return None
@@ -92,8 +193,12 @@ async def _analyze_user_sentence(user_text: str) -> Optional[UserCorrection]:
     )
 
 
-async def _generate_ai_reply(user_text: str, history: Optional[list[dict]]) -> str:
-    """构造消息后调用统一 LLM 生成日文回复。"""
+async def _generate_ai_reply(
+    user_text: str,
+    history: Optional[list[dict]],
+    on_token: Optional[TokenSink] = None,
+) -> str:
+    """构造消息后调用统一 LLM 生成日文回复；提供 `on_token` 时流式生成。"""
 
     messages: list[dict] = [
         {
@@ -114,8 +219,11 @@ async def _generate_ai_reply(user_text: str, history: Optional[list[dict]]) -> s
             "content": f"你是一个日语对话伙伴，请用自然日语回复：{user_text}",
         }
     )
-    reply = await _call_ai(messages)
-    return reply.strip() or "すみません、もう一度お願いします。"
+    if on_token is None:
+        reply = await _call_ai(messages, stage="reply")
+    else:
+        reply = await _stream_ai(messages, on_token)
+    return reply.strip() or _FALLBACK_REPLY
 
 
 async def _extract_grammar_points(ai_reply: str) -> List[GrammarPoint]:
@@ -125,11 +233,43 @@ async def _extract_grammar_points(ai_reply: str) -> List[GrammarPoint]:
 
 
 async def _translate_to_zh(jp_text: str) -> str:
+    """日文到中文翻译：已知句子取自翻译记忆，仅未知句子交给 LLM。"""
+
+    segments = split_sentences(jp_text)
+    if not segments:
+        return jp_text
+
+    memory = get_translation_memory()
+    known = [memory.lookup(segment) for segment in segments]
+    if all(zh is None for zh in known):
+        return await _translate_with_llm(jp_text)
+
+    # 连续的未知句子合并为一段，保证上下文且减少调用次数。
+    runs: list[tuple[int, int]] = []
+    for index, zh in enumerate(known):
+        if zh is not None:
+            continue
+        if runs and runs[-1][1] == index:
+            runs[-1] = (runs[-1][0], index + 1)
+        else:
+            runs.append((index, index + 1))
+
+    translations = await asyncio.gather(
+        *(_translate_with_llm("".join(segments[start:end])) for start, end in runs)
+    )
+    for (start, end), translation in zip(runs, translations):
+        known[start] = translation
+        for index in range(start + 1, end):
+            known[index] = ""
+    return "".join(zh or "" for zh in known)
+
+
+async def _translate_with_llm(jp_text: str) -> str:
     """使用 LLM 进行简单的日文到中文翻译。"""
 
     messages = [
         {"role": "system", "content": "你是一名专业的中日互译译者。"},
         {"role": "user", "content": f"请把以下日语翻译成中文：{jp_text}"},
     ]
-    translation = await _call_ai(messages)
+    translation = await _call_ai(messages, stage="translation")
     return translation.strip() or jp_text
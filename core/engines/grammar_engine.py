@@ -1,27 +1,145 @@
-from typing import List
+import asyncio
+import atexit
+import multiprocessing
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional
 
-from core.models import GrammarPoint
+from core.models import GrammarBatchResult, GrammarMatch, GrammarPoint
 from core.utils.dp_log import LogFactory
+from core.utils.tracing import traced
+from core.engines.grammar_matcher import GrammarMatcher
 from core.engines.grammar_rules import GRAMMAR_PATTERNS
 
 logger = LogFactory.get_logger(__name__)
 
+_matcher: Optional[GrammarMatcher] = None
+_pool: Optional[ProcessPoolExecutor] = None
+# 保护 _pool 的创建、替换与任务提交，避免并发首调创建两个进程池，
+# 以及重载规则时向已关闭的进程池提交任务。
+_pool_lock = threading.Lock()
 
+# 批量检测时，少于该数量的文本直接在当前进程处理，避免进程池开销。
+BATCH_INLINE_THRESHOLD = 256
+
+
+def get_matcher() -> GrammarMatcher:
+    """返回由规则表编译的匹配自动机（首次调用时编译）。"""
+
+    global _matcher
+    if _matcher is None:
+        _matcher = GrammarMatcher(GRAMMAR_PATTERNS)
+        logger.info(f"grammar matcher compiled with {_matcher.rule_count} rules")
+    return _matcher
+
+
+def reload_grammar_rules() -> None:
+    """规则表变更后调用，下次检测时重新编译自动机。
+
+    进程池的工作进程持有创建时的规则快照，因此同时换下进程池：旧进程池以
+    wait=False 关闭且不取消任务，正在进行的批量检测会按旧规则完成；之后的
+    批量检测使用按新规则启动的进程池。
+    """
+
+    global _matcher, _pool
+    with _pool_lock:
+        _matcher = None
+        old_pool, _pool = _pool, None
+    if old_pool is not None:
+        old_pool.shutdown(wait=False)
+
+
+@traced("detect_grammar", root=False)
 def detect_grammar(jp_text: str) -> List[GrammarPoint]:
-    """简单遍历规则表并返回命中的语法点列表。"""
-
-    results: List[GrammarPoint] = []
-    lowered = jp_text.lower()
-
-    for rule in GRAMMAR_PATTERNS:
-        keywords = rule.get("pattern", [])
-        if any(keyword in lowered for keyword in keywords):
-            results.append(
-                GrammarPoint(
-                    name=rule.get("name", ""),
-                    description=rule.get("description", ""),
-                    example=rule.get("example", ""),
-                )
-            )
+    """单次扫描文本并返回命中的语法点列表。"""
+
+    results = get_matcher().detect(jp_text)
     logger.debug(f"detect_grammar matched {len(results)} items")
     return results
+
+
+def detect_grammar_spans(jp_text: str) -> List[GrammarMatch]:
+    """返回命中的语法点及其在文本中的位置。"""
+
+    results = get_matcher().detect_with_spans(jp_text)
+    logger.debug(f"detect_grammar_spans matched {len(results)} items")
+    return results
+
+
+def _map_chunks(chunks: List[List[str]]) -> Iterator[List[List[GrammarPoint]]]:
+    """把分块提交到进程池（首次调用时创建），返回按顺序产出结果的迭代器。
+
+    Executor.map 在返回前已提交全部任务，因此只需在提交期间持锁。
+    """
+
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn 避免在带有日志线程的进程中 fork；工作进程启动时用当前规则表的
+            # 快照编译自动机，而不是重新导入模块默认值，保证与进程内检测一致。
+            _pool = ProcessPoolExecutor(
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=([dict(rule) for rule in GRAMMAR_PATTERNS],),
+            )
+        return _pool.map(_detect_chunk, chunks)
+
+
+@atexit.register
+def _shutdown_pool() -> None:
+    """进程退出时关闭进程池。"""
+
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+
+def _init_worker(rules: List[dict]) -> None:
+    """工作进程初始化：按父进程传入的规则表编译自动机。"""
+
+    global _matcher
+    _matcher = GrammarMatcher(rules)
+
+
+def _detect_chunk(texts: List[str]) -> List[List[GrammarPoint]]:
+    """工作进程内执行：检测一批文本。"""
+
+    matcher = get_matcher()
+    return [matcher.detect(text) for text in texts]
+
+
+def detect_grammar_batch(texts: List[str]) -> GrammarBatchResult:
+    """批量检测语法点，大批量时分块分发到多个 CPU 核心。
+
+    返回结果与输入顺序一致，并附带每个语法点命中的文本数。
+    """
+
+    if len(texts) < BATCH_INLINE_THRESHOLD:
+        results = _detect_chunk(texts)
+    else:
+        workers = os.cpu_count() or 1
+        chunk_size = max(1, -(-len(texts) // (workers * 4)))
+        chunks = [texts[i : i + chunk_size] for i in range(0, len(texts), chunk_size)]
+        results = [
+            points for chunk in _map_chunks(chunks) for points in chunk
+        ]
+
+    rule_counts: Counter[str] = Counter(
+        point["name"] for points in results for point in points
+    )
+    logger.info(f"detect_grammar_batch processed {len(texts)} texts")
+    return GrammarBatchResult(
+        results=results,
+        rule_counts=dict(rule_counts),
+        total=len(texts),
+    )
+
+
+async def detect_grammar_batch_async(texts: List[str]) -> GrammarBatchResult:
+    """`detect_grammar_batch` 的异步版本，等待期间不阻塞事件循环。"""
+
+    return await asyncio.to_thread(detect_grammar_batch, texts)
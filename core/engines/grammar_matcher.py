@@ -0,0 +1,123 @@
+"""基于 Aho-Corasick 自动机的多模式语法匹配器。
+
+规则表只在构建时编译一次，之后对任意文本只需单次扫描即可找出
+全部规则的全部关键词命中，耗时与规则数量无关。
+"""
+
+from collections import deque
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from core.models import GrammarMatch, GrammarPoint
+
+
+def _fold(text: str) -> Tuple[str, Optional[List[int]]]:
+    """转为小写；长度改变时（如 "İ" 小写为两个字符）附带每个字符在原文本中的下标。"""
+
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered, None
+    chars: List[str] = []
+    origins: List[int] = []
+    for index, char in enumerate(text):
+        folded = char.lower()
+        chars.append(folded)
+        origins.extend([index] * len(folded))
+    return "".join(chars), origins
+
+
+class GrammarMatcher:
+    """由语法规则表编译而成的多模式匹配自动机。"""
+
+    def __init__(self, rules: Iterable[Mapping]):
+        self._points: List[GrammarPoint] = []
+        # 自动机：状态转移表、失败指针、每个状态的输出（规则下标, 关键词长度）
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, int]]] = [[]]
+
+        for rule_index, rule in enumerate(rules):
+            self._points.append(
+                GrammarPoint(
+                    name=rule.get("name", ""),
+                    description=rule.get("description", ""),
+                    example=rule.get("example", ""),
+                )
+            )
+            for keyword in set(rule.get("pattern", [])):
+                if keyword:
+                    self._insert(keyword.lower(), rule_index)
+        self._build_fail_links()
+
+    @property
+    def rule_count(self) -> int:
+        """已编译的规则数量。"""
+
+        return len(self._points)
+
+    def _insert(self, keyword: str, rule_index: int) -> None:
+        """把单个关键词插入字典树。"""
+
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[state][char] = next_state
+            state = next_state
+        self._out[state].append((rule_index, len(keyword)))
+
+    def _build_fail_links(self) -> None:
+        """按层序构建失败指针，并把后缀状态的输出合并进来。"""
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._out[next_state].extend(self._out[self._fail[next_state]])
+
+    def find_spans(self, text: str) -> Dict[int, List[Tuple[int, int]]]:
+        """单次扫描文本，返回 {规则下标: [(起始, 结束), ...]}，下标对应原文本。"""
+
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        hits: Dict[int, List[Tuple[int, int]]] = {}
+
+        lowered, origins = _fold(text)
+        state = 0
+        for position, char in enumerate(lowered):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for rule_index, length in out[state]:
+                start, end = position + 1 - length, position + 1
+                if origins is not None:
+                    start, end = origins[start], origins[position] + 1
+                hits.setdefault(rule_index, []).append((start, end))
+        return hits
+
+    def detect(self, text: str) -> List[GrammarPoint]:
+        """返回命中的语法点列表（按规则表顺序）。"""
+
+        return [
+            GrammarPoint(**self._points[index]) for index in sorted(self.find_spans(text))
+        ]
+
+    def detect_with_spans(self, text: str) -> List[GrammarMatch]:
+        """返回命中的语法点及其在文本中的位置（按规则表顺序）。"""
+
+        hits = self.find_spans(text)
+        return [
+            GrammarMatch(
+                point=GrammarPoint(**self._points[index]), spans=sorted(hits[index])
+            )
+            for index in sorted(hits)
+        ]
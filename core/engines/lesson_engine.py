@@ -1,78 +1,23 @@
-"""课程分步教学引擎。"""
+"""课程分步教学引擎。
 
-from typing import Any, Dict, List, Optional
+课程目录从 data/lessons.json 加载一次，建立 id → 课程索引并预先生成每门课的
+步骤数组；文件修改时间变化后整体重建并原子替换，查询均为 O(1)。
+对外返回的课程与步骤都是副本，调用方修改不会影响目录。
+"""
 
-from core.models import GrammarItem, Lesson, VocabItem
+import copy
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from core.models import Lesson
 from core.utils.dp_log import LogFactory
+from core.utils.helpers import DATA_DIR, load_json
 
 logger = LogFactory.get_logger(__name__)
 
-SAMPLE_LESSONS: List[Lesson] = [
-    {
-        "id": "n5_lesson_01",
-        "title": "自我介绍入门",
-        "level": "N5",
-        "vocab": [
-            {
-                "jp": "はじめまして",
-                "reading": "はじめまして",
-                "zh": "初次见面",
-                "example": "はじめまして、山田です。",
-            },
-            {
-                "jp": "よろしくお願いします",
-                "reading": "よろしくおねがいします",
-                "zh": "请多关照",
-                "example": "これからよろしくお願いします。",
-            },
-            {
-                "jp": "学生",
-                "reading": "がくせい",
-                "zh": "学生",
-                "example": "私は学生です。",
-            },
-            {
-                "jp": "会社員",
-                "reading": "かいしゃいん",
-                "zh": "公司职员",
-                "example": "父は会社員です。",
-            },
-        ],
-        "grammar": [
-            {
-                "name": "～です",
-                "pattern": "名词 + です",
-                "explanation": "表示判断或说明，礼貌体。",
-                "examples": ["私は学生です。", "田中さんは会社員です。"],
-                "level": "N5",
-            },
-            {
-                "name": "～は～です",
-                "pattern": "名词1 は 名词2 です",
-                "explanation": "提示主题并进行说明。",
-                "examples": ["私は山田です。", "これは本です。"],
-                "level": "N5",
-            },
-            {
-                "name": "～も",
-                "pattern": "名词 も",
-                "explanation": "表示“也”，与前项并列。",
-                "examples": ["私も学生です。", "彼も日本人です。"],
-                "level": "N5",
-            },
-        ],
-    }
-]
-
-
-def get_lesson(lesson_id: str) -> Optional[Lesson]:
-    """根据 lesson_id 查找 Lesson。"""
-
-    for lesson in SAMPLE_LESSONS:
-        if lesson["id"] == lesson_id:
-            return lesson
-    logger.warning(f"lesson not found: {lesson_id}")
-    return None
+LESSONS_PATH = DATA_DIR / "lessons.json"
 
 
 def get_lesson_steps(lesson: Lesson) -> list[dict]:
@@ -110,15 +55,130 @@ def get_lesson_steps(lesson: Lesson) -> list[dict]:
     return steps
 
 
-def get_step(lesson_id: str, step_index: int) -> Dict[str, Any]:
-    """外部统一入口，返回指定步骤内容。"""
+class _LessonCatalog:
+    """某一时刻的课程目录快照，构建完成后不再修改。"""
+
+    def __init__(self, lessons: List[Lesson], mtime_ns: int):
+        self.mtime_ns = mtime_ns
+        self.lessons: Dict[str, Lesson] = {}
+        self.steps: Dict[str, Tuple[dict, ...]] = {}
+        self.overviews: Dict[str, dict] = {}
+        for lesson in lessons:
+            lesson.setdefault("vocab", [])
+            lesson.setdefault("grammar", [])
+            lesson_id = lesson["id"]
+            self.lessons[lesson_id] = lesson
+            self.steps[lesson_id] = tuple(get_lesson_steps(lesson))
+            self.overviews[lesson_id] = {
+                "id": lesson_id,
+                "title": lesson.get("title"),
+                "level": lesson.get("level"),
+                "vocab_count": len(lesson["vocab"]),
+                "grammar_count": len(lesson["grammar"]),
+            }
+
+
+class LessonRepository:
+    """从 JSON 文件加载并按修改时间热重载的课程仓库。"""
+
+    def __init__(self, path: Path = LESSONS_PATH, check_interval: float = 1.0):
+        """
+        :param path: 课程目录文件
+        :param check_interval: 两次检查文件修改时间的最小间隔（秒）
+        """
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._catalog = _LessonCatalog([], mtime_ns=-1)
+        self._checked_at = float("-inf")
+        self._reload_lock = threading.Lock()
+
+    def _current(self) -> _LessonCatalog:
+        """返回当前快照；到达检查间隔且文件已变化时先重建。"""
+
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            self._reload_if_changed()
+        return self._catalog
+
+    def _reload_if_changed(self) -> None:
+        try:
+            mtime_ns = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = 0
+        if mtime_ns == self._catalog.mtime_ns:
+            return
+        if mtime_ns == 0 and self._catalog.lessons:
+            # 文件被删除或正在替换时保留旧目录
+            logger.warning(f"lesson catalogue missing, keeping previous: {self.path}")
+            return
+
+        with self._reload_lock:
+            if mtime_ns == self._catalog.mtime_ns:
+                return
+            try:
+                lessons = load_json(self.path, [])
+                catalog = _LessonCatalog(lessons, mtime_ns)
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as exc:
+                # 文件写到一半、读取期间被删除或格式错误时保留旧目录，等下次修改后再试。
+                logger.error(f"failed to load lessons from {self.path}: {exc}")
+                return
+            self._catalog = catalog
+        logger.info(f"lesson catalogue loaded: {len(catalog.lessons)} lessons")
+
+    def get(self, lesson_id: str) -> Optional[Lesson]:
+        return self._current().lessons.get(lesson_id)
+
+    def steps(self, lesson_id: str) -> Optional[Tuple[dict, ...]]:
+        return self._current().steps.get(lesson_id)
+
+    def overview(self, lesson_id: str) -> Optional[dict]:
+        return self._current().overviews.get(lesson_id)
+
+    def __iter__(self) -> Iterator[Lesson]:
+        return iter(list(self._current().lessons.values()))
+
+    def __len__(self) -> int:
+        return len(self._current().lessons)
+
+
+lesson_repository = LessonRepository()
+
+
+def iter_lessons() -> Iterator[Lesson]:
+    """遍历当前目录中的全部课程（副本）。"""
+
+    return (copy.deepcopy(lesson) for lesson in lesson_repository)
+
+
+def get_lesson(lesson_id: str) -> Optional[Lesson]:
+    """根据 lesson_id 查找 Lesson，返回副本。"""
 
-    lesson = get_lesson(lesson_id)
+    lesson = lesson_repository.get(lesson_id)
     if lesson is None:
+        logger.warning(f"lesson not found: {lesson_id}")
+        return None
+    return copy.deepcopy(lesson)
+
+
+def get_lesson_overview(lesson_id: str) -> Dict[str, Any]:
+    """返回课程概览（标题、等级、词汇与语法数量），未找到时返回空字典。"""
+
+    overview = lesson_repository.overview(lesson_id)
+    if overview is None:
+        logger.warning(f"lesson not found: {lesson_id}")
+        return {}
+    return dict(overview)
+
+
+def get_step(lesson_id: str, step_index: int) -> Dict[str, Any]:
+    """外部统一入口，返回指定步骤内容（副本）。"""
+
+    steps = lesson_repository.steps(lesson_id)
+    if steps is None:
         raise ValueError(f"未找到课程：{lesson_id}")
 
-    steps = get_lesson_steps(lesson)
     if step_index < 0 or step_index >= len(steps):
         raise IndexError(f"步骤索引越界：{step_index}")
 
-    return steps[step_index]
+    return copy.deepcopy(steps[step_index])
@@ -1,38 +1,32 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, Optional
 
 from core.engines.conversation_engine import process_user_utterance
+from core.engines.scenario_store import scenario_store
 from core.models import Scenario, ScenarioTurn
 from core.utils.dp_log import LogFactory
 
 logger = LogFactory.get_logger(__name__)
 
-SAMPLE_SCENARIOS: List[Scenario] = [
-    {
-        "id": "scene_conbini_01",
-        "title": "在便利店购物",
-        "description": "练习在便利店购物时的基本对话与礼貌表达。",
-        "level": "N5",
-        "related_lessons": ["n5_lesson_01"],
-        "script": [
-            {"role": "system", "jp": "コンビニに入りました。", "zh": "你走进了一家便利店。"},
-            {"role": "npc", "jp": "いらっしゃいませ！", "zh": "欢迎光临！"},
-            {"role": "system", "jp": "商品を手に取りました。", "zh": "你拿起了想买的商品。"},
-            {"role": "npc", "jp": "温めますか？", "zh": "需要加热吗？"},
-            {"role": "system", "jp": "レジに並んでいます。", "zh": "你正排队结账。"},
-            {"role": "npc", "jp": "ポイントカードはお持ちですか？", "zh": "有积分卡吗？"},
-        ],
-    }
-]
-
 
 def get_scenario(scenario_id: str) -> Optional[Scenario]:
-    """根据场景 ID 查找对应的场景定义。"""
+    """根据场景 ID 查找对应的场景定义（按需从语料文件解析）。"""
+
+    scenario = scenario_store.get(scenario_id)
+    if scenario is None:
+        logger.warning(f"scenario not found: {scenario_id}")
+    return scenario
+
+
+def iter_scenarios() -> Iterator[Scenario]:
+    """逐个遍历语料中的全部场景。"""
+
+    return iter(scenario_store)
+
+
+def get_store_stats() -> Dict[str, Any]:
+    """返回场景存储的索引规模、缓存情况与内存占用。"""
 
-    for scenario in SAMPLE_SCENARIOS:
-        if scenario["id"] == scenario_id:
-            return scenario
-    logger.warning(f"scenario not found: {scenario_id}")
-    return None
+    return scenario_store.stats()
 
 
 def get_step(scenario_id: str, step_index: int) -> dict:
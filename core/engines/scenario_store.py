@@ -0,0 +1,282 @@
+"""场景语料存储：按字节偏移索引 data/scenarios.json，按需解析单个场景。
+
+内存中只保留 id → (起始, 结束) 字节偏移索引；查询时用 os.pread 从打开的文件
+中读出对应片段解析，最近使用的场景放入有界 LRU，返回给调用方的是副本。
+建索引时分块读取文件，只扫描每个场景顶层的 "id" 字段，不做完整解析。
+
+每次访问都比较文件的 (inode, 大小, 修改时间)，变化后先重建索引再读取；
+片段解析失败或 id 不符（文件在两次检查之间被原地改写）时同样重建后重试，
+不会把过期偏移上的内容返回给调用方。
+"""
+
+import copy
+import json
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from core.models import Scenario
+from core.utils.dp_log import LogFactory
+from core.utils.helpers import DATA_DIR
+from core.utils.metrics import get_metrics
+
+logger = LogFactory.get_logger(__name__)
+
+SCENARIOS_PATH = DATA_DIR / "scenarios.json"
+
+# 建索引时每次读取的字节数；未扫描完的场景会与下一块拼接后重新扫描
+SCAN_CHUNK_BYTES = 1024 * 1024
+
+# 扫描时关心的结构字符：字符串边界、转义与括号。
+_TOKEN_RE = re.compile(rb'["\\{}\[\]]')
+# 键之后的冒号与字符串值
+_STRING_VALUE_RE = re.compile(rb'\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+# 文件身份：(inode, 大小, 修改时间)；文件不存在时为 None
+_Signature = Optional[Tuple[int, int, int]]
+
+
+def scan_objects(buf: Any, depth: int = 0) -> Iterator[Tuple[int, int, Optional[str]]]:
+    """扫描 JSON 数组，逐个产出顶层对象的字节区间 [起始, 结束) 与其 "id" 字段。
+
+    id 在同一次扫描中取出：对象内第一层的键 "id" 后紧跟字符串值时才采用，
+    其余字段不做解析；缺少或不是字符串时为 None。`depth` 为 buf 开头处的
+    嵌套深度：从数组开头扫描时为 0，从两个元素之间继续扫描时为 1。
+    """
+
+    in_string = False
+    skip_at = -1
+    start = -1
+    string_start = -1
+    object_id: Optional[str] = None
+    for match in _TOKEN_RE.finditer(buf):
+        pos = match.start()
+        if pos == skip_at:
+            continue
+        token = match.group()
+        if in_string:
+            if token == b"\\":
+                skip_at = pos + 1
+            elif token == b'"':
+                in_string = False
+                # 只有键后面紧跟冒号，值恰好为 "id" 的字符串不会误判
+                if depth == 2 and object_id is None and buf[string_start:pos] == b"id":
+                    value = _STRING_VALUE_RE.match(buf, pos + 1)
+                    if value is not None:
+                        object_id = json.loads(b'"' + value.group(1) + b'"')
+            continue
+        if token == b'"':
+            in_string = True
+            string_start = pos + 1
+        elif token in (b"{", b"["):
+            if depth == 1 and token == b"{":
+                start = pos
+                object_id = None
+            depth += 1
+        elif token in (b"}", b"]"):
+            depth -= 1
+            if depth == 1 and token == b"}":
+                yield start, pos + 1, object_id
+
+
+def _scan_file(fd: int, size: int) -> Iterator[Tuple[int, int, Optional[str]]]:
+    """分块读取文件并扫描，产出与 scan_objects 相同的 (起始, 结束, id)，偏移相对文件开头。
+
+    每块扫描后丢弃已完整产出的场景，只把末尾未闭合的部分留到下一块，
+    内存占用约为一块加上最大的单个场景。
+    """
+
+    base = 0
+    buf = b""
+    depth = 0
+    while base + len(buf) < size:
+        chunk = os.pread(fd, SCAN_CHUNK_BYTES, base + len(buf))
+        if not chunk:
+            break
+        buf += chunk
+        consumed = 0
+        for start, end, object_id in scan_objects(buf, depth):
+            yield base + start, base + end, object_id
+            consumed = end
+        if consumed:
+            base += consumed
+            buf = buf[consumed:]
+            depth = 1
+
+
+class ScenarioStore:
+    """基于字节偏移索引的惰性场景存储。"""
+
+    def __init__(self, path: Path = SCENARIOS_PATH, cache_size: int = 128):
+        """
+        :param path: 场景语料文件（JSON 数组）
+        :param cache_size: 已解析场景的 LRU 容量
+        """
+        self.path = Path(path)
+        self.cache_size = cache_size
+        self._lock = threading.RLock()
+        self._fd: Optional[int] = None
+        self._signature: _Signature = None
+        self._indexed = False
+        self._index: Dict[str, Tuple[int, int]] = {}
+        self._cache: "OrderedDict[str, Scenario]" = OrderedDict()
+        self._counters = {"cache_hits": 0, "cache_misses": 0, "rebuilds": 0}
+
+    def _stat(self) -> _Signature:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _refresh(self, force: bool = False) -> None:
+        """文件与索引时不一致（或 force）时重新打开并建立索引（调用方持有锁）。"""
+
+        signature = self._stat()
+        if self._indexed and not force and signature == self._signature:
+            return
+
+        self._close()
+        self._indexed = True
+        self._counters["rebuilds"] += 1
+        if signature is None or signature[1] == 0:
+            self._signature = signature
+            logger.warning(f"scenario corpus missing or empty: {self.path}")
+            return
+
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except FileNotFoundError:
+            self._signature = None
+            logger.warning(f"scenario corpus missing or empty: {self.path}")
+            return
+        # 以打开的文件为准：stat 与 open 之间文件可能已被替换
+        stat = os.fstat(fd)
+        self._fd = fd
+        self._signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        for start, end, scenario_id in _scan_file(fd, stat.st_size):
+            if scenario_id:
+                self._index[scenario_id] = (start, end)
+            else:
+                logger.error(f"scenario without id at byte {start}")
+        logger.info(f"scenario index built: {len(self._index)} scenarios")
+
+    def _close(self) -> None:
+        self._index = {}
+        self._cache.clear()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _read(self, span: Tuple[int, int]) -> Any:
+        """读取并解析一个片段（调用方持有锁）；片段不完整时抛出 ValueError。"""
+
+        assert self._fd is not None
+        start, end = span
+        return json.loads(os.pread(self._fd, end - start, start))
+
+    def _parse(self, scenario_id: str) -> Optional[Scenario]:
+        """从文件解析一个场景；内容与索引不符时重建索引重试一次（调用方持有锁）。"""
+
+        for attempt in range(2):
+            span = self._index.get(scenario_id)
+            if span is None:
+                return None
+            try:
+                scenario = self._read(span)
+            except ValueError as exc:
+                scenario, error = None, exc
+            else:
+                if isinstance(scenario, dict) and scenario.get("id") == scenario_id:
+                    return scenario
+                error = "id mismatch"
+            if attempt == 0:
+                logger.warning(f"scenario {scenario_id} changed on disk ({error}), rebuilding index")
+                self._refresh(force=True)
+        logger.error(f"failed to read scenario {scenario_id} from {self.path}")
+        return None
+
+    def get(self, scenario_id: str) -> Optional[Scenario]:
+        """按 id 返回场景副本；命中 LRU 时复制缓存对象，否则从文件解析。"""
+
+        with self._lock:
+            self._refresh()
+            scenario = self._cache.get(scenario_id)
+            if scenario is not None:
+                self._cache.move_to_end(scenario_id)
+                self._counters["cache_hits"] += 1
+                return copy.deepcopy(scenario)
+
+            if scenario_id not in self._index:
+                return None
+            self._counters["cache_misses"] += 1
+            scenario = self._parse(scenario_id)
+            if scenario is None:
+                return None
+            self._cache[scenario_id] = scenario
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return copy.deepcopy(scenario)
+
+    def __iter__(self) -> Iterator[Scenario]:
+        """逐个解析全部场景（不进入 LRU，用于离线遍历）；文件变化后停止。"""
+
+        with self._lock:
+            self._refresh()
+            spans = list(self._index.values())
+            signature = self._signature
+        for span in spans:
+            with self._lock:
+                if self._stat() != signature or self._signature != signature:
+                    logger.warning(f"scenario corpus changed during iteration: {self.path}")
+                    return
+                try:
+                    scenario = self._read(span)
+                except ValueError as exc:
+                    logger.error(f"failed to read scenario at byte {span[0]}: {exc}")
+                    return
+            yield scenario
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._index)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回索引规模、缓存命中情况与大致内存占用（字节）。"""
+
+        with self._lock:
+            self._refresh()
+            lookups = self._counters["cache_hits"] + self._counters["cache_misses"]
+            index_bytes = sys.getsizeof(self._index) + sum(
+                sys.getsizeof(key) + sys.getsizeof(span) for key, span in self._index.items()
+            )
+            cache_bytes = sum(
+                len(json.dumps(scenario, ensure_ascii=False).encode("utf-8"))
+                for scenario in self._cache.values()
+            )
+            return {
+                "scenarios": len(self._index),
+                "cached": len(self._cache),
+                "cache_capacity": self.cache_size,
+                "file_bytes": self._signature[1] if self._signature is not None else 0,
+                "index_bytes": index_bytes,
+                "cache_bytes_estimate": cache_bytes,
+                **self._counters,
+                "cache_hit_rate": round(self._counters["cache_hits"] / lookups, 4) if lookups else 0.0,
+            }
+
+
+scenario_store = ScenarioStore()
+
+
+def _collect_stats() -> Dict[str, Any]:
+    # 语料尚未加载时不在这里触发建索引
+    return scenario_store.stats() if scenario_store._indexed else {}
+
+
+get_metrics().register_collector("scenario_store", _collect_stats)
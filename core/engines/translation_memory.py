@@ -0,0 +1,115 @@
+"""日→中翻译记忆：复用课程与场景数据中已有的人工译文。
+
+索引来源：
+- 场景语料（data/scenarios.json）中的脚本台词（jp / zh）
+- 课程目录（data/lessons.json）中的词汇（jp / zh）
+
+翻译时按句切分，已知句子直接取译文，只有未知句子才交给 LLM。
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.engines.lesson_engine import iter_lessons
+from core.engines.scenario_store import scenario_store
+from core.utils.dp_log import LogFactory
+from core.utils.metrics import get_metrics
+
+logger = LogFactory.get_logger(__name__)
+
+# 句子：以句末标点结尾的一段文本，或末尾不带标点的剩余文本。
+_SENTENCE_RE = re.compile(r"[^。！？!?\n]*[。！？!?]+|[^。！？!?\n]+")
+# 归一化时忽略的首尾字符（空白与句末/句中标点）。
+_TRIM_CHARS = " \t\r\n　。、！？!?,，."
+
+
+def split_sentences(text: str) -> List[str]:
+    """按日文句末标点与换行切分文本，保留各句自身的标点。"""
+
+    return [seg for seg in _SENTENCE_RE.findall(text) if seg.strip()]
+
+
+def _normalize(text: str) -> str:
+    return text.strip(_TRIM_CHARS)
+
+
+class TranslationMemory:
+    """日文句子到中文译文的精确匹配索引。"""
+
+    def __init__(self) -> None:
+        self._pairs: Dict[str, str] = {}
+        self._counters = {"hits": 0, "misses": 0}
+
+    def __len__(self) -> int:
+        return len(self._pairs)
+
+    def add(self, jp: str, zh: str) -> None:
+        """登记一条译文；空文本会被忽略，已存在的条目不会被覆盖。"""
+
+        key = _normalize(jp or "")
+        if key and zh and key not in self._pairs:
+            self._pairs[key] = zh.strip()
+
+    def add_pairs(self, pairs: Iterable[Tuple[str, str]]) -> None:
+        for jp, zh in pairs:
+            self.add(jp, zh)
+
+    def lookup(self, jp: str) -> Optional[str]:
+        """查询单句译文，未登记时返回 None。"""
+
+        zh = self._pairs.get(_normalize(jp))
+        self._counters["hits" if zh is not None else "misses"] += 1
+        return zh
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self._counters["hits"] + self._counters["misses"]
+        hit_rate = round(self._counters["hits"] / lookups, 4) if lookups else 0.0
+        return {"entries": len(self._pairs), **self._counters, "hit_rate": hit_rate}
+
+
+def _scenario_pairs(scenarios: Iterable[dict]) -> Iterable[Tuple[str, str]]:
+    for scenario in scenarios:
+        for turn in scenario.get("script", []):
+            yield turn.get("jp", ""), turn.get("zh", "")
+
+
+def _lesson_pairs(lessons: Iterable[dict]) -> Iterable[Tuple[str, str]]:
+    for lesson in lessons:
+        for vocab in lesson.get("vocab", []):
+            yield vocab.get("jp", ""), vocab.get("zh", "")
+
+
+def build_translation_memory() -> TranslationMemory:
+    """从场景与课程数据汇总全部已知译文。"""
+
+    memory = TranslationMemory()
+    memory.add_pairs(_scenario_pairs(scenario_store))
+    memory.add_pairs(_lesson_pairs(iter_lessons()))
+    logger.info(f"translation memory built with {len(memory)} entries")
+    return memory
+
+
+_memory: Optional[TranslationMemory] = None
+
+
+def get_translation_memory() -> TranslationMemory:
+    """返回进程内共享的翻译记忆（首次调用时构建）。"""
+
+    global _memory
+    if _memory is None:
+        _memory = build_translation_memory()
+    return _memory
+
+
+def reload_translation_memory() -> None:
+    """数据源变更后调用，下次查询时重新构建。"""
+
+    global _memory
+    _memory = None
+
+
+def _collect_stats() -> Dict[str, float]:
+    return _memory.stats() if _memory is not None else {}
+
+
+get_metrics().register_collector("translation_memory", _collect_stats)
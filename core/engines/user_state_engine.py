@@ -2,57 +2,343 @@
 
 from __future__ import annotations
 
+import asyncio
+import atexit
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Dict
-
+from typing import Callable, Dict, List, Optional, Set
+
+from core.engines.user_state_store import (
+    DEFAULT_DB_PATH,
+    DEFAULT_JSON_DIR,
+    JsonUserStateBackend,
+    SQLiteUserStateBackend,
+    UserStateBackend,
+)
 from core.models import GrammarStats, TurnResult, UserState
 from core.utils.dp_log import LogFactory
-from core.utils.helpers import dump_json, load_json
+from core.utils.tracing import traced
 
 logger = LogFactory.get_logger(__name__)
 
 DEFAULT_LEVEL = "N5"
-_STATE_DIR = Path("data") / "user_state"
 
+_backend: Optional[UserStateBackend] = None
+# 保护 _backend 的首次创建与替换；异步入口在线程池中执行，可能并发首调。
+# 可重入：get_state_backend 持锁时会调用 configure_state_backend
+_backend_lock = threading.RLock()
+
+# 用户锁按 user_id 哈希分片，数量固定，不随用户数增长；
+# 不同用户偶尔共用一把锁只会多一点等待，调用方任何时候只持有一把用户锁。
+USER_LOCK_STRIPES = 256
+_user_locks: List[threading.Lock] = [threading.Lock() for _ in range(USER_LOCK_STRIPES)]
+
+
+def _copy_state(state: UserState) -> UserState:
+    """复制状态，使缓存内的常驻对象不被调用方直接修改。"""
+
+    copied = dict(state)
+    copied["grammar_stats"] = {
+        name: dict(stats) for name, stats in state.get("grammar_stats", {}).items()
+    }
+    return copied  # type: ignore[return-value]
+
+
+class UserStateCache:
+    """写回（write-behind）缓存：热用户常驻内存，脏数据批量落盘。
+
+    落盘时机：定时（flush_interval 秒）、脏用户数达到 flush_threshold、
+    进程退出。容量超过 max_entries 时按 LRU 淘汰干净条目。
+    进程崩溃最多丢失最近一个落盘周期内的更新。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        flush_interval: float = 5.0,
+        flush_threshold: int = 64,
+    ):
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._entries: "OrderedDict[str, UserState]" = OrderedDict()
+        self._dirty: Set[str] = set()
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    def get(self, user_id: str) -> Optional[UserState]:
+        with self._lock:
+            state = self._entries.get(user_id)
+            if state is None:
+                return None
+            self._entries.move_to_end(user_id)
+            return _copy_state(state)
+
+    def add_clean(self, state: UserState) -> None:
+        """放入刚从后端读到的状态（不标记为脏）。"""
+
+        with self._lock:
+            if state["user_id"] in self._entries:
+                return
+            self._entries[state["user_id"]] = _copy_state(state)
+            self._evict()
+
+    def put(self, state: UserState) -> None:
+        """写入新状态并标记为脏，必要时触发批量落盘。"""
+
+        with self._lock:
+            user_id = state["user_id"]
+            self._entries[user_id] = _copy_state(state)
+            self._entries.move_to_end(user_id)
+            self._dirty.add(user_id)
+            self._ensure_flusher()
+            if len(self._dirty) >= self.flush_threshold:
+                self.flush()
+            self._evict()
+
+    def flush(self) -> int:
+        """把全部脏用户一次性写入后端，返回写入数量。"""
+
+        with self._lock:
+            if not self._dirty:
+                return 0
+            states: List[UserState] = [
+                _copy_state(self._entries[user_id]) for user_id in self._dirty
+            ]
+            get_state_backend().save_many(states)
+            self._dirty.clear()
+        logger.debug(f"flushed {len(states)} user states")
+        return len(states)
+
+    def _evict(self) -> None:
+        """超出容量时淘汰最久未使用的干净条目（调用方持有锁）。"""
+
+        if len(self._entries) <= self.max_entries:
+            return
+        if len(self._dirty) >= len(self._entries):
+            self.flush()
+        for user_id in list(self._entries):
+            if len(self._entries) <= self.max_entries:
+                break
+            if user_id not in self._dirty:
+                del self._entries[user_id]
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is None:
+            self._flusher = threading.Thread(
+                target=self._run_flusher, name="user-state-flusher", daemon=True
+            )
+            self._flusher.start()
+
+    def _run_flusher(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as exc:  # noqa: BLE001
+                logger.error(f"user state flush failed: {exc}")
+
+    def close(self) -> None:
+        """停止定时线程并落盘剩余脏数据。"""
+
+        self._stop.set()
+        self.flush()
+
+
+_state_cache: Optional[UserStateCache] = UserStateCache()
+
+
+def configure_state_cache(
+    enabled: bool = True,
+    max_entries: int = 1024,
+    flush_interval: float = 5.0,
+    flush_threshold: int = 64,
+) -> None:
+    """启用/关闭写回缓存；关闭后每次保存直接写入后端。"""
+
+    global _state_cache
+    if _state_cache is not None:
+        _state_cache.close()
+    _state_cache = (
+        UserStateCache(max_entries, flush_interval, flush_threshold) if enabled else None
+    )
 
-def _get_state_path(user_id: str) -> Path:
-    """返回某个用户对应的 JSON 状态文件路径。"""
 
-    return _STATE_DIR / f"{user_id}.json"
+def flush_user_states() -> int:
+    """立即把缓存中的脏用户写入后端。"""
 
+    return _state_cache.flush() if _state_cache is not None else 0
 
-def load_user_state(user_id: str) -> UserState:
-    """加载用户状态；若文件不存在则返回默认状态。"""
-
-    path = _get_state_path(user_id)
-    data = load_json(
-        path,
-        {
-            "user_id": user_id,
-            "level": DEFAULT_LEVEL,
-            "grammar_stats": {},
-        },
+
+@atexit.register
+def _flush_at_exit() -> None:
+    if _state_cache is not None:
+        _state_cache.close()
+
+
+def configure_state_backend(kind: str = "sqlite", path: Optional[Path] = None) -> None:
+    """选择用户状态后端：`sqlite`（默认，WAL）或 `json`（每用户一个文件）。
+
+    切换后端时先把脏数据写入旧后端，再换上新的空写回缓存，避免旧后端的
+    干净条目继续被读取、并在之后的落盘中被写进新后端。
+    """
+
+    global _backend, _state_cache
+    if kind not in ("sqlite", "json"):
+        raise ValueError(f"未知状态后端：{kind}")
+    with _backend_lock:
+        if _backend is not None:
+            if _state_cache is not None:
+                old_cache = _state_cache
+                old_cache.close()
+                _state_cache = UserStateCache(
+                    old_cache.max_entries, old_cache.flush_interval, old_cache.flush_threshold
+                )
+            _backend.close()
+        if kind == "sqlite":
+            _backend = SQLiteUserStateBackend(path or DEFAULT_DB_PATH)
+        else:
+            _backend = JsonUserStateBackend(path or DEFAULT_JSON_DIR)
+    logger.info(f"user state backend: {kind}")
+
+
+def get_state_backend() -> UserStateBackend:
+    """返回当前状态后端（首次调用时按默认配置创建）。"""
+
+    backend = _backend
+    if backend is None:
+        with _backend_lock:
+            if _backend is None:
+                configure_state_backend()
+            backend = _backend
+    assert backend is not None
+    return backend
+
+
+def user_lock(user_id: str) -> threading.Lock:
+    """返回串行化某个用户读-改-写的锁（按 user_id 分片，同一用户总是同一把锁）。"""
+
+    return _user_locks[hash(user_id) % USER_LOCK_STRIPES]
+
+
+def _default_state(user_id: str) -> UserState:
+    return UserState(
+        user_id=user_id,
+        level=DEFAULT_LEVEL,
+        grammar_stats={},
+        seen_total=0,
+        wrong_total=0,
     )
+
+
+def _backfill_totals(state: UserState) -> None:
+    """旧状态缺少累计字段时，一次性从 grammar_stats 汇总回填。"""
+
+    if "seen_total" in state and "wrong_total" in state:
+        return
+    stats = state.get("grammar_stats", {}).values()
+    state["seen_total"] = sum(item.get("seen", 0) for item in stats)
+    state["wrong_total"] = sum(item.get("wrong", 0) for item in stats)
+    logger.debug(f"backfilled totals for {state.get('user_id')}")
+
+
+@traced("user_state.load", root=False)
+def load_user_state(user_id: str) -> UserState:
+    """加载用户状态；优先读取写回缓存，若不存在则返回默认状态。"""
+
+    if _state_cache is not None:
+        cached = _state_cache.get(user_id)
+        if cached is not None:
+            return cached
+
+    data = get_state_backend().load(user_id) or _default_state(user_id)
     logger.debug(f"load_user_state for {user_id}")
-    return UserState(
+    state = UserState(
         user_id=data.get("user_id", user_id),
         level=data.get("level", DEFAULT_LEVEL),
         grammar_stats=data.get("grammar_stats", {}),
     )
+    if "seen_total" in data and "wrong_total" in data:
+        state["seen_total"] = data["seen_total"]
+        state["wrong_total"] = data["wrong_total"]
+    _backfill_totals(state)
+    if _state_cache is not None:
+        _state_cache.add_clean(state)
+    return state
 
 
+@traced("user_state.save", root=False)
 def save_user_state(state: UserState) -> None:
-    """将用户状态保存为 JSON 文件。"""
+    """保存用户状态；启用写回缓存时只标记为脏，由缓存批量落盘。"""
 
-    path = _get_state_path(state["user_id"])
-    dump_json(path, state)
+    if _state_cache is not None:
+        _state_cache.put(state)
+    else:
+        get_state_backend().save(state)
     logger.debug(f"save_user_state for {state.get('user_id')}")
 
 
+def update_user_state(
+    user_id: str, mutate: Callable[[UserState], UserState]
+) -> UserState:
+    """在用户锁内完成“读取 → 修改 → 保存”，避免并发轮次丢失更新。
+
+    用户锁只在本进程内有效；直写模式（未启用写回缓存）下再用后端的
+    exclusive() 事务串行化其他进程对同一数据库的更新。
+    """
+
+    guard = get_state_backend().exclusive() if _state_cache is None else nullcontext()
+    with user_lock(user_id), guard:
+        state = mutate(load_user_state(user_id))
+        save_user_state(state)
+        return state
+
+
+def reset_user_state(user_id: str) -> UserState:
+    """清空语法统计并把等级恢复为默认值。"""
+
+    def _reset(state: UserState) -> UserState:
+        state["grammar_stats"] = {}
+        state["level"] = DEFAULT_LEVEL
+        state["seen_total"] = 0
+        state["wrong_total"] = 0
+        return state
+
+    return update_user_state(user_id, _reset)
+
+
+# 异步入口：读写都是同步 SQLite 调用，多进程下 BEGIN IMMEDIATE 还可能在
+# busy_timeout 内等待其他 worker 释放写锁，放到线程中执行，避免阻塞事件循环。
+
+
+async def load_user_state_async(user_id: str) -> UserState:
+    """`load_user_state` 的异步版本。"""
+
+    return await asyncio.to_thread(load_user_state, user_id)
+
+
+async def update_user_state_async(
+    user_id: str, mutate: Callable[[UserState], UserState]
+) -> UserState:
+    """`update_user_state` 的异步版本。"""
+
+    return await asyncio.to_thread(update_user_state, user_id, mutate)
+
+
+async def reset_user_state_async(user_id: str) -> UserState:
+    """`reset_user_state` 的异步版本。"""
+
+    return await asyncio.to_thread(reset_user_state, user_id)
+
+
 def update_state_with_turn(state: UserState, turn: "TurnResult") -> UserState:
-    """根据对话结果更新语法统计信息。"""
+    """根据对话结果更新语法统计信息，并增量维护累计值。"""
 
     grammar_stats: Dict[str, GrammarStats] = state.setdefault("grammar_stats", {})
+    _backfill_totals(state)
+    wrong = turn.get("user_correction") is not None
 
     for grammar in turn.get("grammar_ai", []):
         name = grammar.get("name", "").strip()
@@ -60,8 +346,10 @@ def update_state_with_turn(state: UserState, turn: "TurnResult") -> UserState:
             continue
         stats = grammar_stats.setdefault(name, {"seen": 0, "wrong": 0})
         stats["seen"] += 1
-        if turn.get("user_correction") is not None:
+        state["seen_total"] += 1
+        if wrong:
             stats["wrong"] += 1
+            state["wrong_total"] += 1
 
     state["grammar_stats"] = grammar_stats
     return state
@@ -91,11 +379,11 @@ def _level_down(level: str) -> str:
 
 
 def decide_next_level(state: UserState) -> str:
-    """基于总体错误率简单决定下一阶段等级。"""
+    """基于总体错误率简单决定下一阶段等级（读取累计值，O(1)）。"""
 
-    grammar_stats = state.get("grammar_stats", {})
-    seen_total = sum(item.get("seen", 0) for item in grammar_stats.values())
-    wrong_total = sum(item.get("wrong", 0) for item in grammar_stats.values())
+    _backfill_totals(state)
+    seen_total = state["seen_total"]
+    wrong_total = state["wrong_total"]
 
     if seen_total == 0:
         return state.get("level", DEFAULT_LEVEL)
@@ -0,0 +1,283 @@
+"""用户状态存储后端。
+
+- `SQLiteUserStateBackend`：默认后端，WAL 模式，每个用户一行、每个语法点一行，
+  每次保存在单个事务内完成，崩溃不会留下半写入的数据。
+- `JsonUserStateBackend`：原有的 data/user_state/<id>.json 文件格式，写入改为
+  临时文件 + 原子替换。
+
+多个服务进程共用同一个 SQLite 文件时，`exclusive()` 把一次读-改-写放进
+BEGIN IMMEDIATE 事务，跨进程串行化同一数据库上的更新；JSON 后端不提供跨进程互斥。
+
+迁移旧 JSON 目录：
+    python -m core.engines.user_state_store migrate [--src data/user_state] [--db data/user_state.db]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import ContextManager, Iterable, Iterator, List, Optional
+
+from core.models import UserState
+from core.utils.dp_log import LogFactory
+from core.utils.helpers import dump_json, load_json
+
+logger = LogFactory.get_logger(__name__)
+
+DEFAULT_JSON_DIR = Path("data") / "user_state"
+DEFAULT_DB_PATH = Path("data") / "user_state.db"
+
+
+class UserStateBackend(ABC):
+    """用户状态存储接口；实现需保证单次 save 的原子性。"""
+
+    @abstractmethod
+    def load(self, user_id: str) -> Optional[UserState]:
+        """读取用户状态，不存在时返回 None。"""
+
+    @abstractmethod
+    def save(self, state: UserState) -> None:
+        """整体保存一个用户的状态。"""
+
+    def save_many(self, states: Iterable[UserState]) -> None:
+        """批量保存，默认逐个调用 save。"""
+
+        for state in states:
+            self.save(state)
+
+    def exclusive(self) -> ContextManager[None]:
+        """返回一个上下文：其中的 load/save 与其他进程的写入互斥。默认不做任何事。"""
+
+        return nullcontext()
+
+    @abstractmethod
+    def list_users(self) -> List[str]:
+        """返回全部已保存的用户 ID。"""
+
+    def close(self) -> None:
+        """释放底层资源。"""
+
+
+class JsonUserStateBackend(UserStateBackend):
+    """每个用户一个 JSON 文件。"""
+
+    def __init__(self, state_dir: Path = DEFAULT_JSON_DIR):
+        self.state_dir = Path(state_dir)
+
+    def _path(self, user_id: str) -> Path:
+        return self.state_dir / f"{user_id}.json"
+
+    def load(self, user_id: str) -> Optional[UserState]:
+        return load_json(self._path(user_id), None)
+
+    def save(self, state: UserState) -> None:
+        path = self._path(state["user_id"])
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        dump_json(tmp_path, state)
+        os.replace(tmp_path, path)
+
+    def list_users(self) -> List[str]:
+        if not self.state_dir.exists():
+            return []
+        return sorted(path.stem for path in self.state_dir.glob("*.json"))
+
+
+class SQLiteUserStateBackend(UserStateBackend):
+    """嵌入式 SQLite 后端（WAL 模式）。"""
+
+    def __init__(
+        self,
+        db_path: Path = DEFAULT_DB_PATH,
+        legacy_json_dir: Optional[Path] = DEFAULT_JSON_DIR,
+    ):
+        """
+        :param db_path: 数据库文件路径
+        :param legacy_json_dir: 旧 JSON 目录；库中缺少某用户时从这里读入并导入
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._legacy = JsonUserStateBackend(legacy_json_dir) if legacy_json_dir else None
+        # 可重入：exclusive() 持锁期间仍会调用 load / save
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            str(self.db_path), check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                user_id TEXT PRIMARY KEY,
+                level TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                seen_total INTEGER,
+                wrong_total INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS grammar_stats (
+                user_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                seen INTEGER NOT NULL DEFAULT 0,
+                wrong INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, name)
+            );
+            """
+        )
+        self._add_missing_columns()
+
+    def _add_missing_columns(self) -> None:
+        """为旧版数据库补充累计列（值为 NULL，读取时由引擎回填）。"""
+
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(users)")}
+        for column in ("seen_total", "wrong_total"):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE users ADD COLUMN {column} INTEGER")
+
+    def load(self, user_id: str) -> Optional[UserState]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT level, seen_total, wrong_total FROM users WHERE user_id = ?",
+                (user_id,),
+            ).fetchone()
+            if row is not None:
+                stats = self._conn.execute(
+                    "SELECT name, seen, wrong FROM grammar_stats WHERE user_id = ?",
+                    (user_id,),
+                ).fetchall()
+                state = UserState(
+                    user_id=user_id,
+                    level=row[0],
+                    grammar_stats={
+                        name: {"seen": seen, "wrong": wrong} for name, seen, wrong in stats
+                    },
+                )
+                if row[1] is not None and row[2] is not None:
+                    state["seen_total"] = row[1]
+                    state["wrong_total"] = row[2]
+                return state
+
+        if self._legacy is None:
+            return None
+        state = self._legacy.load(user_id)
+        if state is not None:
+            logger.info(f"importing legacy json state for {user_id}")
+            self.save(state)
+        return state
+
+    def save(self, state: UserState) -> None:
+        self.save_many([state])
+
+    def save_many(self, states: Iterable[UserState]) -> None:
+        now = time.time()
+        with self._lock:
+            if self._conn.in_transaction:
+                # 已处于 exclusive() 开启的事务中，由其统一提交
+                for state in states:
+                    self._write(state, now)
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for state in states:
+                    self._write(state, now)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        """在 BEGIN IMMEDIATE 事务内执行读-改-写。
+
+        事务开始即取得数据库写锁，其他进程的写入会在 busy_timeout 内等待，
+        因此多进程部署下同一用户的并发更新不会互相覆盖。
+        """
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _write(self, state: UserState, now: float) -> None:
+        """在当前事务中写入单个用户（调用方持有锁并已开启事务）。"""
+
+        user_id = state["user_id"]
+        self._conn.execute(
+            "INSERT INTO users (user_id, level, updated_at, seen_total, wrong_total)"
+            " VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT(user_id) DO UPDATE SET"
+            " level = excluded.level, updated_at = excluded.updated_at,"
+            " seen_total = excluded.seen_total, wrong_total = excluded.wrong_total",
+            (
+                user_id,
+                state.get("level", "N5"),
+                now,
+                state.get("seen_total"),
+                state.get("wrong_total"),
+            ),
+        )
+        self._conn.execute("DELETE FROM grammar_stats WHERE user_id = ?", (user_id,))
+        self._conn.executemany(
+            "INSERT INTO grammar_stats (user_id, name, seen, wrong) VALUES (?, ?, ?, ?)",
+            [
+                (user_id, name, stats.get("seen", 0), stats.get("wrong", 0))
+                for name, stats in state.get("grammar_stats", {}).items()
+            ],
+        )
+
+    def list_users(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT user_id FROM users ORDER BY user_id").fetchall()
+        return [row[0] for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def migrate_json_to_sqlite(
+    src_dir: Path = DEFAULT_JSON_DIR, db_path: Path = DEFAULT_DB_PATH
+) -> int:
+    """把 JSON 目录中的全部用户导入 SQLite，返回导入的用户数。"""
+
+    source = JsonUserStateBackend(src_dir)
+    target = SQLiteUserStateBackend(db_path, legacy_json_dir=None)
+    try:
+        states = []
+        for user_id in source.list_users():
+            state = source.load(user_id)
+            if state is None:
+                continue
+            state.setdefault("user_id", user_id)
+            states.append(state)
+        target.save_many(states)
+    finally:
+        target.close()
+    logger.info(f"migrated {len(states)} users from {src_dir} to {db_path}")
+    return len(states)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="用户状态存储工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="把 JSON 状态目录导入 SQLite")
+    migrate.add_argument("--src", type=Path, default=DEFAULT_JSON_DIR)
+    migrate.add_argument("--db", type=Path, default=DEFAULT_DB_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == "migrate":
+        count = migrate_json_to_sqlite(args.src, args.db)
+        print(f"已导入 {count} 个用户状态到 {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from typing import TypedDict, List, Optional, Dict
+from typing import TypedDict, List, Optional, Dict, Tuple
 
 # ------------- Conversation -------------
 class GrammarPoint(TypedDict):
@@ -6,6 +6,15 @@ class GrammarPoint(TypedDict):
     description: str
     example: str
 
+class GrammarMatch(TypedDict):
+    point: GrammarPoint
+    spans: List[Tuple[int, int]]  # [起始, 结束) 字符下标
+
+class GrammarBatchResult(TypedDict):
+    results: List[List[GrammarPoint]]  # 与输入文本一一对应
+    rule_counts: Dict[str, int]  # 每个语法点在整批文本中命中的文本数
+    total: int
+
 class UserCorrection(TypedDict):
     original: str
     corrected: str
@@ -17,6 +26,8 @@ class TurnResult(TypedDict):
     user_correction: Optional[UserCorrection]
     grammar_ai: List[GrammarPoint]
     level: Optional[str]
+    timings: Dict[str, float]  # 各阶段耗时（毫秒）
+    degraded: List[str]  # 超时或失败、使用了降级结果的阶段
 
 # ------------- Lesson -------------------
 class VocabItem(TypedDict):
@@ -62,3 +73,5 @@ class UserState(TypedDict):
     user_id: str
     level: str
     grammar_stats: Dict[str, GrammarStats]
+    seen_total: int  # grammar_stats 中 seen 的累计和，随每轮增量维护
+    wrong_total: int  # grammar_stats 中 wrong 的累计和
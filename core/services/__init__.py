@@ -1,3 +1,3 @@
 """服务层子包，封装 AI 客户端与 Agent 运行器。"""
 
-__all__ = ["ai_client", "ai_client_utils", "agent_runner"]
+__all__ = ["ai_client", "ai_client_utils", "agent_runner", "context_budget", "llm_cache", "mcp_progress"]
@@ -1,40 +1,151 @@
+import asyncio
+import itertools
+import json
+from typing import Any, Dict, List, Optional
+
+from fastmcp.client.messages import MessageHandler
+
+from core.services.ai_client_utils import get_tool_schema_cache
+from core.services.context_budget import ContextBudget, estimate_tokens
+
+
+# 工具列表版本在进程内唯一：各会话的初始列表版本为 0，每次变更取一个新值，
+# 进程共享的工具定义缓存据此区分不同会话收到的变更
+_tool_list_versions = itertools.count(1)
+
+
+class ToolListChangeHandler(MessageHandler):
+    """监听 MCP 工具列表变更通知，每收到一次就换一个新的版本号。
+
+    构造 FastMCP Client 时作为 message_handler 传入，并交给 AgentRunner，
+    AgentRunner 发现版本号变化后才重新拉取工具列表。
+    """
+
+    def __init__(self) -> None:
+        self.version = 0
+
+    async def on_tool_list_changed(self, message) -> None:
+        self.version = next(_tool_list_versions)
+
+
 class AgentRunner:
-    def __init__(self, ai_client, mcp_client):
+    def __init__(
+        self,
+        ai_client,
+        mcp_client,
+        tool_events: Optional[ToolListChangeHandler] = None,
+        tool_timeout: float = 60.0,
+        tool_timeouts: Optional[Dict[str, float]] = None,
+        context_budget: Optional[ContextBudget] = None,
+        max_tools: Optional[int] = None,
+        pinned_tools: Optional[List[str]] = None,
+    ):
+        """
+        :param tool_events: 与 mcp_client 绑定的工具列表变更监听器
+        :param tool_timeout: 单个工具调用的默认超时（秒）
+        :param tool_timeouts: 按工具名覆盖的超时（秒）
+        :param context_budget: 消息历史的 token 预算，默认 ContextBudget()
+        :param max_tools: 每次运行最多发送给模型的工具数，None 表示全部发送
+        :param pinned_tools: 启用工具过滤时总是发送的工具名
+        """
         self.ai = ai_client
         self.mcp = mcp_client
+        self.tool_events = tool_events
+        self.tool_timeout = tool_timeout
+        self.tool_timeouts = tool_timeouts or {}
+        self.context_budget = context_budget or ContextBudget()
+        self.max_tools = max_tools
+        self.pinned_tools = pinned_tools or []
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tools: Optional[List[Any]] = None
+        self._tools_version = -1
 
-    async def run(self, prompt: str):
-        from core.services.ai_client_utils import convert_mcp_tools_to_ollama
+    async def start(self):
+        """打开长连接会话；同一事件循环内后续调用直接复用。"""
+        loop = asyncio.get_running_loop()
+        if self._session_loop is loop and self.mcp.is_connected():
+            return
+        if self._session_loop is not None and self._session_loop is not loop:
+            # 旧会话随上一个事件循环结束，换用状态干净的客户端副本
+            self.mcp = self.mcp.new()
+            self._tools = None
+        await self.mcp.__aenter__()
+        self._session_loop = loop
 
+    async def close(self):
+        """关闭长连接会话。"""
+        if self._session_loop is asyncio.get_running_loop() and self.mcp.is_connected():
+            await self.mcp.__aexit__(None, None, None)
+        self._session_loop = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def list_tools(self) -> List[Any]:
+        """返回缓存的工具列表；收到变更通知后重新拉取。"""
+        version = self.tool_events.version if self.tool_events else 0
+        if self._tools is None or version != self._tools_version:
+            self._tools = await self.mcp.list_tools()
+            self._tools_version = version
+        return self._tools
+
+    async def _call_tool(self, call) -> tuple[str, Any]:
+        tool = call["function"]["name"]
+        args = call["function"]["arguments"]
+        timeout = self.tool_timeouts.get(tool, self.tool_timeout)
+        try:
+            output = await asyncio.wait_for(self.mcp.call_tool(tool, args), timeout)
+        except asyncio.TimeoutError:
+            output = {"error": f"工具 {tool} 调用超时（{timeout}s）"}
+        except Exception as e:
+            output = {"error": str(e)}
+        return tool, output
+
+    async def ollama_tools(self, prompt: str) -> List[Dict[str, Any]]:
+        """返回本次运行要发送的 Ollama 工具定义（转换结果在进程内按工具列表版本共享）。"""
+        tools = await self.list_tools()
+        schemas = get_tool_schema_cache().get(tools, self._tools_version)
+        if self.max_tools is None:
+            return schemas.tools
+        return schemas.select(prompt, self.max_tools, self.pinned_tools)
+
+    async def run(self, prompt: str, reports: Optional[List[Dict[str, int]]] = None):
+        """执行一次 Agent 运行；传入 reports 时追加每轮请求的提示规模。"""
         messages = [
             {"role": "system", "content": "使用中文回复用户"},
             {"role": "user", "content": prompt},
         ]
 
-        async with self.mcp:
-            await self.mcp.ping()
-            tools = await self.mcp.list_tools()
-            ollama_tools = convert_mcp_tools_to_ollama(tools)
-
-            for _ in range(8):
-                result = await self.ai.chat(messages, tools=ollama_tools)
-                msg = result["message"]
-
-                if "tool_calls" not in msg:
-                    return msg["content"]
-
-                for call in msg["tool_calls"]:
-                    tool = call["function"]["name"]
-                    args = call["function"]["arguments"]
-                    try:
-                        output = await self.mcp.call_tool(tool, args)
-                    except Exception as e:
-                        output = {"error": str(e)}
-
-                    messages.append({
-                        "role": "tool",
-                        "name": tool,
-                        "content": str(output)
-                    })
-
-            return "⚠️ 工具调用超过限制"
+        await self.start()
+        ollama_tools = await self.ollama_tools(prompt)
+        tools_tokens = estimate_tokens(json.dumps(ollama_tools, ensure_ascii=False))
+
+        for iteration in range(8):
+            prompt_messages, report = self.context_budget.fit(
+                messages, iteration=iteration, extra_tokens=tools_tokens
+            )
+            if reports is not None:
+                reports.append(report)
+            result = await self.ai.chat(prompt_messages, tools=ollama_tools)
+            msg = result["message"]
+
+            if "tool_calls" not in msg:
+                return msg["content"]
+
+            messages.append(msg)
+            # 同一步内的工具调用相互独立，并发执行后按原顺序回填
+            outputs = await asyncio.gather(
+                *(self._call_tool(call) for call in msg["tool_calls"])
+            )
+            for tool, output in outputs:
+                messages.append({
+                    "role": "tool",
+                    "name": tool,
+                    "content": self.context_budget.compact_tool_output(tool, output)
+                })
+
+        return "⚠️ 工具调用超过限制"
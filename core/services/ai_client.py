@@ -1,6 +1,152 @@
-"""AI 模块，简单封装了一下 ollama"""
+"""AI 模块，简单封装了一下 ollama
+
+ollama 依赖与模型发现都延迟到第一次真正调用时，导入本模块和构造 AIClient
+不会访问后端，也不会因为 Ollama 未启动而失败。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import copy
+import threading
+import time
+import weakref
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from core.services.llm_cache import get_llm_cache, make_cache_key
+from core.utils.dp_log import LogFactory
+from core.utils.metrics import get_metrics
+
+if TYPE_CHECKING:
+    import httpx
+    import ollama
+
+logger = LogFactory.get_logger(__name__)
+
+# 每个后端允许同时在途的请求数，可通过 configure_backend 调整。
+BACKEND_CONCURRENCY: Dict[str, int] = {
+    "ollama": 4,
+    "api": 8,
+}
+
+# 异步客户端与信号量都绑定在事件循环上，按循环分别缓存；
+# 同一循环内所有 AIClient 共享同一个连接池。连接池（httpx 传输层）由本模块
+# 创建并持有，关闭时不依赖 ollama 客户端的内部属性。
+_loop_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Optional[str], ollama.AsyncClient]]" = weakref.WeakKeyDictionary()
+_loop_transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Optional[str], httpx.AsyncHTTPTransport]]" = weakref.WeakKeyDictionary()
+_loop_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+# 合并中的在途请求：请求键 → 共享生成；同样按事件循环隔离。
+_loop_inflight: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, _Flight]]" = weakref.WeakKeyDictionary()
+
+
+def configure_backend(mode: str, max_concurrency: int) -> None:
+    """设置某个后端的在途并发上限（对之后创建的信号量生效）。
+
+    旧信号量会被丢弃而不是原地调整：调用时已在途的请求仍占用旧名额，
+    直到它们结束前，总并发可能短暂超过新的上限。应在启动阶段调用。
+    """
+
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency 必须大于 0")
+    BACKEND_CONCURRENCY[mode] = max_concurrency
+    for semaphores in _loop_semaphores.values():
+        semaphores.pop(mode, None)
+
+
+def _get_async_client(host: Optional[str] = None) -> ollama.AsyncClient:
+    """返回当前事件循环下共享的 Ollama 异步客户端。"""
+
+    import httpx
+    import ollama
+
+    loop = asyncio.get_running_loop()
+    clients = _loop_clients.setdefault(loop, {})
+    client = clients.get(host)
+    if client is None:
+        transport = httpx.AsyncHTTPTransport()
+        client = ollama.AsyncClient(host=host, transport=transport)
+        clients[host] = client
+        _loop_transports.setdefault(loop, {})[host] = transport
+    return client
+
+
+def _get_semaphore(mode: str) -> asyncio.Semaphore:
+    """返回当前事件循环下某个后端的并发信号量。"""
+
+    loop = asyncio.get_running_loop()
+    semaphores = _loop_semaphores.setdefault(loop, {})
+    semaphore = semaphores.get(mode)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(BACKEND_CONCURRENCY.get(mode, 1))
+        semaphores[mode] = semaphore
+    return semaphore
+
+
+class _Flight:
+    """一次被多个调用方共享的生成：底层任务 + 当前等待者数量。"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+async def _single_flight(key: str, factory: Callable[[], Awaitable[Any]], mode: str) -> Any:
+    """同一事件循环内，请求键相同的并发调用只执行一次 factory，结果共享。
+
+    - 每个等待者通过 asyncio.shield 等待共享任务，某个调用方被取消不会
+      中断其他调用方；
+    - 最后一个等待者离开且生成尚未完成时取消底层任务，释放后端名额；
+    - 任务结束（成功或失败）即移出表，之后的请求重新生成或走响应缓存；
+    - 每个等待者拿到结果的独立副本，修改返回值不会影响其他调用方。
+    """
+
+    loop = asyncio.get_running_loop()
+    flights = _loop_inflight.setdefault(loop, {})
+    metrics = get_metrics()
+    flight = flights.get(key)
+    if flight is None:
+        flight = flights[key] = _Flight(loop.create_task(factory()))
+
+        def _forget(task: "asyncio.Task", flight: _Flight = flight) -> None:
+            if flights.get(key) is flight:
+                del flights[key]
+
+        flight.task.add_done_callback(_forget)
+    else:
+        metrics.counter("ai_coalesced", mode=mode).inc()
+
+    flight.waiters += 1
+    try:
+        return copy.deepcopy(await asyncio.shield(flight.task))
+    finally:
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            # 立即移出表，避免新的调用方加入一个已被取消的生成
+            if flights.get(key) is flight:
+                del flights[key]
+            flight.task.cancel()
+            metrics.counter("ai_coalesce_cancelled", mode=mode).inc()
+
+
+async def aclose_shared_clients() -> None:
+    """关闭当前事件循环下的共享连接池（进程退出前调用）。"""
+
+    loop = asyncio.get_running_loop()
+    _loop_clients.pop(loop, None)
+    transports = _loop_transports.pop(loop, {})
+    for transport in transports.values():
+        await transport.aclose()
+
+
+def _response_to_dict(result) -> dict:
+    """把 Ollama 响应对象转换为可序列化的 dict。"""
+    if hasattr(result, "model_dump"):
+        return result.model_dump(mode="json", exclude_none=True)
+    return dict(result)
 
-import ollama
 
 def _format_size(bytes_val: int) -> str:
     """将字节转换为可读单位"""
@@ -12,62 +158,253 @@ def _format_size(bytes_val: int) -> str:
         return f"{bytes_val / 1024:.2f} KB"
 
 
+def _summarize_models(resp) -> dict:
+    """把 ollama list 响应整理为按体积从小到大排序的模型清单。"""
+    result = []
+
+    for m in resp.models:
+        result.append({
+            "name": m.model,
+            "size": _format_size(m.size),
+            "size_bytes": m.size,
+            "modified_at": str(m.modified_at),
+            "quantization": m.details.quantization_level,
+        })
+
+    # 从小到大排序
+    result.sort(key=lambda x: x["size_bytes"])
+
+    return {
+        "count": len(result),
+        "models": result
+    }
+
+
+class ModelInventory:
+    """Ollama 模型清单缓存：首次访问时拉取，过期后在后台刷新，访问方不必等待。"""
+
+    def __init__(self, host: Optional[str] = None, refresh_interval: float = 60.0):
+        self.host = host
+        self.refresh_interval = refresh_interval
+        self._models: List[dict] = []
+        self._fetched_at: Optional[float] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> List[dict]:
+        """立即重新拉取模型清单。"""
+        resp = await _get_async_client(self.host).list()
+        self._models = _summarize_models(resp)["models"]
+        self._fetched_at = time.monotonic()
+        logger.debug(f"model inventory refreshed: {len(self._models)} models")
+        return self._models
+
+    async def _refresh_quietly(self) -> None:
+        try:
+            await self.refresh()
+        except Exception as exc:  # noqa: BLE001
+            logger.warning(f"model inventory refresh failed: {exc}")
+
+    async def list_models(self) -> List[dict]:
+        """返回按体积从小到大排序的模型清单（含大小、量化等元数据）。"""
+        if self._fetched_at is None:
+            return await self.refresh()
+        stale = time.monotonic() - self._fetched_at >= self.refresh_interval
+        if stale and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.create_task(self._refresh_quietly())
+        return self._models
+
+    async def get(self, name: str) -> Optional[dict]:
+        """返回指定模型的元数据，不存在时返回 None。"""
+        for model in await self.list_models():
+            if model["name"] == name:
+                return model
+        return None
+
+
+_inventories: Dict[Optional[str], ModelInventory] = {}
+_clients: Dict[Tuple[str, Optional[str], Optional[str]], "AIClient"] = {}
+_registry_lock = threading.Lock()
+
+
+def get_model_inventory(host: Optional[str] = None) -> ModelInventory:
+    """返回某个 Ollama 服务地址对应的共享模型清单缓存。"""
+    with _registry_lock:
+        inventory = _inventories.get(host)
+        if inventory is None:
+            inventory = _inventories[host] = ModelInventory(host)
+        return inventory
+
+
+def get_ai_client(mode="ollama", model=None, host=None) -> "AIClient":
+    """按 (mode, model, host) 返回进程内共享的 AIClient，避免每次调用都新建。"""
+    key = (mode, model, host)
+    with _registry_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = AIClient(mode=mode, model=model, host=host)
+        return client
+
+
 class AIClient:
-    def __init__(self, mode="ollama", model=None):
+    def __init__(self, mode="ollama", model=None, host=None):
+        # 构造时不访问后端；未指定模型时在第一次调用时自动选择
         self.mode = mode
-        models_info = self.check_model()
-        models = models_info.get("models", [])
-
-        # 如果没有模型，自动Fallback到传入的默认模型名称
-        if not models:
-            print("本地 Ollama 无可用模型")
-            # self.model = {"name": model, "size": "0", "size_bytes": 0}
-        elif not model:
-            # 正常情况：取第一个模型
-            self.model = models[0].get("name")
-        else:
-            self.model = model
+        self.host = host
+        self.model = model
 
     def check_model(self) -> dict:
+        """同步查询本地 Ollama 模型清单。"""
+        import ollama
+
         try:
-            resp = ollama.list()
+            resp = ollama.Client(host=self.host).list()
         except Exception as e:
             return {
                 "count": 0,
                 "models": [],
                 "error": str(e)
             }
+        return _summarize_models(resp)
 
-        result = []
+    async def _ensure_model(self) -> None:
+        """未指定模型时，异步查询模型清单并选择体积最小的模型。"""
+        if self.model or self.mode != "ollama":
+            return
+        models = await get_model_inventory(self.host).list_models()
+        if not models:
+            raise RuntimeError("本地 Ollama 无可用模型")
+        self.model = models[0].get("name")
+        logger.info(f"AIClient selected model {self.model}")
 
-        for m in resp.models:
-            result.append({
-                "name": m.model,
-                "size": _format_size(m.size),
-                "size_bytes": m.size,
-                "modified_at": str(m.modified_at),
-                "quantization": m.details.quantization_level,
-            })
+    async def model_info(self) -> Optional[dict]:
+        """返回当前模型的元数据（大小、量化级别等）。"""
+        await self._ensure_model()
+        return await get_model_inventory(self.host).get(self.model)
 
-        # 从小到大排序
-        result.sort(key=lambda x: x["size_bytes"])
+    async def chat(self, messages, tools=None, cache=False):
+        """发送对话请求；cache=True 时先查询响应缓存，未命中再调用模型。
 
-        return {
-            "count": len(result),
-            "models": result
-        }
+        内容完全相同的并发请求（无论是否走缓存）合并为一次生成，见 _single_flight。
+        """
+        await self._ensure_model()
+        key = make_cache_key(
+            self.model,
+            messages,
+            {"mode": self.mode, "host": self.host, "tools": tools, "think": False},
+        )
+        if not cache:
+            # 与走缓存的请求分开合并：两者的返回类型与落盘行为不同
+            return await _single_flight(
+                f"direct:{key}", lambda: self._dispatch(messages, tools), self.mode
+            )
 
+        # 磁盘层查询与写入都是同步 SQLite 调用，放到线程中避免阻塞事件循环
+        cached = await asyncio.to_thread(get_llm_cache().get, key)
+        if cached is not None:
+            # get 每次返回新解析的对象，调用方修改它不会污染缓存
+            get_metrics().counter("ai_cache_hits", mode=self.mode).inc()
+            return cached
+        get_metrics().counter("ai_cache_misses", mode=self.mode).inc()
+        return await _single_flight(
+            key, lambda: self._generate_and_cache(key, messages, tools), self.mode
+        )
+
+    async def _generate_and_cache(self, key, messages, tools):
+        result = _response_to_dict(await self._dispatch(messages, tools))
+        await asyncio.to_thread(get_llm_cache().put, key, result)
+        return result
 
-    async def chat(self, messages, tools=None):
+    async def _dispatch(self, messages, tools):
+        await self._ensure_model()
         if self.mode == "ollama":
-            return await self._chat_ollama(messages, tools)
+            send = self._chat_ollama
         elif self.mode == "api":
-            return await self._chat_api(messages, tools)
+            send = self._chat_api
         else:
             raise ValueError("未知 AI 模式")
 
+        metrics = get_metrics()
+        metrics.counter("ai_requests", mode=self.mode, model=self.model).inc()
+        async with self._backend_slot():
+            started = time.perf_counter()
+            try:
+                result = await send(messages, tools)
+            except Exception:
+                metrics.counter("ai_errors", mode=self.mode, model=self.model).inc()
+                raise
+            finally:
+                metrics.histogram("ai_latency_ms", mode=self.mode, model=self.model).observe(
+                    (time.perf_counter() - started) * 1000
+                )
+        self._record_usage(result)
+        return result
+
+    @contextlib.asynccontextmanager
+    async def _backend_slot(self):
+        """占用一个后端并发名额，等待期间计入 ai_queue_depth，占用期间计入 ai_inflight。"""
+        metrics = get_metrics()
+        queued = metrics.gauge("ai_queue_depth", mode=self.mode)
+        inflight = metrics.gauge("ai_inflight", mode=self.mode)
+        semaphore = _get_semaphore(self.mode)
+        queued.inc()
+        try:
+            await semaphore.acquire()
+        finally:
+            queued.dec()
+        inflight.inc()
+        try:
+            yield
+        finally:
+            inflight.dec()
+            semaphore.release()
+
+    def _record_usage(self, response) -> None:
+        """从 Ollama 响应元数据中累计 token 数与生成速度。"""
+        metrics = get_metrics()
+        prompt_tokens = response.get("prompt_eval_count")
+        eval_tokens = response.get("eval_count")
+        eval_duration = response.get("eval_duration")
+        if prompt_tokens:
+            metrics.counter("ai_prompt_tokens", mode=self.mode, model=self.model).inc(prompt_tokens)
+        if eval_tokens:
+            metrics.counter("ai_eval_tokens", mode=self.mode, model=self.model).inc(eval_tokens)
+            if eval_duration:
+                metrics.histogram("ai_eval_tokens_per_s", mode=self.mode, model=self.model).observe(
+                    eval_tokens / (eval_duration / 1e9)
+                )
+
+    async def chat_stream(self, messages) -> AsyncIterator[str]:
+        """流式生成回复，逐段产出文本内容（不支持工具调用）。"""
+        if self.mode != "ollama":
+            raise NotImplementedError(f"{self.mode} 模式暂不支持流式输出")
+        await self._ensure_model()
+        metrics = get_metrics()
+        metrics.counter("ai_requests", mode=self.mode, model=self.model).inc()
+        async with self._backend_slot():
+            started = time.perf_counter()
+            try:
+                stream = await _get_async_client(self.host).chat(
+                    model=self.model,
+                    messages=messages,
+                    stream=True,
+                    think=False,
+                )
+                async for part in stream:
+                    content = part.get("message", {}).get("content", "")
+                    if content:
+                        yield content
+                    if part.get("done"):
+                        self._record_usage(part)
+            except Exception:
+                metrics.counter("ai_errors", mode=self.mode, model=self.model).inc()
+                raise
+            finally:
+                metrics.histogram("ai_latency_ms", mode=self.mode, model=self.model).observe(
+                    (time.perf_counter() - started) * 1000
+                )
+
     async def _chat_ollama(self, messages, tools):
-        return ollama.chat(
+        return await _get_async_client(self.host).chat(
             model=self.model,
             messages=messages,
             tools=tools,
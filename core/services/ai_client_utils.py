@@ -1,4 +1,17 @@
-from typing import Any, List, Dict
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from core.utils.dp_log import LogFactory
+
+logger = LogFactory.get_logger(__name__)
+
+# 相关性匹配用的词：连续的 ASCII 字母数字，或单个 CJK 字符（再组成二元组）。
+_WORD_RE = re.compile(r"[A-Za-z0-9]+")
+_CJK_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿]+")
+# 工具名按下划线拆出的通用前缀，不参与相关性打分
+_NAME_STOPWORDS = {"jp", "get"}
 
 
 def convert_mcp_tools_to_ollama(tools: List[Any]) -> List[Dict[str, Any]]:
@@ -8,7 +21,10 @@ def convert_mcp_tools_to_ollama(tools: List[Any]) -> List[Dict[str, Any]]:
     for tool in tools:
         name = getattr(tool, "name", "") or ""
         description = getattr(tool, "description", "") or ""
-        input_schema = getattr(tool, "input_schema", {}) or {}
+        # mcp.types.Tool 的字段名为 inputSchema
+        input_schema = (
+            getattr(tool, "inputSchema", None) or getattr(tool, "input_schema", None) or {}
+        )
         converted.append(
             {
                 "type": "function",
@@ -20,3 +36,126 @@ def convert_mcp_tools_to_ollama(tools: List[Any]) -> List[Dict[str, Any]]:
             }
         )
     return converted
+
+
+def _terms(text: str) -> Set[str]:
+    """提取文本中的检索词：小写 ASCII 单词与 CJK 二元组（单字文本保留单字）。"""
+
+    terms = {word.lower() for word in _WORD_RE.findall(text)}
+    for run in _CJK_RE.findall(text):
+        if len(run) == 1:
+            terms.add(run)
+        terms.update(run[i : i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def _tool_terms(tool: Dict[str, Any]) -> Set[str]:
+    function = tool.get("function", {})
+    name = function.get("name", "")
+    terms = _terms(function.get("description", ""))
+    terms.update(part for part in name.lower().split("_") if part not in _NAME_STOPWORDS)
+    return terms
+
+
+class ToolSchemaSet:
+    """一组已转换的 Ollama 工具定义及其检索词，构建后不再修改，可被多个运行共享。"""
+
+    def __init__(self, tools: List[Dict[str, Any]]):
+        self.tools = tools
+        self._terms = [_tool_terms(tool) for tool in tools]
+
+    def select(
+        self,
+        prompt: str,
+        max_tools: int,
+        always_include: Iterable[str] = (),
+    ) -> List[Dict[str, Any]]:
+        """按与 prompt 的词重叠度挑选最多 max_tools 个工具。
+
+        always_include 中的工具总是保留；没有任何工具命中时返回全部工具，
+        避免过滤导致模型无工具可用。顺序与原工具列表一致。
+        """
+
+        if len(self.tools) <= max_tools:
+            return self.tools
+
+        pinned = set(always_include)
+        prompt_terms = _terms(prompt)
+        scored = []
+        for index, (tool, terms) in enumerate(zip(self.tools, self._terms)):
+            name = tool["function"]["name"]
+            score = len(prompt_terms & terms)
+            if name in pinned:
+                score = float("inf")
+            if score > 0:
+                scored.append((score, index))
+        if not scored:
+            return self.tools
+
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        keep = sorted(index for _, index in scored[:max_tools])
+        selected = [self.tools[index] for index in keep]
+        logger.debug(
+            f"tool filter kept {len(selected)}/{len(self.tools)}: "
+            f"{[tool['function']['name'] for tool in selected]}"
+        )
+        return selected
+
+
+def _tools_fingerprint(tools: Sequence[Any]) -> Tuple[Tuple[str, str], ...]:
+    """工具列表的轻量标识：按顺序的 (名称, 描述)。"""
+
+    return tuple(
+        (getattr(tool, "name", "") or "", getattr(tool, "description", "") or "")
+        for tool in tools
+    )
+
+
+class ToolSchemaCache:
+    """进程内共享的已转换工具定义缓存，按工具列表版本失效。
+
+    版本号取自 ToolListChangeHandler.version：各会话的初始工具列表版本都是 0，
+    收到 tools/list_changed 后换成进程内唯一的新版本。缓存键为
+    (版本, 工具名与描述)，因此新的 AgentRunner 或会话连到同一服务时直接复用
+    已有的转换结果，列表变更后的下一次调用重新转换。
+    """
+
+    def __init__(self, max_entries: int = 16) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[int, Tuple[Tuple[str, str], ...]], ToolSchemaSet]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "conversions": 0}
+
+    def get(self, tools: Sequence[Any], version: int = 0) -> ToolSchemaSet:
+        """返回 tools 对应的工具定义集合（调用方不要修改其中的列表）。"""
+
+        key = (version, _tools_fingerprint(tools))
+        with self._lock:
+            schemas = self._entries.get(key)
+            if schemas is not None:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return schemas
+
+        schemas = ToolSchemaSet(convert_mcp_tools_to_ollama(list(tools)))
+        with self._lock:
+            self._entries[key] = schemas
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._counters["conversions"] += 1
+        logger.debug(f"tool schemas converted: {len(schemas.tools)} tools, version {version}")
+        return schemas
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), **self._counters}
+
+
+_tool_schema_cache = ToolSchemaCache()
+
+
+def get_tool_schema_cache() -> ToolSchemaCache:
+    """返回进程内共享的工具定义缓存。"""
+
+    return _tool_schema_cache
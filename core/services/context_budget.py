@@ -0,0 +1,142 @@
+"""Agent 循环的上下文预算管理。
+
+- 按字符粗略估算 token：CJK 字符约 1 token/字，其余约 4 字符/token。
+- 工具输出回填前先压缩：提取 MCP 结果中的文本，超出单条上限时截断。
+- 每轮请求前检查总量，超出预算时保留 system 提示、用户原始问题与最近几步，
+  从最早的中间步骤开始丢弃（助手的工具调用消息与其工具结果一起丢弃）。
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.utils.dp_log import LogFactory
+
+logger = LogFactory.get_logger(__name__)
+
+_CJK_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯＀-￯]")
+# 每条消息的角色、分隔符等固定开销
+_MESSAGE_OVERHEAD = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本 token 数。"""
+
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _tool_output_text(output: Any) -> str:
+    """提取工具输出中的文本；MCP CallToolResult 只保留其文本内容。"""
+
+    content = getattr(output, "content", None)
+    if isinstance(content, list):
+        texts = [getattr(item, "text", None) for item in content]
+        return "\n".join(text for text in texts if text)
+    if isinstance(output, (dict, list)):
+        return json.dumps(output, ensure_ascii=False, default=str)
+    return str(output)
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """把文本截断到大约 max_tokens，并注明原始规模。"""
+
+    total = estimate_tokens(text)
+    if total <= max_tokens:
+        return text
+    # 按比例估算保留的字符数，再逐步收缩到预算内
+    keep = max(1, len(text) * max_tokens // total)
+    while keep > 1 and estimate_tokens(text[:keep]) > max_tokens:
+        keep = keep * 9 // 10
+    return f"{text[:keep]}\n…（已截断，原始约 {total} tokens）"
+
+
+class ContextBudget:
+    """Agent 消息历史的 token 预算。"""
+
+    def __init__(
+        self,
+        max_tokens: int = 6000,
+        max_tool_tokens: int = 800,
+        tool_limits: Optional[Dict[str, int]] = None,
+        keep_recent: int = 4,
+    ):
+        """
+        :param max_tokens: 单次请求（消息 + 工具定义）的 token 上限
+        :param max_tool_tokens: 单条工具输出的默认 token 上限
+        :param tool_limits: 按工具名覆盖的单条输出上限
+        :param keep_recent: 超出预算时至少保留的最近消息数
+        """
+        self.max_tokens = max_tokens
+        self.max_tool_tokens = max_tool_tokens
+        self.tool_limits = tool_limits or {}
+        self.keep_recent = keep_recent
+
+    def message_tokens(self, message: Any) -> int:
+        content = message.get("content") or ""
+        tokens = estimate_tokens(str(content)) + _MESSAGE_OVERHEAD
+        tool_calls = message.get("tool_calls")
+        if tool_calls:
+            tokens += estimate_tokens(str(tool_calls))
+        return tokens
+
+    def compact_tool_output(self, tool: str, output: Any) -> str:
+        """把工具输出转换为文本，并按规则截断到该工具的上限内。"""
+
+        limit = self.tool_limits.get(tool, self.max_tool_tokens)
+        return _truncate(_tool_output_text(output), limit)
+
+    def fit(
+        self, messages: List[Any], iteration: int = 0, extra_tokens: int = 0
+    ) -> Tuple[List[Any], Dict[str, int]]:
+        """返回不超过预算的消息列表（原列表不变）与本轮提示规模。
+
+        预算对象可被多个并发运行共享，自身不保存状态；规模记录由调用方收集。
+
+        :param extra_tokens: 消息以外的固定开销，例如工具定义
+        """
+
+        sizes = [self.message_tokens(message) for message in messages]
+        total = sum(sizes) + extra_tokens
+        original_total = total
+
+        # 受保护：开头的 system 消息与第一条用户消息、以及最近 keep_recent 条
+        head = 0
+        while head < len(messages) and messages[head].get("role") == "system":
+            head += 1
+        if head < len(messages) and messages[head].get("role") == "user":
+            head += 1
+        tail_start = max(head, len(messages) - self.keep_recent)
+        # 最近区间不能以工具结果开头，否则会与它的调用消息分离
+        while tail_start > head and messages[tail_start].get("role") == "tool":
+            tail_start -= 1
+
+        dropped = 0
+        index = head
+        while total > self.max_tokens and index < tail_start:
+            total -= sizes[index]
+            dropped += 1
+            index += 1
+            # 丢弃助手的工具调用时，连同其后的工具结果一起丢弃
+            while index < tail_start and messages[index].get("role") == "tool":
+                total -= sizes[index]
+                dropped += 1
+                index += 1
+
+        fitted = messages[:head] + messages[index:]
+        report = {
+            "iteration": iteration,
+            "messages": len(fitted),
+            "tokens": total,
+            "tokens_before_trim": original_total,
+            "dropped": dropped,
+        }
+        logger.info(
+            f"agent prompt #{iteration}: {len(fitted)} messages, ~{total} tokens"
+            f" (dropped {dropped}, before trim ~{original_total})"
+        )
+        if total > self.max_tokens:
+            logger.warning(f"agent prompt still over budget: ~{total} > {self.max_tokens}")
+        return fitted, report
@@ -0,0 +1,278 @@
+"""LLM 响应缓存：内存 LRU + 磁盘 SQLite 两级，按请求内容寻址。
+
+缓存键由模型、消息与调用参数序列化后取 SHA-256 得到，内容完全相同的请求
+直接命中缓存，无需再次生成。两级缓存都支持 TTL；磁盘层按总字节数淘汰
+最久未访问的条目，进程重启后仍然有效。磁盘命中只在记录的访问时间
+早于 touch_interval 时才写回，读路径上通常不产生写事务。
+
+内存层保存序列化后的 JSON 文本，每次命中都解析出新对象，调用方修改
+返回值不会影响之后的命中。
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from core.utils.dp_log import LogFactory
+from core.utils.metrics import get_metrics
+
+logger = LogFactory.get_logger(__name__)
+
+DEFAULT_DB_PATH = Path("data") / "llm_cache.db"
+
+# 多个进程共用磁盘层时，本进程的字节计数看不到其他进程的写入；
+# 每写入这么多次就从库中重新统计一次总大小。
+DISK_SIZE_SYNC_EVERY = 64
+
+
+def make_cache_key(model: Optional[str], messages: list, options: Dict[str, Any]) -> str:
+    """根据模型、消息与调用参数生成内容寻址的缓存键。"""
+
+    payload = json.dumps(
+        {"model": model, "messages": messages, "options": options},
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """两级 LLM 响应缓存，线程安全。"""
+
+    def __init__(
+        self,
+        db_path: Optional[Path] = DEFAULT_DB_PATH,
+        max_memory_entries: int = 1024,
+        max_disk_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: Optional[float] = 7 * 24 * 3600,
+        touch_interval: float = 3600.0,
+    ):
+        """
+        :param db_path: 磁盘层 SQLite 文件路径；为 None 时只启用内存层
+        :param max_memory_entries: 内存层最多保留的条目数
+        :param max_disk_bytes: 磁盘层最多占用的值字节数
+        :param ttl_seconds: 条目有效期（秒）；为 None 时永不过期
+        :param touch_interval: 磁盘命中时，访问时间早于该秒数才更新（淘汰精度）
+        """
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self.touch_interval = touch_interval
+        self._memory: "OrderedDict[str, Tuple[Optional[float], str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+        self._db: Optional[sqlite3.Connection] = None
+        self._disk_bytes = 0
+        self._puts_since_sync = 0
+        if db_path is not None:
+            self._open_db(Path(db_path))
+
+    def _open_db(self, db_path: Path) -> None:
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " expires_at REAL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(accessed_at)"
+        )
+        self._db.commit()
+        row = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        self._disk_bytes = int(row[0])
+
+    def _expires_at(self) -> Optional[float]:
+        return time.time() + self.ttl_seconds if self.ttl_seconds is not None else None
+
+    def get(self, key: str) -> Optional[dict]:
+        """读取缓存并返回新解析的副本；依次查询内存层与磁盘层，磁盘命中会回填内存层。"""
+
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, raw = entry
+                if expires_at is None or expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return json.loads(raw)
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at, size, accessed_at FROM llm_cache WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                if row is not None:
+                    raw, expires_at, size, accessed_at = row
+                    if expires_at is None or expires_at > now:
+                        if now - accessed_at >= self.touch_interval:
+                            self._db.execute(
+                                "UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key)
+                            )
+                            self._db.commit()
+                        self._remember(key, expires_at, raw)
+                        self._counters["disk_hits"] += 1
+                        return json.loads(raw)
+                    self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._db.commit()
+                    self._disk_bytes -= size
+
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, key: str, value: dict) -> None:
+        """写入两级缓存（保存序列化结果，之后修改 value 不影响缓存），必要时淘汰旧条目。"""
+
+        expires_at = self._expires_at()
+        raw = json.dumps(value, ensure_ascii=False, default=str)
+        with self._lock:
+            self._remember(key, expires_at, raw)
+            self._counters["stores"] += 1
+            if self._db is None:
+                return
+            old = self._db.execute(
+                "SELECT size FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, expires_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, raw, len(raw), expires_at, time.time()),
+            )
+            self._disk_bytes += len(raw) - (old[0] if old else 0)
+            self._puts_since_sync += 1
+            if self._puts_since_sync >= DISK_SIZE_SYNC_EVERY:
+                self._sync_disk_bytes()
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+            self._db.commit()
+
+    def _remember(self, key: str, expires_at: Optional[float], raw: str) -> None:
+        """把序列化后的值写入内存层（调用方持有锁）。"""
+
+        self._memory[key] = (expires_at, raw)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _sync_disk_bytes(self) -> None:
+        """从库中重新统计磁盘层总字节数，计入其他进程的写入（调用方持有锁）。"""
+
+        assert self._db is not None
+        row = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        self._disk_bytes = int(row[0])
+        self._puts_since_sync = 0
+
+    def _evict_disk(self) -> None:
+        """清理过期条目，再按最久未访问淘汰到容量的 90%（调用方持有锁）。"""
+
+        assert self._db is not None
+        cur = self._db.execute(
+            "DELETE FROM llm_cache WHERE expires_at IS NOT NULL AND expires_at <= ?",
+            (time.time(),),
+        )
+        self._counters["evictions"] += cur.rowcount
+        target = int(self.max_disk_bytes * 0.9)
+        row = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        total = int(row[0])
+        if total > target:
+            rows = self._db.execute(
+                "SELECT key, size FROM llm_cache ORDER BY accessed_at"
+            ).fetchall()
+            doomed = []
+            for key, size in rows:
+                if total <= target:
+                    break
+                doomed.append((key,))
+                total -= size
+            self._db.executemany("DELETE FROM llm_cache WHERE key = ?", doomed)
+            self._counters["evictions"] += len(doomed)
+        self._disk_bytes = total
+
+    def clear(self) -> None:
+        """清空两级缓存（计数器保留）。"""
+
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+            self._disk_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中/未命中计数与容量信息。"""
+
+        with self._lock:
+            counters = dict(self._counters)
+            memory_entries = len(self._memory)
+            disk_bytes = self._disk_bytes
+        hits = counters["memory_hits"] + counters["disk_hits"]
+        lookups = hits + counters["misses"]
+        return {
+            **counters,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": memory_entries,
+            "disk_bytes": disk_bytes,
+        }
+
+
+_default_cache: Optional[LLMCache] = None
+# 保护默认实例的首次创建与替换；get_llm_cache 会在线程池中并发调用
+_default_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    """返回进程内共享的默认缓存实例（首次调用时创建）。"""
+
+    global _default_cache
+    cache = _default_cache
+    if cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = LLMCache()
+                logger.info(f"llm cache opened at {DEFAULT_DB_PATH}")
+            cache = _default_cache
+    return cache
+
+
+def configure_llm_cache(
+    db_path: Optional[Path] = DEFAULT_DB_PATH,
+    max_memory_entries: int = 1024,
+    max_disk_bytes: int = 64 * 1024 * 1024,
+    ttl_seconds: Optional[float] = 7 * 24 * 3600,
+    touch_interval: float = 3600.0,
+) -> LLMCache:
+    """替换进程内共享的缓存实例，例如基准测试中传入 db_path=None 只用内存层。"""
+
+    global _default_cache
+    cache = LLMCache(db_path, max_memory_entries, max_disk_bytes, ttl_seconds, touch_interval)
+    with _default_cache_lock:
+        _default_cache = cache
+    logger.info(f"llm cache configured: db_path={db_path}")
+    return cache
+
+
+def _collect_stats() -> Dict[str, Any]:
+    # 只汇报已打开的缓存，生成指标快照不应触发建库
+    return _default_cache.stats() if _default_cache is not None else {}
+
+
+get_metrics().register_collector("llm_cache", _collect_stats)
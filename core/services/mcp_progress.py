@@ -0,0 +1,26 @@
+"""将引擎层的流式回调桥接为 MCP 进度通知。"""
+
+from typing import Awaitable, Callable, Optional
+
+from mcp.server.fastmcp import Context
+
+
+def make_progress_sink(
+    ctx: Context, enabled: bool = True
+) -> Optional[Callable[[str], Awaitable[None]]]:
+    """返回把每段文本作为进度通知 message 推送给客户端的回调。
+
+    progress 为已推送的片段数；`enabled` 为 False 时返回 None（非流式）。
+    """
+
+    if not enabled:
+        return None
+
+    sent = 0
+
+    async def _sink(chunk: str) -> None:
+        nonlocal sent
+        sent += 1
+        await ctx.report_progress(progress=sent, message=chunk)
+
+    return _sink
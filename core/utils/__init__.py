@@ -1,3 +1,3 @@
 """通用工具子包。"""
 
-__all__ = ["dp_log", "helpers"]
+__all__ = ["dp_log", "helpers", "metrics", "tracing"]
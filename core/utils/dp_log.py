@@ -6,17 +6,204 @@
 @Author  :   dp
 @DESC    :   日志初始化脚本
 '''
+import atexit
 import inspect
+import re
 import sys
+import threading
+import time
+from datetime import date, timedelta
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Any, Dict, List, Optional, Union
 
 from loguru import logger
 
+_DEFAULT_FILE_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | "
+    "<level>{level: <8}</level> | "
+    "<cyan>{module}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - "
+    "<level>{message}</level>"
+)
+_RETENTION_RE = re.compile(r"^\s*(\d+)\s*(hour|day|week)s?\s*$")
+_RETENTION_UNITS = {"hour": 3600, "day": 86400, "week": 7 * 86400}
+
+
+def _parse_retention(retention: Any) -> Union[int, timedelta, None, bool]:
+    """把 retention 配置解析为 文件个数(int) / 时长(timedelta) / None（不清理）。
+
+    无法识别的写法返回 False，由调用方退回 loguru 的独立处理器。
+    """
+    if retention is None:
+        return None
+    if isinstance(retention, int):
+        return retention
+    if isinstance(retention, timedelta):
+        return retention
+    if isinstance(retention, str):
+        match = _RETENTION_RE.match(retention)
+        if match:
+            return timedelta(seconds=int(match.group(1)) * _RETENTION_UNITS[match.group(2)])
+    return False
+
+
+class _ModuleRoute:
+    """单个模块的日志文件：按日期切换文件，写入先进入缓冲区再批量落盘。"""
+
+    def __init__(
+        self,
+        log_path: Path,
+        levelno: int,
+        file_format: str,
+        use_date_dir: bool,
+        retention: Union[int, timedelta, None],
+    ):
+        self.log_path = log_path
+        self.levelno = levelno
+        # format 为字符串时 loguru 会自动追加换行与异常，改用回调后需自行拼接
+        self.format = file_format + "\n{exception}"
+        # 处于追踪链路中的记录（见 core.utils.tracing）额外带上 trace id
+        self.traced_format = file_format + " | trace={extra[trace_id]}\n{exception}"
+        self.use_date_dir = use_date_dir
+        self.retention = retention
+        self._day: Optional[date] = None
+        self._file = None
+        self._buffer: List[str] = []
+        self._buffered = 0
+
+    def _open(self, day: date) -> None:
+        """打开 day 对应的日志文件；非日期文件名时把前一天的文件改名归档。"""
+        self.log_path.mkdir(parents=True, exist_ok=True)
+        if self.use_date_dir:
+            target = self.log_path / f"{day.isoformat()}.log"
+        else:
+            target = self.log_path / "runtime.log"
+            if self._day is not None and target.exists():
+                target.rename(self.log_path / f"runtime.{self._day.isoformat()}.log")
+        self._file = open(target, "a", encoding="utf-8")
+        self._day = day
+        self._cleanup()
+
+    def _cleanup(self) -> None:
+        """按 retention 删除过期的日志文件（当前文件除外）。"""
+        if self.retention is None:
+            return
+        current = Path(self._file.name).name if self._file else None
+        files = sorted(
+            (path for path in self.log_path.glob("*.log*") if path.name != current),
+            key=lambda path: path.stat().st_mtime,
+            reverse=True,
+        )
+        if isinstance(self.retention, int):
+            expired = files[max(self.retention - 1, 0):]
+        else:
+            deadline = time.time() - self.retention.total_seconds()
+            expired = [path for path in files if path.stat().st_mtime < deadline]
+        for path in expired:
+            path.unlink(missing_ok=True)
+
+    def write(self, text: str, day: date) -> int:
+        if day != self._day:
+            self.flush()
+            self.close()
+            self._open(day)
+        self._buffer.append(text)
+        self._buffered += len(text)
+        return self._buffered
+
+    def flush(self) -> None:
+        if self._buffer and self._file is not None:
+            self._file.write("".join(self._buffer))
+            self._file.flush()
+        self._buffer.clear()
+        self._buffered = 0
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class _RoutingSink:
+    """全部模块共用的单个 loguru sink：按 extra["module"] 字典查找目标文件。
+
+    记录先写入各模块的缓冲区，累计超过 buffer_size、距上次落盘超过
+    flush_interval 或级别达到 ERROR 时批量写盘；后台线程定期落盘空闲缓冲。
+    注意不能提供 flush 方法，否则 loguru 会在每条记录后调用它。
+    """
+
+    def __init__(self, buffer_size: int = 64 * 1024, flush_interval: float = 1.0):
+        self.routes: Dict[str, _ModuleRoute] = {}
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._run_flusher, name="log-flusher", daemon=True
+        )
+        self._flusher.start()
+
+    # ---- loguru 回调 ----
+    def filter(self, record) -> bool:
+        route = self.routes.get(record["extra"].get("module"))
+        return route is not None and record["level"].no >= route.levelno
+
+    def format(self, record) -> str:
+        route = self.routes[record["extra"]["module"]]
+        return route.traced_format if "trace_id" in record["extra"] else route.format
+
+    def write(self, message) -> None:
+        record = message.record
+        route = self.routes.get(record["extra"].get("module"))
+        if route is None:
+            return
+        with self._lock:
+            buffered = route.write(str(message), record["time"].date())
+            if (
+                buffered >= self.buffer_size
+                or record["level"].no >= 40
+                or time.monotonic() - self._flushed_at >= self.flush_interval
+            ):
+                self._flush_locked()
+
+    def stop(self) -> None:
+        """loguru 移除处理器（包括进程退出）时调用，写出剩余缓冲。"""
+        self._stop.set()
+        self.flush_all()
+
+    # ---- 路由管理 ----
+    def add_route(self, module: str, route: _ModuleRoute) -> None:
+        with self._lock:
+            self.routes[module] = route
+
+    def remove_route(self, module: str) -> bool:
+        with self._lock:
+            route = self.routes.pop(module, None)
+            if route is None:
+                return False
+            route.flush()
+            route.close()
+            return True
+
+    def flush_all(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        for route in self.routes.values():
+            route.flush()
+        self._flushed_at = time.monotonic()
+
+    def _run_flusher(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush_all()
+
 
 class LogFactory:
     _configured_modules: Dict[str, int] = {}  # 记录模块与处理器ID的映射
     _console_handler_id: Optional[int] = None
+    _router: Optional[_RoutingSink] = None  # 所有模块共用的路由 sink
+    _router_handler_id: Optional[int] = None
     _default_config = {
         "log_dir": "logs",
         "retention": "7 days",
@@ -72,46 +259,86 @@ class LogFactory:
         if log_dir:
             config["log_dir"] = log_dir
 
-        # 如果模块未配置过，添加专属处理器
+        # 如果模块未配置过，登记到路由 sink（特殊轮转/压缩配置使用独立处理器）
         if module not in cls._configured_modules:
-            # 创建日志目录
-            log_path = Path(config["log_dir"]) / module
-            log_path.mkdir(parents=True, exist_ok=True)
-
-            # 生成文件名格式
-            file_name = "{time:YYYY-MM-DD}.log" if config["use_date_dir"] else "runtime.log"
-
-            # 文件日志格式
-            file_fmt = config["file_format"] or (
-                "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | "
-                "<level>{level: <8}</level> | "
-                "<cyan>{module}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - "
-                "<level>{message}</level>"
-            )
-
-            # 添加文件处理器
-            handler_id = logger.add(
-                sink=str(log_path / file_name),
-                rotation=config["rotation"],
-                retention=config["retention"],
-                compression=config["compression"],
-                level=config["level"],
-                format=file_fmt,
-                enqueue=config["enqueue"],
-                encoding="utf-8",
-                filter=lambda record: record["extra"].get("module") == module
-            )
-            cls._configured_modules[module] = handler_id
+            retention = _parse_retention(config["retention"])
+            if config["rotation"] == "00:00" and not config["compression"] and retention is not False:
+                cls._add_route(module, config, retention)
+            else:
+                cls._add_dedicated_handler(module, config)
 
         # 返回绑定模块的logger实例
         return logger.bind(module=module)
 
+    @classmethod
+    def _get_router(cls) -> _RoutingSink:
+        """首次使用时创建路由 sink，并以单个 loguru 处理器注册。"""
+        if cls._router is None:
+            router = _RoutingSink()
+            cls._router_handler_id = logger.add(
+                sink=router,
+                level=0,  # 级别在 filter 中按模块判断
+                format=router.format,
+                filter=router.filter,
+                enqueue=cls._default_config["enqueue"],
+                colorize=False,
+            )
+            cls._router = router
+            atexit.register(router.flush_all)
+        return cls._router
+
+    @classmethod
+    def _add_route(cls, module: str, config: Dict[str, Any], retention) -> None:
+        router = cls._get_router()
+        route = _ModuleRoute(
+            log_path=Path(config["log_dir"]) / module,
+            levelno=logger.level(config["level"]).no,
+            file_format=config["file_format"] or _DEFAULT_FILE_FORMAT,
+            use_date_dir=config["use_date_dir"],
+            retention=retention,
+        )
+        router.add_route(module, route)
+        cls._configured_modules[module] = cls._router_handler_id
+
+    @classmethod
+    def _add_dedicated_handler(cls, module: str, config: Dict[str, Any]) -> None:
+        """为使用特殊轮转/压缩配置的模块单独添加 loguru 文件处理器。"""
+        # 创建日志目录
+        log_path = Path(config["log_dir"]) / module
+        log_path.mkdir(parents=True, exist_ok=True)
+
+        # 生成文件名格式
+        file_name = "{time:YYYY-MM-DD}.log" if config["use_date_dir"] else "runtime.log"
+
+        # 添加文件处理器
+        handler_id = logger.add(
+            sink=str(log_path / file_name),
+            rotation=config["rotation"],
+            retention=config["retention"],
+            compression=config["compression"],
+            level=config["level"],
+            format=config["file_format"] or _DEFAULT_FILE_FORMAT,
+            enqueue=config["enqueue"],
+            encoding="utf-8",
+            filter=lambda record: record["extra"].get("module") == module
+        )
+        cls._configured_modules[module] = handler_id
+
+    @classmethod
+    def flush(cls):
+        """立即写出路由 sink 中缓冲的日志"""
+        if cls._router is not None:
+            cls._router.flush_all()
+
     @classmethod
     def remove_handler(cls, module: str):
         """移除指定模块的日志处理器"""
-        if handler_id := cls._configured_modules.get(module):
-            logger.remove(handler_id)
-            del cls._configured_modules[module]
+        handler_id = cls._configured_modules.pop(module, None)
+        if handler_id is None:
+            return
+        if cls._router is not None and cls._router.remove_route(module):
+            return
+        logger.remove(handler_id)
 
     @classmethod
     def disable_console(cls):
@@ -2,6 +2,9 @@ from pathlib import Path
 import json
 from typing import Any
 
+# 随代码分发的数据目录，以本文件为基准定位，不依赖启动时的工作目录
+DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+
 
 def ensure_directory(path: Path) -> Path:
     path.mkdir(parents=True, exist_ok=True)
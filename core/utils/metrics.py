@@ -0,0 +1,328 @@
+"""进程内指标注册表：计数器、仪表与固定内存的直方图。
+
+- 指标按 名称 + 标签 唯一确定，例如 `tool_latency_ms{tool=jp_chat_turn}`。
+- 直方图使用固定的对数分桶（相邻边界相差 10%），内存与样本数无关，
+  分位数在桶内线性插值，相对误差不超过一个桶宽。
+- 其他模块可注册 collector，在生成快照时附带各自的统计（如缓存命中率）。
+- `instrument_tool` 装饰 MCP 工具函数，记录调用次数、错误、取消、耗时与在途数量。
+"""
+
+import asyncio
+import functools
+import inspect
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from core.utils.dp_log import LogFactory
+
+logger = LogFactory.get_logger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def _log_buckets(low: float, high: float, factor: float) -> List[float]:
+    count = math.ceil(math.log(high / low) / math.log(factor))
+    return [low * factor**i for i in range(count + 1)]
+
+
+# 0.1 ms ~ 10 min，覆盖工具调用与模型生成的耗时范围
+LATENCY_BUCKETS_MS = _log_buckets(0.1, 600_000.0, 1.1)
+
+
+class Counter:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def reset(self) -> None:
+        with self._lock:
+            self.value = 0
+
+
+class Gauge:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value -= amount
+
+
+class Histogram:
+    """固定分桶直方图；最后一个桶收纳超过上界的样本。"""
+
+    __slots__ = ("bounds", "counts", "count", "sum", "min", "max", "_lock")
+
+    def __init__(self, bounds: List[float] = LATENCY_BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value < self.min:
+                self.min = value
+            if value > self.max:
+                self.max = value
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counts = [0] * (len(self.bounds) + 1)
+            self.count = 0
+            self.sum = 0.0
+            self.min = math.inf
+            self.max = -math.inf
+
+    def percentile(self, q: float) -> Optional[float]:
+        """估算分位数 q（0~1），无样本时返回 None。"""
+
+        with self._lock:
+            if self.count == 0:
+                return None
+            rank = q * self.count
+            seen = 0
+            for index, bucket_count in enumerate(self.counts):
+                if bucket_count and seen + bucket_count >= rank:
+                    lower = self.bounds[index - 1] if index > 0 else 0.0
+                    upper = self.bounds[index] if index < len(self.bounds) else self.max
+                    lower = max(lower, self.min)
+                    upper = min(upper, self.max)
+                    fraction = (rank - seen) / bucket_count
+                    return lower + (upper - lower) * fraction
+                seen += bucket_count
+            return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        if self.count == 0:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": round(self.sum / self.count, 3),
+            "min": round(self.min, 3),
+            "max": round(self.max, 3),
+            "p50": round(self.percentile(0.50), 3),
+            "p95": round(self.percentile(0.95), 3),
+            "p99": round(self.percentile(0.99), 3),
+        }
+
+
+def _metric_key(name: str, labels: Dict[str, Any]) -> str:
+    if not labels:
+        return name
+    inner = ",".join(f"{key}={labels[key]}" for key in sorted(labels))
+    return f"{name}{{{inner}}}"
+
+
+class MetricsRegistry:
+    """按名称与标签登记指标，并生成可序列化的快照。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Counter] = {}
+        self._gauges: Dict[str, Gauge] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self._started_at = time.time()
+
+    def _get(self, table: Dict[str, Any], factory: Callable[[], Any], name: str, labels) -> Any:
+        key = _metric_key(name, labels)
+        metric = table.get(key)
+        if metric is None:
+            with self._lock:
+                metric = table.setdefault(key, factory())
+        return metric
+
+    def counter(self, name: str, **labels: Any) -> Counter:
+        return self._get(self._counters, Counter, name, labels)
+
+    def gauge(self, name: str, **labels: Any) -> Gauge:
+        return self._get(self._gauges, Gauge, name, labels)
+
+    def histogram(self, name: str, **labels: Any) -> Histogram:
+        return self._get(self._histograms, Histogram, name, labels)
+
+    def register_collector(self, name: str, collect: Callable[[], Dict[str, Any]]) -> None:
+        """登记一个在生成快照时调用的统计函数，结果放在 collectors[name]。"""
+
+        self._collectors[name] = collect
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = dict(self._histograms)
+            collectors = dict(self._collectors)
+
+        collected: Dict[str, Any] = {}
+        for name, collect in collectors.items():
+            try:
+                collected[name] = collect()
+            except Exception as exc:  # noqa: BLE001
+                collected[name] = {"error": str(exc)}
+
+        return {
+            "timestamp": time.time(),
+            "uptime_s": round(time.time() - self._started_at, 1),
+            "pid": os.getpid(),
+            "counters": {key: metric.value for key, metric in sorted(counters.items())},
+            "gauges": {key: metric.value for key, metric in sorted(gauges.items())},
+            "histograms": {
+                key: metric.summary() for key, metric in sorted(histograms.items())
+            },
+            "collectors": collected,
+        }
+
+    def reset(self) -> None:
+        """把计数器与直方图原地清零（collector 保留）。
+
+        指标对象不替换：instrument_tool 等调用方在装饰时就持有了指标对象，
+        替换后它们的更新不会再出现在快照中。仪表表示当前值（如在途数），不清零。
+        """
+
+        with self._lock:
+            counters = list(self._counters.values())
+            histograms = list(self._histograms.values())
+            self._started_at = time.time()
+        for counter in counters:
+            counter.reset()
+        for histogram in histograms:
+            histogram.reset()
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    """返回进程内共享的指标注册表。"""
+
+    return _registry
+
+
+def instrument_tool(func: F) -> F:
+    """装饰 MCP 工具函数（放在 @mcp.tool() 下方），记录调用、错误、取消、耗时与在途数。
+
+    使用 functools.wraps 保留原函数签名与类型注解，FastMCP 生成的参数 schema
+    与 Context 注入不受影响。被取消的调用（客户端断开、调用方超时）单独记入
+    tool_cancelled，不算错误，也不计入耗时分布。
+    """
+
+    tool = func.__name__
+    calls = _registry.counter("tool_calls", tool=tool)
+    errors = _registry.counter("tool_errors", tool=tool)
+    cancelled = _registry.counter("tool_cancelled", tool=tool)
+    latency = _registry.histogram("tool_latency_ms", tool=tool)
+    inflight = _registry.gauge("tools_inflight")
+
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            calls.inc()
+            inflight.inc()
+            started = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except asyncio.CancelledError:
+                cancelled.inc()
+                raise
+            except BaseException:
+                errors.inc()
+                latency.observe((time.perf_counter() - started) * 1000)
+                raise
+            finally:
+                inflight.dec()
+            latency.observe((time.perf_counter() - started) * 1000)
+            return result
+
+        return async_wrapper  # type: ignore[return-value]
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        calls.inc()
+        inflight.inc()
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except BaseException:
+            errors.inc()
+            raise
+        finally:
+            inflight.dec()
+            latency.observe((time.perf_counter() - started) * 1000)
+
+    return wrapper  # type: ignore[return-value]
+
+
+class _SnapshotWriter:
+    """后台线程定期把快照写入本地 JSON 文件（原子替换）。"""
+
+    def __init__(self, path: Path, interval: float):
+        self.path = Path(path)
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-snapshot", daemon=True)
+        self._thread.start()
+
+    def write(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f"{self.path.name}.tmp")
+        tmp.write_text(
+            json.dumps(_registry.snapshot(), ensure_ascii=False, default=str, indent=2),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self.path)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError as exc:
+                logger.warning(f"failed to write metrics snapshot: {exc}")
+
+    def close(self) -> None:
+        self._stop.set()
+
+
+_snapshot_writer: Optional[_SnapshotWriter] = None
+
+
+def configure_metrics(snapshot_path: Optional[Path] = None, interval: float = 60.0) -> None:
+    """开启（传入 snapshot_path）或关闭定期快照文件。"""
+
+    global _snapshot_writer
+    if _snapshot_writer is not None:
+        _snapshot_writer.close()
+        _snapshot_writer = None
+    if snapshot_path is not None:
+        _snapshot_writer = _SnapshotWriter(snapshot_path, interval)
+        logger.info(f"metrics snapshots every {interval}s -> {snapshot_path}")
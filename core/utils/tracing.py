@@ -0,0 +1,273 @@
+"""轻量级链路追踪：记录嵌套 span 的耗时与属性，写出 Chrome trace event 格式。
+
+- 当前 trace / span 保存在 contextvars 中，跨 await、asyncio.gather 与
+  asyncio.to_thread 自动传递。
+- 采样在根 span 上决定一次，未采样的整条链路只做一次 contextvar 读取。
+- 根 span 结束时整条 trace 批量追加到 logs/traces/trace.json（JSON 数组格式，
+  可直接拖入 chrome://tracing 或 ui.perfetto.dev），超过大小上限后轮转。
+- trace 内产生的 loguru 日志会带上 extra["trace_id"]。
+"""
+
+import asyncio
+import functools
+import inspect
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from loguru import logger as _loguru_logger
+
+from core.utils.dp_log import LogFactory
+
+logger = LogFactory.get_logger(__name__)
+
+DEFAULT_TRACE_PATH = Path("logs") / "traces" / "trace.json"
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class Span:
+    """一次被追踪的操作；通过 set() 附加属性（如 token 数）。"""
+
+    __slots__ = ("name", "trace", "span_id", "parent_id", "start_us", "attrs", "tid")
+
+    def __init__(self, name: str, trace: "_Trace", parent_id: Optional[str], attrs: Dict[str, Any]):
+        self.name = name
+        self.trace = trace
+        self.span_id = os.urandom(4).hex()
+        self.parent_id = parent_id
+        self.start_us = time.time_ns() // 1000
+        self.attrs = attrs
+        self.tid = _current_tid()
+
+    def set(self, **attrs: Any) -> None:
+        for key, value in attrs.items():
+            if value is not None:
+                self.attrs[key] = value
+
+    def to_event(self, end_us: int) -> Dict[str, Any]:
+        """转换为 Chrome trace event（完整事件 ph="X"）。"""
+
+        return {
+            "name": self.name,
+            "cat": "jp-mcp",
+            "ph": "X",
+            "ts": self.start_us,
+            "dur": end_us - self.start_us,
+            "pid": os.getpid(),
+            "tid": self.tid,
+            "args": {
+                "trace_id": self.trace.trace_id,
+                "span_id": self.span_id,
+                "parent_id": self.parent_id,
+                **self.attrs,
+            },
+        }
+
+
+class _NoopSpan:
+    """未采样或未开启追踪时返回的空 span。"""
+
+    __slots__ = ()
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Trace:
+    """一条链路：收集已结束的 span，根 span 结束时统一写出。"""
+
+    __slots__ = ("trace_id", "sampled", "events", "closed")
+
+    def __init__(self, sampled: bool):
+        self.trace_id = os.urandom(8).hex() if sampled else ""
+        self.sampled = sampled
+        self.events: List[Dict[str, Any]] = []
+        self.closed = False
+
+
+_UNSAMPLED = _Trace(sampled=False)
+
+_current_trace: ContextVar[Optional[_Trace]] = ContextVar("trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("span", default=None)
+
+
+def _current_tid() -> int:
+    """并发的 asyncio 任务各自占一条时间线，避免重叠的 span 被画成嵌套。"""
+
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        return id(task) & 0x7FFFFFFF
+    return threading.get_ident() & 0x7FFFFFFF
+
+
+class _TraceWriter:
+    """把 trace event 追加到 JSON 数组文件，超过 max_bytes 后按序号轮转。"""
+
+    def __init__(self, path: Path, max_bytes: int, backup_count: int):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._lock = threading.Lock()
+
+    def _rotate(self) -> None:
+        for index in range(self.backup_count - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{index}")
+            if source.exists():
+                source.replace(self.path.with_name(f"{self.path.name}.{index + 1}"))
+        if self.backup_count > 0:
+            self.path.replace(self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+
+    def write(self, events: List[Dict[str, Any]]) -> None:
+        # 每行一个事件并以逗号结尾；trace 查看器允许数组缺少结尾的 "]"
+        payload = "".join(
+            json.dumps(event, ensure_ascii=False, default=str) + ",\n" for event in events
+        )
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if self.path.exists() and self.path.stat().st_size >= self.max_bytes:
+                self._rotate()
+            with self.path.open("a", encoding="utf-8") as fh:
+                if fh.tell() == 0:
+                    fh.write("[\n")
+                fh.write(payload)
+
+
+_sample_rate = 0.1
+_writer = _TraceWriter(DEFAULT_TRACE_PATH, max_bytes=10 * 1024 * 1024, backup_count=3)
+
+
+def configure_tracing(
+    sample_rate: float = 0.1,
+    path: Optional[Path] = None,
+    max_bytes: int = 10 * 1024 * 1024,
+    backup_count: int = 3,
+) -> None:
+    """设置采样率（0 关闭，1 全量）与输出文件、轮转参数。"""
+
+    global _sample_rate, _writer
+    _sample_rate = max(0.0, min(1.0, sample_rate))
+    _writer = _TraceWriter(path or DEFAULT_TRACE_PATH, max_bytes, backup_count)
+    logger.info(f"tracing sample rate: {_sample_rate}")
+
+
+def current_trace_id() -> Optional[str]:
+    """返回当前上下文所属的 trace id，未在采样的链路中时返回 None。"""
+
+    trace = _current_trace.get()
+    return trace.trace_id if trace is not None and trace.sampled else None
+
+
+def current_span() -> Any:
+    """返回当前 span（未采样时为空 span），用于给外层 span 补充属性。"""
+
+    trace = _current_trace.get()
+    if trace is None or not trace.sampled:
+        return _NOOP_SPAN
+    return _current_span.get() or _NOOP_SPAN
+
+
+@contextmanager
+def span(name: str, root: bool = True, **attrs: Any) -> Iterator[Any]:
+    """追踪一段代码。
+
+    :param root: 当前没有 trace 时是否开启新链路（按采样率决定）；
+                 为 False 时只在已有链路中记录，适合高频的底层函数。
+    """
+
+    trace = _current_trace.get()
+    if trace is None:
+        if not root:
+            yield _NOOP_SPAN
+            return
+        if _sample_rate <= 0.0 or random.random() >= _sample_rate:
+            trace_token = _current_trace.set(_UNSAMPLED)
+            try:
+                yield _NOOP_SPAN
+            finally:
+                _current_trace.reset(trace_token)
+            return
+        trace = _Trace(sampled=True)
+        trace_token = _current_trace.set(trace)
+    elif not trace.sampled:
+        yield _NOOP_SPAN
+        return
+    else:
+        trace_token = None
+
+    parent = _current_span.get()
+    current = Span(name, trace, parent.span_id if parent else None, attrs)
+    span_token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as exc:
+        current.set(error=type(exc).__name__)
+        raise
+    finally:
+        _current_span.reset(span_token)
+        event = current.to_event(time.time_ns() // 1000)
+        if trace_token is not None:
+            _current_trace.reset(trace_token)
+            trace.events.append(event)
+            trace.closed = True
+            _flush(trace.events)
+        elif trace.closed:
+            # 根 span 已结束后才完成的后台 span，单独写出
+            _flush([event])
+        else:
+            trace.events.append(event)
+
+
+def _flush(events: List[Dict[str, Any]]) -> None:
+    try:
+        _writer.write(events)
+    except OSError as exc:
+        logger.warning(f"failed to write trace events: {exc}")
+
+
+def traced(name: Optional[str] = None, root: bool = True) -> Callable[[F], F]:
+    """装饰器：以函数名（或 name）为 span 名追踪同步/异步函数。"""
+
+    def decorator(func: F) -> F:
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name, root=root):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, root=root):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def _inject_trace_id(record) -> None:
+    trace = _current_trace.get()
+    if trace is not None and trace.sampled:
+        record["extra"]["trace_id"] = trace.trace_id
+
+
+_loguru_logger.configure(patcher=_inject_trace_id)
@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 import asyncio
+import threading
 from dataclasses import dataclass, field
 from typing import Any, Dict, List
 import json
@@ -10,34 +11,75 @@ import json
 from fastmcp import Client
 from fastmcp.client.client import CallToolResult
 
-from core.services.agent_runner import AgentRunner
-from core.services.ai_client import AIClient
+from core.services.agent_runner import AgentRunner, ToolListChangeHandler
+from core.services.ai_client import aclose_shared_clients, get_ai_client
 from mcp_app import mcp
+from tools import register_all_tools
 
 # ⚠️ 必须导入所有工具模块以触发 @mcp.tool 注册
-import tools.japanese_chat_tools  # noqa: F401
-import tools.lesson_tools  # noqa: F401
-import tools.scenario_tools  # noqa: F401
-import tools.user_state_tools  # noqa: F401
-import tools.grammar_tools  # noqa: F401
-import tools.ollama_tools  # noqa: F401
+register_all_tools()
 
-mcp_client = Client(mcp)
-ai_client = AIClient()
-agent_runner = AgentRunner(ai_client, mcp_client)
+tool_events = ToolListChangeHandler()
+mcp_client = Client(mcp, message_handler=tool_events)
+ai_client = get_ai_client()
+agent_runner = AgentRunner(ai_client, mcp_client, tool_events=tool_events)
 
 
-async def call_tool(name: str, args: Dict[str, Any]) -> Any:
-    """以异步方式调用 MCP 工具，使用进程内 FastMCP 客户端。"""
+async def call_tool(
+    name: str, args: Dict[str, Any], progress_handler: Any = None
+) -> Any:
+    """调用 MCP 工具，复用 AgentRunner 持有的长连接会话。"""
 
-    async with mcp_client:
-        return await mcp_client.call_tool(name, args)
+    await agent_runner.start()
+    return await agent_runner.mcp.call_tool(
+        name, args, progress_handler=progress_handler
+    )
+
+
+async def call_tool_dict(
+    name: str, args: Dict[str, Any], progress_handler: Any = None
+) -> Dict[str, Any]:
+    """调用工具并把结果解析为 dict，便于在 REPL 中直接使用。"""
 
+    return extract_state_dict(await call_tool(name, args, progress_handler))
 
-def call_tool_sync(name: str, args: Dict[str, Any]) -> Any:
-    """同步封装，便于在 REPL 中直接调用工具。"""
 
-    return extract_state_dict(asyncio.run(call_tool(name, args)))
+async def read_line(prompt: str) -> str:
+    """在后台线程中等待终端输入，不阻塞事件循环。
+
+    使用守护线程而不是默认线程池：退出时仍阻塞在 input() 上的线程不会拖住进程。
+    """
+
+    loop = asyncio.get_running_loop()
+    future: asyncio.Future[str] = loop.create_future()
+
+    def resolve(result: str | None, exc: BaseException | None) -> None:
+        if future.done():
+            return
+        if exc is not None:
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+
+    def worker() -> None:
+        try:
+            line = input(prompt)
+        except BaseException as exc:  # noqa: BLE001 - EOFError 等交回事件循环处理
+            loop.call_soon_threadsafe(resolve, None, exc)
+        else:
+            loop.call_soon_threadsafe(resolve, line, None)
+
+    threading.Thread(target=worker, name="repl-input", daemon=True).start()
+    return await future
+
+
+async def print_stream_token(
+    progress: float, total: float | None, message: str | None
+) -> None:
+    """进度通知回调：把流式回复片段直接打印到终端。"""
+
+    if message:
+        print(message, end="", flush=True)
 
 
 @dataclass
@@ -77,6 +119,7 @@ def print_help() -> None:
     print("  /lesson-step <lesson_id> <i>   查看课程某一步")
     print("  /scenario <scene_id> <i>       查看场景某一步台词")
     print("  /scenario-reply <scene_id> <i> <日文回复>  回应场景并查看分析")
+    print("  /chat <日文>                   与 AI 日语对话（流式显示回复）")
     print("  普通文本                       进入自由对话模式（AgentRunner 驱动）")
 
 
@@ -142,7 +185,7 @@ def print_user_state(state: dict) -> None:
     print(format_grammar_stats(grammar_stats))
 
 
-def handle_command(line: str, session: Session) -> bool:
+async def handle_command(line: str, session: Session) -> bool:
     """解析并处理以 / 开头的命令，返回 False 表示退出。"""
 
     parts = line.strip().split()
@@ -164,13 +207,13 @@ def handle_command(line: str, session: Session) -> bool:
                 print(f"已切换当前用户为: {session.current_user_id}")  # 这里后面做权限管理
         elif cmd == "/state":
             if len(parts) >= 2 and parts[1].lower() == "reset":
-                state = call_tool_sync(
+                state = await call_tool_dict(
                     "reset_user_state", {"user_id": session.current_user_id}
                 )
                 print("已重置当前用户状态。")
                 print_user_state(state)
             else:
-                state = call_tool_sync(
+                state = await call_tool_dict(
                     "get_user_state", {"user_id": session.current_user_id}
                 )
                 print_user_state(state)
@@ -178,7 +221,7 @@ def handle_command(line: str, session: Session) -> bool:
             if len(parts) < 2:
                 print("[用法] /lesson <lesson_id>")
             else:
-                overview = call_tool_sync(
+                overview = await call_tool_dict(
                     "get_lesson_overview", {"lesson_id": parts[1]}
                 )
                 if overview:
@@ -200,7 +243,7 @@ def handle_command(line: str, session: Session) -> bool:
                 except ValueError:
                     print("[错误] step_index 需要是整数。")
                     return True
-                step = call_tool_sync(
+                step = await call_tool_dict(
                     "get_lesson_step",
                     {"lesson_id": parts[1], "step_index": step_index},
                 )
@@ -216,7 +259,7 @@ def handle_command(line: str, session: Session) -> bool:
                 except ValueError:
                     print("[错误] step_index 需要是整数。")
                     return True
-                step = call_tool_sync(
+                step = await call_tool_dict(
                     "scenario_get_step",
                     {"scenario_id": parts[1], "step_index": step_index},
                 )
@@ -227,6 +270,31 @@ def handle_command(line: str, session: Session) -> bool:
                     print(f"- 中文: {step.get('zh')}")
                 else:
                     print(f'当前无场景步骤 {parts[1]} 的相关信息，请检查相关场景是否注册。')
+        elif cmd == "/chat":
+            if len(parts) < 2:
+                print("[用法] /chat <日文>")
+            else:
+                print("[AI 日语] ", end="", flush=True)
+                result = await call_tool_dict(
+                    "jp_chat_turn",
+                    {
+                        "user_text": " ".join(parts[1:]),
+                        "history": session.history,
+                        "user_id": session.current_user_id,
+                        "stream": True,
+                    },
+                    progress_handler=print_stream_token,
+                )
+                print()
+                print(f"[中文] {result.get('zh')}")
+                correction = result.get("user_correction")
+                if correction:
+                    print(f"[纠错] {correction.get('corrected')}")
+                    print(f"- 说明: {correction.get('explain')}")
+                if result.get("level"):
+                    print(f"[当前等级] {result.get('level')}")
+                session.history.append({"role": "user", "content": " ".join(parts[1:])})
+                session.history.append({"role": "assistant", "content": result.get("jp", "")})
         elif cmd == "/scenario-reply":
             if len(parts) < 4:
                 print("[用法] /scenario-reply <scenario_id> <step_index> <日文回复>")
@@ -237,7 +305,7 @@ def handle_command(line: str, session: Session) -> bool:
                     print("[错误] step_index 需要是整数。")
                     return True
                 reply_text = " ".join(parts[3:])
-                result = call_tool_sync(
+                result = await call_tool_dict(
                     "scenario_reply",
                     {
                         "scenario_id": parts[1],
@@ -278,11 +346,11 @@ def handle_command(line: str, session: Session) -> bool:
     return True
 
 
-def handle_free_talk(text: str) -> None:
+async def handle_free_talk(text: str) -> None:
     """处理自由对话输入，通过 AgentRunner 调度 AI 与工具。"""
 
     try:
-        result = asyncio.run(agent_runner.run(text))
+        result = await agent_runner.run(text)
     except Exception as exc:  # noqa: BLE001
         print(f"[错误] 调用 AgentRunner 失败：{exc}")
         return
@@ -291,27 +359,44 @@ def handle_free_talk(text: str) -> None:
     print(result)
 
 
-def main() -> None:
-    """启动 REPL 主循环。"""
+async def repl_loop() -> None:
+    """在单个事件循环内运行 REPL：会话只打开一次，输入异步等待。"""
 
     print_banner()
     session = Session()
+    # 打开 MCP 会话并在后台预取工具列表，用户输入第一条命令时已就绪
+    await agent_runner.start()
+    prefetch = asyncio.create_task(agent_runner.list_tools())
 
-    while True:
-        try:
-            line = input("[JP-AI] > ").strip()
-        except (KeyboardInterrupt, EOFError):
-            print("\n再见，欢迎下次继续练习！")
-            break
+    try:
+        while True:
+            try:
+                line = (await read_line("[JP-AI] > ")).strip()
+            except EOFError:
+                print("\n再见，欢迎下次继续练习！")
+                break
 
-        if not line:
-            continue
+            if not line:
+                continue
 
-        if line.startswith("/"):
-            if not handle_command(line, session):
-                break
-        else:
-            handle_free_talk(line)
+            if line.startswith("/"):
+                if not await handle_command(line, session):
+                    break
+            else:
+                await handle_free_talk(line)
+    finally:
+        prefetch.cancel()
+        await agent_runner.close()
+        await aclose_shared_clients()
+
+
+def main() -> None:
+    """启动 REPL 主循环。"""
+
+    try:
+        asyncio.run(repl_loop())
+    except KeyboardInterrupt:
+        print("\n再见，欢迎下次继续练习！")
 
 
 if __name__ == "__main__":
@@ -1,24 +1,148 @@
-"""FastMCP 服务器入口文件，兼容异步工具。"""
+"""FastMCP 服务器入口文件，兼容异步工具。
+
+传输方式：
+- stdio（默认）：`python server.py`
+- 网络：`python server.py --transport streamable-http --port 8000 --workers 4`
+  由 uvicorn 主进程监听同一个端口，workers 个子进程共享该套接字处理请求；
+  收到 SIGINT / SIGTERM 后停止接收新连接，等待在途请求完成（最多
+  --graceful-timeout 秒），再落盘用户状态与日志后退出。
+"""
+
+import argparse
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional
 
 from core.utils.dp_log import LogFactory
 
 LogFactory.configure_global(enable_console=True)
 
+from core.engines.user_state_engine import configure_state_cache, flush_user_states  # noqa: E402
+from core.services.ai_client import aclose_shared_clients  # noqa: E402
+from core.utils.metrics import get_metrics  # noqa: E402
 from mcp_app import mcp  # noqa: E402
+from tools import register_all_tools  # noqa: E402
+
+logger = LogFactory.get_logger(__name__)
+
+# 注册全部工具模块（不要删除）
+register_all_tools()
+
+TRANSPORTS = ["stdio", "streamable-http", "sse"]
+
+# 多进程模式下子进程由 uvicorn 重新导入本模块，配置通过环境变量传递给工厂函数
+_ENV_TRANSPORT = "TRAINER_TRANSPORT"
+_ENV_WORKERS = "TRAINER_WORKERS"
+
+
+def create_http_app(transport: Optional[str] = None, workers: Optional[int] = None):
+    """构建当前进程的 ASGI 应用（uvicorn 工厂函数，参数缺省时读取环境变量）。
+
+    共享状态约定：
+    - 多个 worker 时使用无状态 streamable HTTP：每个请求独立完成，不依赖
+      某个进程内保存的会话，因此请求可以落到任意 worker。
+    - 多个 worker 时关闭用户状态写回缓存，每次更新直写 SQLite，并由
+      `update_user_state` 在 BEGIN IMMEDIATE 事务内跨进程串行化。
+    """
+
+    from sse_starlette.sse import AppStatus
+
+    transport = transport or os.environ.get(_ENV_TRANSPORT, "streamable-http")
+    workers = workers or int(os.environ.get(_ENV_WORKERS, "1"))
+    if workers > 1:
+        configure_state_cache(enabled=False)
+        mcp.settings.stateless_http = True
+
+    # sse_starlette 默认在收到退出信号时立即结束所有 SSE 响应，工具调用的
+    # 流式响应会被截断；关闭后由 uvicorn 等待在途请求自然结束。代价是会话级的
+    # 通知长连接（GET）要等到 --graceful-timeout 超时后才被取消
+    AppStatus.disable_automatic_graceful_drain()
 
-# 导入工具模块（不要删除）
-import tools.japanese_chat_tools  # noqa: F401,E402
-import tools.lesson_tools  # noqa: F401,E402
-import tools.scenario_tools  # noqa: F401,E402
-import tools.ollama_tools  # noqa: F401,E402
-import tools.grammar_tools  # noqa: F401,E402
-import tools.user_state_tools  # noqa: F401,E402
+    app = mcp.sse_app() if transport == "sse" else mcp.streamable_http_app()
+    inner_lifespan = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan(app):
+        logger.info(f"worker {os.getpid()} serving {transport}")
+        async with inner_lifespan(app):
+            yield
+        # uvicorn 在等待在途请求结束（或超时）之后才执行 lifespan 关闭
+        inflight = get_metrics().gauge("tools_inflight").value
+        if inflight:
+            logger.warning(f"worker {os.getpid()} stopping with {inflight:.0f} tool calls in flight")
+        # 工具调用与 lifespan 在同一事件循环内，关闭该循环上的 Ollama 连接池
+        await aclose_shared_clients()
+        flushed = flush_user_states()
+        logger.info(f"worker {os.getpid()} stopped, flushed {flushed} user states")
+        LogFactory.flush()
+
+    app.router.lifespan_context = lifespan
+    return app
+
+
+def run_http(
+    transport: str,
+    host: str,
+    port: int,
+    workers: int,
+    graceful_timeout: int,
+) -> None:
+    """以 uvicorn 运行网络传输；workers > 1 时由主进程监听并派生子进程。"""
+
+    import uvicorn
+
+    options = dict(
+        host=host,
+        port=port,
+        timeout_graceful_shutdown=graceful_timeout,
+        log_level="info",
+    )
+    if workers == 1:
+        uvicorn.run(create_http_app(transport, workers), **options)
+        return
+
+    os.environ[_ENV_TRANSPORT] = transport
+    os.environ[_ENV_WORKERS] = str(workers)
+    uvicorn.run(
+        "server:create_http_app",
+        factory=True,
+        workers=workers,
+        app_dir=str(Path(__file__).resolve().parent),
+        **options,
+    )
+
+
+async def run_stdio() -> None:
+    """以 stdio 运行，退出前关闭本事件循环上的 Ollama 连接池。"""
+
+    try:
+        await mcp.run_stdio_async()
+    finally:
+        await aclose_shared_clients()
 
 
 def main() -> None:
     """启动 MCP 服务器，FastMCP 内部会调度异步工具。"""
 
-    mcp.run()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transport", choices=TRANSPORTS, default="stdio")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="网络模式下的工作进程数")
+    parser.add_argument("--graceful-timeout", type=int, default=30, help="关闭时等待在途请求的秒数")
+    args = parser.parse_args()
+
+    if args.transport == "stdio":
+        asyncio.run(run_stdio())
+        return
+    if args.workers < 1:
+        parser.error("--workers 至少为 1")
+    if args.transport == "sse" and args.workers > 1:
+        # SSE 的长连接与 POST 消息必须落在同一进程，无法在多个 worker 间分发
+        parser.error("sse 传输只支持单个 worker，多进程请使用 streamable-http")
+    run_http(args.transport, args.host, args.port, args.workers, args.graceful_timeout)
 
 
 if __name__ == "__main__":
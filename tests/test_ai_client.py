@@ -0,0 +1,170 @@
+"""相同请求的并发合并：共享结果、取消与失败传播。"""
+
+import asyncio
+
+import pytest
+
+from core.services import ai_client
+from core.services.ai_client import _single_flight
+
+
+class _Backend:
+    """可控的假生成：记录调用次数，直到 release 才返回。"""
+
+    def __init__(self, result=None, error=None):
+        self.calls = 0
+        self.cancelled = 0
+        self.release = asyncio.Event()
+        self.result = result if result is not None else {"message": {"content": "はい"}}
+        self.error = error
+
+    async def generate(self):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def _inflight():
+    return ai_client._loop_inflight.get(asyncio.get_running_loop(), {})
+
+
+def test_concurrent_callers_share_one_generation():
+    async def main():
+        backend = _Backend()
+        tasks = [asyncio.ensure_future(_single_flight("k", backend.generate, "test")) for _ in range(5)]
+        await asyncio.sleep(0)
+        backend.release.set()
+        results = await asyncio.gather(*tasks)
+        assert backend.calls == 1
+        assert all(result == backend.result for result in results)
+        # 每个调用方拿到独立副本
+        results[0]["message"]["content"] = "changed"
+        assert results[1]["message"]["content"] == "はい"
+        assert backend.result["message"]["content"] == "はい"
+        assert _inflight() == {}
+
+    asyncio.run(main())
+
+
+def test_cancelling_one_waiter_keeps_generation_for_others():
+    async def main():
+        backend = _Backend()
+        first = asyncio.ensure_future(_single_flight("k", backend.generate, "test"))
+        second = asyncio.ensure_future(_single_flight("k", backend.generate, "test"))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        backend.release.set()
+        assert await second == backend.result
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert backend.calls == 1
+        assert backend.cancelled == 0
+
+    asyncio.run(main())
+
+
+def test_last_waiter_leaving_cancels_generation():
+    async def main():
+        backend = _Backend()
+        tasks = [asyncio.ensure_future(_single_flight("k", backend.generate, "test")) for _ in range(2)]
+        await asyncio.sleep(0)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert backend.cancelled == 1
+        assert _inflight() == {}
+
+        # 之后的同键请求重新生成，不会加入已取消的任务
+        retry = asyncio.ensure_future(_single_flight("k", backend.generate, "test"))
+        await asyncio.sleep(0)
+        backend.release.set()
+        assert await retry == backend.result
+        assert backend.calls == 2
+
+    asyncio.run(main())
+
+
+def test_failure_propagates_to_all_waiters_and_is_not_kept():
+    async def main():
+        backend = _Backend(error=RuntimeError("backend down"))
+        tasks = [asyncio.ensure_future(_single_flight("k", backend.generate, "test")) for _ in range(3)]
+        await asyncio.sleep(0)
+        backend.release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert backend.calls == 1
+        assert _inflight() == {}
+
+        backend.error = None
+        assert await _single_flight("k", backend.generate, "test") == backend.result
+        assert backend.calls == 2
+
+    asyncio.run(main())
+
+
+def test_different_keys_are_not_coalesced():
+    async def main():
+        backend = _Backend()
+        tasks = [
+            asyncio.ensure_future(_single_flight(key, backend.generate, "test"))
+            for key in ("a", "b")
+        ]
+        await asyncio.sleep(0)
+        backend.release.set()
+        await asyncio.gather(*tasks)
+        assert backend.calls == 2
+
+    asyncio.run(main())
+
+
+def test_aclose_shared_clients_closes_transports(monkeypatch):
+    import httpx
+
+    closed = []
+
+    async def _aclose(self):
+        closed.append(self)
+
+    monkeypatch.setattr(httpx.AsyncHTTPTransport, "aclose", _aclose)
+
+    async def main():
+        first = ai_client._get_async_client("http://a:11434")
+        assert ai_client._get_async_client("http://a:11434") is first
+        ai_client._get_async_client("http://b:11434")
+        transports = list(ai_client._loop_transports[asyncio.get_running_loop()].values())
+        await ai_client.aclose_shared_clients()
+        assert ai_client._get_async_client("http://a:11434") is not first
+        await ai_client.aclose_shared_clients()
+        return transports
+
+    transports = asyncio.run(main())
+    assert closed[:2] == transports
+    assert len(closed) == 3
+
+
+def test_http_lifespan_closes_shared_clients(monkeypatch):
+    import server
+
+    calls = []
+
+    async def _aclose():
+        calls.append(asyncio.get_running_loop())
+
+    monkeypatch.setattr(server, "aclose_shared_clients", _aclose)
+    monkeypatch.setattr(server, "flush_user_states", lambda: 0)
+    app = server.create_http_app("streamable-http", 1)
+
+    async def main():
+        async with app.router.lifespan_context(app):
+            assert calls == []
+        return asyncio.get_running_loop()
+
+    assert calls == [asyncio.run(main())]
@@ -0,0 +1,98 @@
+"""工具定义转换缓存与相关性过滤。"""
+
+import asyncio
+from types import SimpleNamespace
+
+from core.services import ai_client_utils
+from core.services.agent_runner import AgentRunner, ToolListChangeHandler
+from core.services.ai_client_utils import ToolSchemaCache, ToolSchemaSet, convert_mcp_tools_to_ollama
+
+
+def _tool(name, description):
+    return SimpleNamespace(name=name, description=description, inputSchema={"type": "object"})
+
+
+TOOLS = [
+    ("jp_detect_grammar", "识别日语文本中的语法点"),
+    ("get_user_state", "读取用户的学习状态与等级"),
+    ("jp_translate", "把日语翻译成中文"),
+    ("lesson_step", "返回课程的某一步 lesson step"),
+    ("server_metrics", "返回服务运行指标"),
+]
+
+
+def _tools():
+    return [_tool(name, description) for name, description in TOOLS]
+
+
+def _names(tools):
+    return [tool["function"]["name"] for tool in tools]
+
+
+def test_select_keeps_most_relevant_in_original_order():
+    schemas = ToolSchemaSet(convert_mcp_tools_to_ollama(_tools()))
+    selected = schemas.select("这句话的语法点是什么？顺便翻译成中文", max_tools=2)
+    assert _names(selected) == ["jp_detect_grammar", "jp_translate"]
+
+
+def test_select_pinned_and_fallbacks():
+    schemas = ToolSchemaSet(convert_mcp_tools_to_ollama(_tools()))
+    selected = schemas.select("lesson", max_tools=2, always_include=["server_metrics"])
+    assert _names(selected) == ["lesson_step", "server_metrics"]
+    # 无命中时返回全部；数量不超过上限时不过滤
+    assert schemas.select("zzz", max_tools=2) is schemas.tools
+    assert schemas.select("zzz", max_tools=10) is schemas.tools
+
+
+def test_cache_reuses_conversion_for_equal_tool_lists():
+    cache = ToolSchemaCache()
+    first = cache.get(_tools(), version=0)
+    # 另一个会话拉到的同一份工具列表（不同对象）
+    assert cache.get(_tools(), version=0) is first
+    assert cache.get(_tools(), version=3) is not first
+    renamed = _tools()[:-1] + [_tool("server_metrics", "新的描述")]
+    assert cache.get(renamed, version=0) is not first
+    assert cache.stats() == {"entries": 3, "hits": 1, "conversions": 3}
+
+
+def test_cache_is_bounded():
+    cache = ToolSchemaCache(max_entries=2)
+    for version in range(5):
+        cache.get(_tools(), version=version)
+    assert cache.stats()["entries"] == 2
+
+
+class _FakeMCP:
+    def __init__(self):
+        self.list_calls = 0
+
+    def is_connected(self):
+        return True
+
+    async def list_tools(self):
+        self.list_calls += 1
+        return _tools()
+
+
+def test_new_runners_share_converted_schemas(monkeypatch):
+    cache = ToolSchemaCache()
+    monkeypatch.setattr(ai_client_utils, "_tool_schema_cache", cache)
+
+    async def main():
+        results = []
+        for _ in range(3):
+            runner = AgentRunner(None, _FakeMCP(), tool_events=ToolListChangeHandler())
+            results.append(await runner.ollama_tools("语法"))
+        return results
+
+    results = asyncio.run(main())
+    assert all(result is results[0] for result in results)
+    assert cache.stats()["conversions"] == 1
+
+
+def test_tool_list_change_gets_a_process_unique_version():
+    first, second = ToolListChangeHandler(), ToolListChangeHandler()
+    assert first.version == second.version == 0
+    asyncio.run(first.on_tool_list_changed(None))
+    asyncio.run(second.on_tool_list_changed(None))
+    assert 0 != first.version != second.version != 0
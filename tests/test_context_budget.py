@@ -0,0 +1,80 @@
+"""ContextBudget：token 估算、工具输出截断与按预算裁剪消息。"""
+
+from core.services.context_budget import ContextBudget, estimate_tokens
+
+
+def _msg(role, content="", **extra):
+    return {"role": role, "content": content, **extra}
+
+
+def _agent_history(steps, size=200):
+    """system + 用户问题 + steps 组（助手工具调用, 工具结果）+ 最后的助手回复。"""
+
+    messages = [_msg("system", "s"), _msg("user", "問題")]
+    for step in range(steps):
+        messages.append(_msg("assistant", "", tool_calls=[{"function": {"name": f"t{step}"}}]))
+        messages.append(_msg("tool", "x" * size * 4, tool_name=f"t{step}"))
+    messages.append(_msg("assistant", "答え"))
+    return messages
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+    assert estimate_tokens("日本語") == 3
+    assert estimate_tokens("日本語abcd") == 4
+
+
+def test_compact_tool_output_truncates_per_tool():
+    budget = ContextBudget(max_tool_tokens=10, tool_limits={"big": 100})
+    text = "x" * 400
+    short = budget.compact_tool_output("other", text)
+    assert short.startswith("x" * 10) and "已截断" in short
+    assert estimate_tokens(short.split("\n")[0]) <= 10
+    assert budget.compact_tool_output("big", text) == text
+    assert budget.compact_tool_output("other", {"a": 1}) == '{"a": 1}'
+
+
+def test_fit_within_budget_keeps_everything():
+    messages = _agent_history(2, size=10)
+    fitted, report = ContextBudget(max_tokens=10000).fit(messages, iteration=3)
+    assert fitted == messages
+    assert report["dropped"] == 0
+    assert report["iteration"] == 3
+    assert report["tokens"] == report["tokens_before_trim"]
+
+
+def test_fit_drops_oldest_steps_with_their_tool_results():
+    messages = _agent_history(5)
+    budget = ContextBudget(max_tokens=700, keep_recent=3)
+    fitted, report = budget.fit(messages)
+
+    assert fitted[:2] == messages[:2]
+    assert fitted[-1] == messages[-1]
+    assert report["tokens"] <= 700
+    assert report["dropped"] == len(messages) - len(fitted)
+    assert report["dropped"] % 2 == 0
+    # 不会留下缺少调用消息的工具结果
+    for index, message in enumerate(fitted):
+        if message["role"] == "tool":
+            assert fitted[index - 1]["role"] == "assistant"
+    # 原列表不变
+    assert len(messages) == 13
+
+
+def test_fit_counts_extra_tokens_and_reports_when_still_over():
+    messages = _agent_history(1)
+    budget = ContextBudget(max_tokens=100, keep_recent=4)
+    fitted, report = budget.fit(messages, extra_tokens=50)
+    # 全部消息都受保护，无法再裁剪
+    assert fitted == messages
+    assert report["tokens"] > 100
+    assert report["tokens_before_trim"] == report["tokens"]
+
+
+def test_recent_window_does_not_start_with_tool_result():
+    messages = _agent_history(3)
+    # keep_recent=2 时最近区间本应从最后一个工具结果开始，需前移到其调用消息
+    fitted, _ = ContextBudget(max_tokens=1, keep_recent=2).fit(messages)
+    assert [message["role"] for message in fitted] == ["system", "user", "assistant", "tool", "assistant"]
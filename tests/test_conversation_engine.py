@@ -0,0 +1,112 @@
+"""对话轮次各阶段的超时/异常降级。"""
+
+import asyncio
+
+import pytest
+
+from core.engines import conversation_engine
+from core.engines.conversation_engine import _run_stage, process_user_utterance
+
+
+async def _sleep_then(value, delay):
+    await asyncio.sleep(delay)
+    return value
+
+
+async def _raise(exc):
+    raise exc
+
+
+def test_run_stage_returns_result():
+    timings, degraded = {}, []
+    result = asyncio.run(_run_stage("grammar", _sleep_then("ok", 0), "fallback", timings, degraded))
+    assert result == "ok"
+    assert degraded == []
+    assert timings["grammar"] >= 0
+
+
+def test_run_stage_timeout_uses_fallback(monkeypatch):
+    monkeypatch.setitem(conversation_engine.STAGE_TIMEOUTS, "grammar", 0.01)
+    timings, degraded = {}, []
+    result = asyncio.run(_run_stage("grammar", _sleep_then("late", 1), [], timings, degraded))
+    assert result == []
+    assert degraded == ["grammar"]
+    assert 0 < timings["grammar"] < 1000
+
+
+def test_run_stage_exception_uses_fallback():
+    timings, degraded = {}, []
+    result = asyncio.run(
+        _run_stage("translation", _raise(RuntimeError("backend down")), "", timings, degraded)
+    )
+    assert result == ""
+    assert degraded == ["translation"]
+    assert "translation" in timings
+
+
+def test_run_stage_does_not_swallow_cancellation():
+    async def main():
+        task = asyncio.ensure_future(_run_stage("reply", asyncio.sleep(1), "fallback", {}, []))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+
+
+@pytest.fixture
+def fake_stages(monkeypatch):
+    """替换各阶段实现，记录状态更新调用。"""
+
+    updates = []
+
+    async def _reply(user_text, history, on_reply_token):
+        return "はい、そうです。"
+
+    async def _translate(jp_text):
+        return "是的。"
+
+    async def _correction(user_text):
+        return None
+
+    async def _update(user_id, mutate):
+        updates.append(user_id)
+        return {"level": "N5"}
+
+    monkeypatch.setattr(conversation_engine, "_generate_ai_reply", _reply)
+    monkeypatch.setattr(conversation_engine, "_translate_to_zh", _translate)
+    monkeypatch.setattr(conversation_engine, "_analyze_user_sentence", _correction)
+    monkeypatch.setattr(conversation_engine, "update_user_state_async", _update)
+    return updates
+
+
+def test_turn_updates_state_when_no_stage_degraded(fake_stages):
+    result = asyncio.run(process_user_utterance("こんにちは", user_id="u1"))
+    assert result["degraded"] == []
+    assert result["level"] == "N5"
+    assert fake_stages == ["u1"]
+
+
+@pytest.mark.parametrize("stage", ["_analyze_user_sentence", "_generate_ai_reply"])
+def test_turn_skips_state_update_when_correction_or_reply_degraded(monkeypatch, fake_stages, stage):
+    async def _fail(*args):
+        raise RuntimeError("backend down")
+
+    monkeypatch.setattr(conversation_engine, stage, _fail)
+    result = asyncio.run(process_user_utterance("こんにちは", user_id="u1"))
+    assert result["degraded"] in (["correction"], ["reply"])
+    assert result["level"] is None
+    assert "state" not in result["timings"]
+    assert fake_stages == []
+
+
+def test_turn_translation_fallback_is_empty_and_still_counts(monkeypatch, fake_stages):
+    async def _fail(jp_text):
+        raise RuntimeError("backend down")
+
+    monkeypatch.setattr(conversation_engine, "_translate_to_zh", _fail)
+    result = asyncio.run(process_user_utterance("こんにちは", user_id="u1"))
+    assert result["zh"] == ""
+    assert result["degraded"] == ["translation"]
+    assert fake_stages == ["u1"]
@@ -0,0 +1,39 @@
+"""批量检测的进程池路径与进程内检测保持一致。"""
+
+import pytest
+
+from core.engines import grammar_engine
+from core.engines.grammar_rules import GRAMMAR_PATTERNS
+
+
+@pytest.fixture
+def extra_rule(monkeypatch):
+    """运行时追加一条规则，结束后恢复规则表并换下进程池。"""
+
+    monkeypatch.setattr(grammar_engine, "BATCH_INLINE_THRESHOLD", 4)
+    rule = {"name": "～ばかり", "pattern": ["ばかり"], "description": "", "example": ""}
+    grammar_engine.reload_grammar_rules()
+    GRAMMAR_PATTERNS.append(rule)
+    grammar_engine.reload_grammar_rules()
+    yield rule
+    GRAMMAR_PATTERNS.remove(rule)
+    grammar_engine.reload_grammar_rules()
+
+
+def test_pool_sees_rules_changed_at_runtime(extra_rule):
+    texts = ["食べてばかりいる", "雨だから", "ここに座ってもいい", "何もない"] * 4
+    batch = grammar_engine.detect_grammar_batch(texts)
+    assert batch["results"] == [grammar_engine.detect_grammar(text) for text in texts]
+    assert batch["rule_counts"]["～ばかり"] == 4
+
+
+def test_reload_restarts_pool_with_new_rules(extra_rule):
+    texts = ["食べてばかりいる"] * 8
+    assert grammar_engine.detect_grammar_batch(texts)["rule_counts"] == {"～ばかり": 8}
+
+    GRAMMAR_PATTERNS.remove(extra_rule)
+    grammar_engine.reload_grammar_rules()
+    try:
+        assert grammar_engine.detect_grammar_batch(texts)["rule_counts"] == {}
+    finally:
+        GRAMMAR_PATTERNS.append(extra_rule)
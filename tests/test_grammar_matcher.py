@@ -0,0 +1,94 @@
+"""GrammarMatcher 与改造前逐条规则遍历的结果一致性。"""
+
+import random
+
+import pytest
+
+from core.engines.grammar_matcher import GrammarMatcher
+from core.engines.grammar_rules import GRAMMAR_PATTERNS
+from core.models import GrammarPoint
+
+
+def _detect_by_rule_loop(rules, jp_text):
+    """改造前 detect_grammar 的实现：逐条规则做子串判断。"""
+
+    results = []
+    lowered = jp_text.lower()
+    for rule in rules:
+        keywords = rule.get("pattern", [])
+        if any(keyword in lowered for keyword in keywords):
+            results.append(
+                GrammarPoint(
+                    name=rule.get("name", ""),
+                    description=rule.get("description", ""),
+                    example=rule.get("example", ""),
+                )
+            )
+    return results
+
+
+# 关键词互为前缀/后缀/子串，覆盖失败指针与输出合并的各种情况
+OVERLAPPING_RULES = [
+    {"name": "a", "pattern": ["から"], "description": "", "example": ""},
+    {"name": "b", "pattern": ["からだ", "ので"], "description": "", "example": ""},
+    {"name": "c", "pattern": ["だから"], "description": "", "example": ""},
+    {"name": "d", "pattern": ["ら"], "description": "", "example": ""},
+    {"name": "e", "pattern": ["ても", "てもいい"], "description": "", "example": ""},
+    {"name": "f", "pattern": ["ab", "bc", "abcd"], "description": "", "example": ""},
+]
+
+SAMPLE_TEXTS = [
+    "",
+    "雨が降っているから、傘を持って行きます。",
+    "学生のうちにもっと勉強すべきだ。",
+    "ここに座ってもいいですか。",
+    "疲れたからだ。だから休む。",
+    "ABCD と abc",
+    "ても ても てもいい",
+    "何も当てはまらない文",
+]
+
+
+@pytest.mark.parametrize("rules", [GRAMMAR_PATTERNS, OVERLAPPING_RULES])
+@pytest.mark.parametrize("text", SAMPLE_TEXTS)
+def test_detect_matches_rule_loop(rules, text):
+    assert GrammarMatcher(rules).detect(text) == _detect_by_rule_loop(rules, text)
+
+
+def test_detect_matches_rule_loop_on_random_texts():
+    rules = list(GRAMMAR_PATTERNS) + OVERLAPPING_RULES
+    matcher = GrammarMatcher(rules)
+    alphabet = "からだうちにてもいいのでabcdABCD、。 "
+    rng = random.Random(0)
+    for _ in range(500):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+        assert matcher.detect(text) == _detect_by_rule_loop(rules, text), text
+
+
+def test_detect_with_spans_positions():
+    matcher = GrammarMatcher(OVERLAPPING_RULES)
+    text = "だからだ"
+    matches = {match["point"]["name"]: match["spans"] for match in matcher.detect_with_spans(text)}
+    assert matches["a"] == [(1, 3)]
+    assert matches["b"] == [(1, 4)]
+    assert matches["c"] == [(0, 3)]
+    assert matches["d"] == [(2, 3)]
+    for name, spans in matches.items():
+        keywords = next(rule["pattern"] for rule in OVERLAPPING_RULES if rule["name"] == name)
+        assert all(text[start:end] in keywords for start, end in spans)
+
+
+def test_spans_index_original_text_when_lowercase_changes_length():
+    rules = [
+        {"name": "から", "pattern": ["から"], "description": "", "example": ""},
+        {"name": "abc", "pattern": ["abc"], "description": "", "example": ""},
+    ]
+    matcher = GrammarMatcher(rules)
+    # "İ".lower() 为两个字符，之后的下标不能整体后移
+    text = "İİ から ABC"
+    matches = {match["point"]["name"]: match["spans"] for match in matcher.detect_with_spans(text)}
+    assert matches["から"] == [(3, 5)]
+    assert matches["abc"] == [(6, 9)]
+    assert text[3:5] == "から"
+    assert text[6:9].lower() == "abc"
+    assert matcher.detect(text) == _detect_by_rule_loop(rules, text)
@@ -0,0 +1,92 @@
+"""课程仓库：热重载、异常文件保留旧目录与返回副本。"""
+
+import json
+import os
+
+import pytest
+
+from core.engines import lesson_engine
+from core.engines.lesson_engine import LessonRepository
+
+
+def _lesson(lesson_id, words=("水",)):
+    return {
+        "id": lesson_id,
+        "title": f"课程 {lesson_id}",
+        "level": "N5",
+        "vocab": [{"jp": word, "zh": word, "examples": [word]} for word in words],
+        "grammar": [{"name": "～です"}],
+    }
+
+
+def _write(path, content, bump=1):
+    """写入文件并推进修改时间，避免同一时间粒度内的两次写入无法区分。"""
+
+    path.write_text(content if isinstance(content, str) else json.dumps(content), encoding="utf-8")
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + bump * 1_000_000_000))
+
+
+@pytest.fixture
+def lessons_path(tmp_path):
+    path = tmp_path / "lessons.json"
+    _write(path, [_lesson("l1")])
+    return path
+
+
+@pytest.fixture
+def repository(lessons_path, monkeypatch):
+    repo = LessonRepository(lessons_path, check_interval=0)
+    monkeypatch.setattr(lesson_engine, "lesson_repository", repo)
+    return repo
+
+
+def test_default_path_does_not_depend_on_cwd(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert lesson_engine.LESSONS_PATH.is_absolute()
+    assert len(LessonRepository()) > 0
+
+
+def test_reloads_after_file_changes(repository, lessons_path):
+    assert [lesson["id"] for lesson in repository] == ["l1"]
+    _write(lessons_path, [_lesson("l1", words=("水", "火")), _lesson("l2")], bump=2)
+    assert len(repository) == 2
+    assert repository.overview("l1")["vocab_count"] == 2
+    assert len(repository.steps("l2")) == 2
+
+
+@pytest.mark.parametrize(
+    "content",
+    ['[{"id": "l1", "vocab": [', '[["not", "a", "lesson"]]', '[{"title": "no id"}]', '{"id": 1}'],
+)
+def test_malformed_file_keeps_previous_catalogue(repository, lessons_path, content):
+    assert len(repository) == 1
+    _write(lessons_path, content, bump=2)
+    assert [lesson["id"] for lesson in repository] == ["l1"]
+
+
+def test_vanished_file_keeps_previous_catalogue(repository, lessons_path):
+    assert len(repository) == 1
+    lessons_path.unlink()
+    assert len(repository) == 1
+    _write(lessons_path, [_lesson("l3")], bump=3)
+    assert [lesson["id"] for lesson in repository] == ["l3"]
+
+
+def test_returned_lessons_and_steps_are_copies(repository):
+    step = lesson_engine.get_step("l1", 0)
+    step["data"]["examples"].append("changed")
+    step["data"]["jp"] = "changed"
+    assert lesson_engine.get_step("l1", 0)["data"] == {"jp": "水", "zh": "水", "examples": ["水"]}
+
+    lesson = lesson_engine.get_lesson("l1")
+    lesson["vocab"].clear()
+    assert len(lesson_engine.get_lesson("l1")["vocab"]) == 1
+    assert lesson_engine.get_lesson_overview("l1")["vocab_count"] == 1
+
+
+def test_get_step_errors(repository):
+    with pytest.raises(ValueError):
+        lesson_engine.get_step("missing", 0)
+    with pytest.raises(IndexError):
+        lesson_engine.get_step("l1", 2)
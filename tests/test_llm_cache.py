@@ -0,0 +1,136 @@
+"""LLM 响应缓存：副本隔离、TTL 与磁盘层淘汰。"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from core.services import ai_client, llm_cache
+from core.services.ai_client import AIClient
+from core.services.llm_cache import LLMCache
+
+
+class _Clock:
+    """替换模块内的 time，手动推进时间。"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = _Clock()
+    monkeypatch.setattr(llm_cache, "time", fake)
+    return fake
+
+
+def _response(content, padding=0):
+    return {"message": {"role": "assistant", "content": content}, "pad": "x" * padding}
+
+
+def test_mutating_put_or_get_values_does_not_change_cache(tmp_path):
+    cache = LLMCache(tmp_path / "cache.db")
+    value = _response("はい")
+    cache.put("k", value)
+    value["message"]["content"] = "changed"
+
+    first = cache.get("k")
+    assert first["message"]["content"] == "はい"
+    first["message"]["tool_calls"] = []
+    assert cache.get("k") == _response("はい")
+    assert cache.stats()["memory_hits"] == 2
+
+
+def test_memory_and_disk_entries_expire_after_ttl(tmp_path, clock):
+    path = tmp_path / "cache.db"
+    cache = LLMCache(path, ttl_seconds=10)
+    cache.put("k", _response("はい"))
+    clock.now += 5
+    assert cache.get("k") is not None
+
+    # 新实例只有磁盘层，未过期时磁盘命中
+    assert LLMCache(path, ttl_seconds=10).get("k") is not None
+    clock.now += 10
+    assert cache.get("k") is None
+    reopened = LLMCache(path, ttl_seconds=10)
+    assert reopened.get("k") is None
+    assert reopened.stats()["disk_bytes"] == 0
+
+
+def test_disk_evicts_least_recently_accessed(tmp_path, clock):
+    path = tmp_path / "cache.db"
+    cache = LLMCache(path, max_memory_entries=1, max_disk_bytes=1200, touch_interval=0)
+    for index in range(4):
+        clock.now += 1
+        cache.put(f"k{index}", _response(str(index), padding=200))
+    # 访问 k0，使 k1 成为最久未访问的条目
+    clock.now += 1
+    assert cache.get("k0") is not None
+    clock.now += 1
+    cache.put("k4", _response("4", padding=200))
+
+    stats = cache.stats()
+    assert stats["disk_bytes"] <= 1080
+    reopened = LLMCache(path, max_memory_entries=1)
+    assert reopened.get("k1") is None
+    assert reopened.get("k0") is not None
+    assert reopened.get("k4") is not None
+
+
+def test_disk_hit_within_touch_interval_does_not_write(tmp_path, clock):
+    path = tmp_path / "cache.db"
+    LLMCache(path).put("k", _response("はい"))
+    cache = LLMCache(path, touch_interval=60)
+    accessed = lambda: cache._db.execute("SELECT accessed_at FROM llm_cache").fetchone()[0]
+
+    clock.now += 30
+    assert cache.get("k") is not None
+    assert accessed() == 1000.0
+    cache._memory.clear()
+    clock.now += 60
+    assert cache.get("k") is not None
+    assert accessed() == clock.now
+
+
+def test_client_cache_hits_are_independent_copies(monkeypatch):
+    monkeypatch.setattr(llm_cache, "_default_cache", LLMCache(None))
+    client = AIClient(mode="ollama", model="fake", host="http://fake")
+    calls = []
+
+    async def _dispatch(messages, tools):
+        calls.append(messages)
+        return _response("はい")
+
+    monkeypatch.setattr(client, "_dispatch", _dispatch)
+
+    async def main():
+        messages = [{"role": "user", "content": "こんにちは"}]
+        first = await client.chat(messages, cache=True)
+        first["message"]["content"] = "changed"
+        second = await client.chat(messages, cache=True)
+        second["message"]["content"] = "changed again"
+        return await client.chat(messages, cache=True)
+
+    assert asyncio.run(main())["message"]["content"] == "はい"
+    assert len(calls) == 1
+
+
+def test_concurrent_first_access_opens_one_cache(tmp_path, monkeypatch):
+    opened = []
+
+    class _SlowCache(LLMCache):
+        def __init__(self):
+            time.sleep(0.05)
+            super().__init__(None)
+            opened.append(self)
+
+    monkeypatch.setattr(llm_cache, "_default_cache", None)
+    monkeypatch.setattr(llm_cache, "LLMCache", _SlowCache)
+    with ThreadPoolExecutor(8) as pool:
+        caches = list(pool.map(lambda _: llm_cache.get_llm_cache(), range(8)))
+    assert len(opened) == 1
+    assert all(cache is opened[0] for cache in caches)
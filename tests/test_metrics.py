@@ -0,0 +1,98 @@
+"""指标注册表：直方图分位数、原地清零与工具装饰器。"""
+
+import asyncio
+import random
+
+import pytest
+
+from core.utils import metrics
+from core.utils.metrics import Histogram, MetricsRegistry, instrument_tool
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    fresh = MetricsRegistry()
+    monkeypatch.setattr(metrics, "_registry", fresh)
+    return fresh
+
+
+def test_percentile_empty_and_single_sample():
+    histogram = Histogram()
+    assert histogram.percentile(0.5) is None
+    assert histogram.summary() == {"count": 0}
+    histogram.observe(42.0)
+    for q in (0.0, 0.5, 1.0):
+        assert histogram.percentile(q) == pytest.approx(42.0)
+
+
+@pytest.mark.parametrize("q", [0.5, 0.9, 0.95, 0.99])
+def test_percentile_within_one_bucket_width(q):
+    rng = random.Random(q)
+    samples = sorted(rng.lognormvariate(3, 1.5) for _ in range(20000))
+    histogram = Histogram()
+    for value in samples:
+        histogram.observe(value)
+    exact = samples[int(q * len(samples)) - 1]
+    assert histogram.percentile(q) == pytest.approx(exact, rel=0.1)
+
+
+def test_percentile_is_clamped_to_observed_range():
+    histogram = Histogram()
+    for value in (10.0, 10.5, 11.0):
+        histogram.observe(value)
+    assert 10.0 <= histogram.percentile(0.01) <= histogram.percentile(0.99) <= 11.0
+    # 超过最后一个边界的样本落入溢出桶
+    histogram.observe(10_000_000.0)
+    assert histogram.percentile(1.0) == 10_000_000.0
+
+
+def test_reset_zeroes_metrics_in_place(registry):
+    @instrument_tool
+    def tool():
+        return "ok"
+
+    tool()
+    registry.gauge("inflight_like").set(3)
+    registry.reset()
+    snapshot = registry.snapshot()
+    assert snapshot["counters"]["tool_calls{tool=tool}"] == 0
+    assert snapshot["histograms"]["tool_latency_ms{tool=tool}"] == {"count": 0}
+    assert snapshot["gauges"]["inflight_like"] == 3
+
+    # 装饰时取得的指标对象在清零后继续上报
+    tool()
+    snapshot = registry.snapshot()
+    assert snapshot["counters"]["tool_calls{tool=tool}"] == 1
+    assert snapshot["histograms"]["tool_latency_ms{tool=tool}"]["count"] == 1
+
+
+def test_async_tool_cancellation_is_not_an_error(registry):
+    @instrument_tool
+    async def slow():
+        await asyncio.sleep(10)
+
+    @instrument_tool
+    async def broken():
+        raise RuntimeError("boom")
+
+    async def main():
+        task = asyncio.ensure_future(slow())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(slow(), 0.01)
+        with pytest.raises(RuntimeError):
+            await broken()
+
+    asyncio.run(main())
+    counters = registry.snapshot()["counters"]
+    assert counters["tool_calls{tool=slow}"] == 2
+    assert counters["tool_cancelled{tool=slow}"] == 2
+    assert counters["tool_errors{tool=slow}"] == 0
+    assert counters["tool_errors{tool=broken}"] == 1
+    assert registry.gauge("tools_inflight").value == 0
+    histograms = registry.snapshot()["histograms"]
+    assert histograms["tool_latency_ms{tool=slow}"] == {"count": 0}
+    assert histograms["tool_latency_ms{tool=broken}"]["count"] == 1
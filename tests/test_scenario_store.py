@@ -0,0 +1,130 @@
+"""场景存储：id 扫描、分块建索引以及文件变化后的重建。"""
+
+import json
+import os
+
+import pytest
+
+from core.engines import scenario_store as scenario_store_module
+from core.engines.scenario_store import ScenarioStore, _scan_file, scan_objects
+from core.utils.helpers import dump_json
+
+TRICKY = [
+    {"id": "plain", "turns": [{"id": "nested", "text": "no"}]},
+    {"title": "id", "id": "after \"quoted\" key", "note": "{[}]"},
+    {"meta": {"id": "inner only"}, "id": "outer"},
+    {"text": "\\", "id": "back\\slash"},
+    {"id": "あい"},
+    {"id": 7, "text": "non-string id"},
+    {"text": "missing id"},
+    {"id" : "spaced", "list": [[], [{}], "]"]},
+]
+
+
+def _raw(scenarios, indent=None, ensure_ascii=False):
+    return json.dumps(scenarios, ensure_ascii=ensure_ascii, indent=indent).encode("utf-8")
+
+
+def _expected_ids(raw):
+    return [
+        item.get("id") if isinstance(item.get("id"), str) else None for item in json.loads(raw)
+    ]
+
+
+def _scenario(scenario_id, size=1):
+    return {"id": scenario_id, "title": scenario_id, "script": [{"jp": "はい", "zh": "是"}] * size}
+
+
+@pytest.mark.parametrize("ensure_ascii", [False, True])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_scan_objects_matches_json_loads(indent, ensure_ascii):
+    raw = _raw(TRICKY, indent, ensure_ascii)
+    spans = list(scan_objects(raw))
+    assert [object_id for _, _, object_id in spans] == _expected_ids(raw)
+    assert [json.loads(raw[start:end]) for start, end, _ in spans] == json.loads(raw)
+
+
+def test_scan_objects_handles_escapes_and_brackets_in_strings():
+    raw = rb'[{"id": "a\"}]", "x": "\\"}, {"x": "{", "id": "b"}]'
+    assert [object_id for _, _, object_id in scan_objects(raw)] == ['a"}]', "b"]
+
+
+@pytest.mark.parametrize("chunk", [1, 7, 64, 1 << 20])
+def test_chunked_scan_matches_whole_buffer(tmp_path, monkeypatch, chunk):
+    monkeypatch.setattr(scenario_store_module, "SCAN_CHUNK_BYTES", chunk)
+    raw = _raw(TRICKY + [_scenario(f"s{index}", index) for index in range(20)], indent=2)
+    path = tmp_path / "scenarios.json"
+    path.write_bytes(raw)
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        assert list(_scan_file(fd, len(raw))) == list(scan_objects(raw))
+    finally:
+        os.close(fd)
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    path = tmp_path / "scenarios.json"
+    dump_json(path, [_scenario("a"), _scenario("b", 3)])
+    return path
+
+
+def test_get_returns_copies(corpus):
+    store = ScenarioStore(corpus)
+    scenario = store.get("b")
+    scenario["script"].clear()
+    assert len(store.get("b")["script"]) == 3
+    assert store.get("missing") is None
+    assert store.stats()["cache_hits"] == 1
+
+
+def test_in_place_rewrite_is_seen_immediately(corpus):
+    store = ScenarioStore(corpus)
+    assert store.get("a")["title"] == "a"
+    # dump_json 原地截断后重写，文件变短
+    dump_json(corpus, [_scenario("c")])
+    assert store.get("a") is None
+    assert store.get("c")["title"] == "c"
+    assert len(store) == 1
+
+
+def test_replace_by_rename_and_delete(corpus, tmp_path):
+    store = ScenarioStore(corpus)
+    assert len(store) == 2
+    replacement = tmp_path / "next.json"
+    dump_json(replacement, [_scenario("d")])
+    os.replace(replacement, corpus)
+    assert store.get("d")["id"] == "d"
+
+    corpus.unlink()
+    assert store.get("d") is None
+    assert len(store) == 0
+    assert store.stats()["file_bytes"] == 0
+
+
+def test_stale_offsets_rebuild_instead_of_raising(corpus):
+    store = ScenarioStore(corpus)
+    assert store.get("a") is not None
+    stat = corpus.stat()
+    # 同样大小、同样修改时间的原地改写：身份检查看不出变化，偏移已经失效
+    raw = corpus.read_bytes()
+    rewritten = raw.replace(b'"a"', b'"x"').replace(b'"b"', b'"a"').replace(b'"x"', b'"b"')
+    rewritten = b" " + rewritten[:-1]
+    assert len(rewritten) == len(raw)
+    with corpus.open("r+b") as f:
+        f.write(rewritten)
+    os.utime(corpus, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    store._cache.clear()
+
+    assert store.get("b")["id"] == "b"
+    assert store.get("a")["id"] == "a"
+    assert store.stats()["rebuilds"] == 2
+
+
+def test_iteration_stops_when_file_changes(corpus):
+    store = ScenarioStore(corpus)
+    iterator = iter(store)
+    assert next(iterator)["id"] == "a"
+    dump_json(corpus, [_scenario("c")])
+    assert list(iterator) == []
+    assert [scenario["id"] for scenario in store] == ["c"]
@@ -0,0 +1,236 @@
+"""用户状态引擎：直写模式下的 exclusive() 串行化、写回缓存与后端切换。"""
+
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pytest
+
+from core.engines import user_state_engine
+from core.engines.user_state_engine import UserStateCache, load_user_state, update_user_state
+from core.engines.user_state_store import SQLiteUserStateBackend, UserStateBackend
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _bump(state):
+    stats = state["grammar_stats"].setdefault("～から", {"seen": 0, "wrong": 0})
+    stats["seen"] += 1
+    state["seen_total"] += 1
+    return state
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """临时 SQLite 后端 + 关闭写回缓存（多 worker 部署的配置）。"""
+
+    path = tmp_path / "user_state.db"
+    backend = SQLiteUserStateBackend(path, legacy_json_dir=None)
+    monkeypatch.setattr(user_state_engine, "_backend", backend)
+    monkeypatch.setattr(user_state_engine, "_state_cache", None)
+    yield path
+    backend.close()
+
+
+def test_concurrent_thread_updates_are_not_lost(db_path):
+    def worker():
+        for _ in range(50):
+            update_user_state("u1", _bump)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    state = load_user_state("u1")
+    assert state["grammar_stats"]["～から"]["seen"] == 200
+    assert state["seen_total"] == 200
+
+
+def test_mutate_error_rolls_back(db_path):
+    update_user_state("u1", _bump)
+
+    def _fail(state):
+        _bump(state)
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        update_user_state("u1", _fail)
+
+    backend = user_state_engine.get_state_backend()
+    assert not backend._conn.in_transaction
+    assert load_user_state("u1")["seen_total"] == 1
+    # 回滚后连接仍可继续写入
+    update_user_state("u1", _bump)
+    assert load_user_state("u1")["seen_total"] == 2
+
+
+def test_concurrent_process_updates_are_not_lost(db_path):
+    script = textwrap.dedent(
+        f"""
+        from core.engines import user_state_engine
+        from core.engines.user_state_store import SQLiteUserStateBackend
+        from tests.test_user_state_engine import _bump
+
+        user_state_engine._state_cache = None
+        user_state_engine._backend = SQLiteUserStateBackend({str(db_path)!r}, legacy_json_dir=None)
+        for _ in range(50):
+            user_state_engine.update_user_state("u1", _bump)
+        """
+    )
+    processes = [
+        subprocess.Popen([sys.executable, "-c", script], cwd=REPO_ROOT) for _ in range(3)
+    ]
+    # 本进程同时写入同一用户
+    for _ in range(50):
+        update_user_state("u1", _bump)
+    assert all(process.wait(timeout=60) == 0 for process in processes)
+
+    assert load_user_state("u1")["seen_total"] == 200
+
+
+def test_concurrent_first_access_opens_one_backend(tmp_path, monkeypatch):
+    opened = []
+
+    class _SlowBackend(SQLiteUserStateBackend):
+        def __init__(self, path):
+            time.sleep(0.05)
+            super().__init__(path, legacy_json_dir=None)
+            opened.append(self)
+
+    monkeypatch.setattr(user_state_engine, "_backend", None)
+    monkeypatch.setattr(user_state_engine, "SQLiteUserStateBackend", _SlowBackend)
+    monkeypatch.setattr(user_state_engine, "DEFAULT_DB_PATH", tmp_path / "user_state.db")
+    with ThreadPoolExecutor(8) as pool:
+        backends = list(pool.map(lambda _: user_state_engine.get_state_backend(), range(8)))
+    try:
+        assert len(opened) == 1
+        assert all(backend is opened[0] for backend in backends)
+    finally:
+        for backend in opened:
+            backend.close()
+
+
+def test_user_locks_are_bounded():
+    locks = {user_state_engine.user_lock(f"user-{index}") for index in range(10000)}
+    assert len(locks) <= user_state_engine.USER_LOCK_STRIPES
+    assert user_state_engine.user_lock("u1") is user_state_engine.user_lock("u1")
+
+
+class _MemoryBackend(UserStateBackend):
+    """记录每次批量写入的内存后端。"""
+
+    def __init__(self, states: Optional[Dict[str, dict]] = None):
+        self.states = dict(states or {})
+        self.batches: List[List[str]] = []
+
+    def load(self, user_id):
+        state = self.states.get(user_id)
+        return dict(state) if state is not None else None
+
+    def save(self, state):
+        self.save_many([state])
+
+    def save_many(self, states):
+        states = list(states)
+        self.batches.append(sorted(state["user_id"] for state in states))
+        for state in states:
+            self.states[state["user_id"]] = dict(state)
+
+    def list_users(self):
+        return sorted(self.states)
+
+
+def _state(user_id, level="N5"):
+    return {"user_id": user_id, "level": level, "grammar_stats": {}, "seen_total": 0, "wrong_total": 0}
+
+
+@pytest.fixture
+def memory_backend(monkeypatch):
+    fake = _MemoryBackend()
+    monkeypatch.setattr(user_state_engine, "_backend", fake)
+    return fake
+
+
+def test_flush_writes_dirty_entries_in_one_batch(memory_backend):
+    cache = UserStateCache(flush_interval=3600, flush_threshold=100)
+    cache.put(_state("a"))
+    cache.put(_state("b"))
+    cache.add_clean(_state("c"))
+    assert memory_backend.batches == []
+
+    assert cache.flush() == 2
+    assert memory_backend.batches == [["a", "b"]]
+    assert cache.flush() == 0
+    cache.close()
+
+
+def test_threshold_triggers_flush(memory_backend):
+    cache = UserStateCache(flush_interval=3600, flush_threshold=3)
+    for user_id in ("a", "b"):
+        cache.put(_state(user_id))
+    assert memory_backend.batches == []
+    cache.put(_state("c"))
+    assert memory_backend.batches == [["a", "b", "c"]]
+    cache.close()
+
+
+def test_evicts_least_recently_used_clean_entries(memory_backend):
+    cache = UserStateCache(max_entries=2, flush_interval=3600, flush_threshold=100)
+    cache.add_clean(_state("a"))
+    cache.put(_state("b"))
+    cache.add_clean(_state("c"))
+    # a 是最久未使用的干净条目；b 虽然更早但是脏的，不能丢
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+    assert cache.get("c") is not None
+    assert memory_backend.batches == []
+    cache.close()
+
+
+def test_all_dirty_over_capacity_flushes_before_evicting(memory_backend):
+    cache = UserStateCache(max_entries=2, flush_interval=3600, flush_threshold=100)
+    for user_id in ("a", "b", "c"):
+        cache.put(_state(user_id))
+    assert memory_backend.batches == [["a", "b", "c"]]
+    assert cache.get("a") is None
+    assert cache.get("c") is not None
+    cache.close()
+
+
+def test_cached_state_is_a_copy(memory_backend):
+    cache = UserStateCache(flush_interval=3600)
+    state = _state("a")
+    cache.put(state)
+    state["grammar_stats"]["～から"] = {"seen": 1, "wrong": 0}
+    cached = cache.get("a")
+    assert cached["grammar_stats"] == {}
+    cached["level"] = "N1"
+    assert cache.get("a")["level"] == "N5"
+    cache.close()
+
+
+def test_switching_backend_drops_entries_of_the_old_backend(monkeypatch):
+    old = _MemoryBackend({"a": _state("a", level="N3")})
+    new = _MemoryBackend()
+    monkeypatch.setattr(user_state_engine, "_backend", old)
+    monkeypatch.setattr(user_state_engine, "_state_cache", UserStateCache(flush_interval=3600))
+    monkeypatch.setattr(user_state_engine, "JsonUserStateBackend", lambda path: new)
+
+    assert user_state_engine.load_user_state("a")["level"] == "N3"
+    user_state_engine.save_user_state(_state("b", level="N2"))
+    user_state_engine.configure_state_backend("json")
+
+    # 旧后端的脏数据已落盘，新后端读不到旧后端的用户
+    assert old.states["b"]["level"] == "N2"
+    assert user_state_engine.load_user_state("a")["level"] == "N5"
+    user_state_engine.save_user_state(_state("c"))
+    user_state_engine.flush_user_states()
+    assert sorted(new.states) == ["c"]
+    user_state_engine._state_cache.close()
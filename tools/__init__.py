@@ -1 +1,22 @@
 """工具模块集合。"""
+
+import importlib
+
+# 导入即触发 @mcp.tool 注册；各模块只依赖引擎层，重依赖（ollama、数据文件、
+# 数据库连接）都延迟到第一次工具调用时才加载。
+TOOL_MODULES = [
+    "tools.japanese_chat_tools",
+    "tools.lesson_tools",
+    "tools.scenario_tools",
+    "tools.ollama_tools",
+    "tools.grammar_tools",
+    "tools.user_state_tools",
+    "tools.metrics_tools",
+]
+
+
+def register_all_tools() -> None:
+    """导入全部工具模块，完成 MCP 工具注册。"""
+
+    for module in TOOL_MODULES:
+        importlib.import_module(module)
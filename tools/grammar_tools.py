@@ -1,11 +1,33 @@
 """提供日语语法识别相关的 MCP 工具。"""
 
 from mcp_app import mcp
-from core.engines.grammar_engine import detect_grammar
+from core.utils.metrics import instrument_tool
+from core.engines.grammar_engine import (
+    detect_grammar,
+    detect_grammar_batch_async,
+    detect_grammar_spans,
+)
 
 
 @mcp.tool()
+@instrument_tool
 def jp_detect_grammar(text: str) -> list[dict]:
     """外部工具：识别文本中的日语语法点。"""
 
     return detect_grammar(text)
+
+
+@mcp.tool()
+@instrument_tool
+def jp_detect_grammar_spans(text: str) -> list[dict]:
+    """外部工具：识别语法点并返回每个语法点在文本中的位置。"""
+
+    return detect_grammar_spans(text)
+
+
+@mcp.tool()
+@instrument_tool
+async def jp_detect_grammar_batch(texts: list[str]) -> dict:
+    """外部工具：批量识别多段文本的语法点，结果按输入顺序返回并附带统计。"""
+
+    return await detect_grammar_batch_async(texts)
@@ -1,19 +1,31 @@
 """日语聊天相关工具占位实现。"""
 
+from mcp.server.fastmcp import Context
+
 from mcp_app import mcp
+from core.utils.metrics import instrument_tool
 from core.engines.conversation_engine import process_user_utterance
+from core.services.mcp_progress import make_progress_sink
 
 
 @mcp.tool()
+@instrument_tool
 async def jp_chat_turn(
+    ctx: Context,
     user_text: str,
     history: list[dict] | None = None,
     user_id: str | None = None,
+    stream: bool = False,
 ) -> dict:
-    """调用异步核心引擎处理单轮对话并记录学习状态。"""
+    """调用异步核心引擎处理单轮对话并记录学习状态。
+
+    stream=True 时回复文本会以进度通知（message 字段）逐段推送，
+    完整的 TurnResult 在所有阶段结束后返回。
+    """
 
     return await process_user_utterance(
         user_text=user_text,
         history=history,
         user_id=user_id,
+        on_reply_token=make_progress_sink(ctx, enabled=stream),
     )
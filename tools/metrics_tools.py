@@ -0,0 +1,12 @@
+"""服务器运行指标工具层。"""
+
+from mcp_app import mcp
+from core.utils.metrics import get_metrics, instrument_tool
+
+
+@mcp.tool()
+@instrument_tool
+def server_metrics() -> dict:
+    """返回服务器指标快照：工具与模型调用的次数、错误、耗时分位数、token 数与缓存命中率。"""
+
+    return get_metrics().snapshot()
@@ -3,14 +3,24 @@ from __future__ import annotations
 from typing import Any, List, Optional
 
 from mcp_app import mcp
-from core.services.ai_client import AIClient
+from core.utils.metrics import instrument_tool
+from core.services.ai_client import get_ai_client, get_model_inventory
 
 
 @mcp.tool()
+@instrument_tool
 async def ollama_chat(
     model: str, messages: List[dict[str, Any]], tools: Optional[List[dict]] = None
 ) -> dict:
     """调用统一 AI 客户端的 Ollama 模式。"""
 
-    client = AIClient(mode="ollama", model=model)
+    client = get_ai_client(mode="ollama", model=model)
     return await client.chat(messages, tools=tools)
+
+
+@mcp.tool()
+@instrument_tool
+async def ollama_models() -> list[dict]:
+    """列出本地 Ollama 模型及其大小、量化级别等元数据（带缓存）。"""
+
+    return await get_model_inventory().list_models()
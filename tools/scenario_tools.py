@@ -1,10 +1,12 @@
 """场景对话相关工具层。"""
 
 from mcp_app import mcp
-from core.engines.scenario_engine import get_step, run_step
+from core.utils.metrics import instrument_tool
+from core.engines.scenario_engine import get_step, get_store_stats, run_step
 
 
 @mcp.tool()
+@instrument_tool
 def scenario_get_step(scenario_id: str, step_index: int) -> dict:
     """查看场景脚本中的指定步骤。"""
 
@@ -12,9 +14,18 @@ def scenario_get_step(scenario_id: str, step_index: int) -> dict:
 
 
 @mcp.tool()
+@instrument_tool
 async def scenario_reply(
     scenario_id: str, step_index: int, user_text: str
 ) -> dict:
     """用户回复场景后获取 NPC 下一句以及对回复的分析。"""
 
     return await run_step(scenario_id, step_index, user_text)
+
+
+@mcp.tool()
+@instrument_tool
+def scenario_store_stats() -> dict:
+    """查看场景存储的索引规模、缓存命中与内存占用。"""
+
+    return get_store_stats()
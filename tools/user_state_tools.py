@@ -1,22 +1,21 @@
 """用户状态读写工具层。"""
 
 from mcp_app import mcp
-from core.engines.user_state_engine import load_user_state, save_user_state
+from core.utils.metrics import instrument_tool
+from core.engines import user_state_engine
 
 
 @mcp.tool()
-def get_user_state(user_id: str) -> dict:
+@instrument_tool
+async def get_user_state(user_id: str) -> dict:
     """读取指定用户的学习状态。"""
 
-    return load_user_state(user_id)
+    return await user_state_engine.load_user_state_async(user_id)
 
 
 @mcp.tool()
-def reset_user_state(user_id: str) -> dict:
+@instrument_tool
+async def reset_user_state(user_id: str) -> dict:
     """重置指定用户的学习状态。"""
 
-    state = load_user_state(user_id)  # 读取文件加载用户信息
-    state["grammar_stats"] = {}
-    state["level"] = "N5"
-    save_user_state(state)
-    return state
+    return await user_state_engine.reset_user_state_async(user_id)